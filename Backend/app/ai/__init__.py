@@ -5,10 +5,29 @@ Este módulo contiene los componentes de inteligencia artificial:
 - feature_extractor: Extracción de características para modelos
 - recommender: Sistema de recomendación de hábitos (filtrado colaborativo)
 - predictor: Predicción de completado de hábitos (Random Forest)
+
+Las clases se importan en el primer acceso (PEP 562): `import app.ai` no
+carga numpy/scipy hasta que se usa un componente.
 """
 
-from .feature_extractor import FeatureExtractor
-from .recommender import HabitRecommender
-from .predictor import HabitPredictor
+import importlib
+
+_LAZY_EXPORTS = {
+    'FeatureExtractor': '.feature_extractor',
+    'HabitRecommender': '.recommender',
+    'HabitPredictor': '.predictor',
+}
 
 __all__ = ['FeatureExtractor', 'HabitRecommender', 'HabitPredictor']
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
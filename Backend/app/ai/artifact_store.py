@@ -0,0 +1,177 @@
+"""
+Almacén de Artefactos Compartidos para Taskpin AI
+=================================================
+
+Los workers de uvicorn/gunicorn son procesos separados; si cada uno carga
+su propia matriz usuario-hábito e índice de vecinos, la memoria crece con
+el número de workers. Este módulo guarda esos arreglos como archivos .npy
+que cada worker abre con mmap en modo solo lectura: el sistema operativo
+mantiene UNA copia en el page cache y todos los procesos la comparten.
+
+Una versión también puede llevar archivos arbitrarios (p. ej. el modelo
+joblib del predictor, ver model_registry.py).
+
+Estructura en disco:
+
+    <root>/<nombre>/
+        CURRENT                 -> "v1718049600123-4242" (versión activa)
+        v1718049600123-4242/
+            meta.json
+            <arreglo>.npy
+        v1718046000456-4242/    (versiones anteriores, se conservan unas pocas)
+
+Publicar una versión escribe un directorio nuevo y luego reemplaza
+CURRENT con os.replace (atómico): los lectores ven la versión anterior o
+la nueva completa, nunca una a medio escribir. Los workers que ya tienen
+mapeada una versión borrada la siguen leyendo sin problema (el archivo
+desaparece del directorio pero no de la memoria hasta que se desmapea).
+"""
+
+import json
+import os
+import shutil
+import time
+import numpy as np
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ArtifactStore:
+    """
+    Versiones inmutables de grupos de arreglos numpy, cargadas con mmap.
+    """
+
+    POINTER_FILE = 'CURRENT'
+    META_FILE = 'meta.json'
+
+    # Versiones que se conservan por artefacto (la activa incluida)
+    KEEP_VERSIONS = 3
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(
+            root
+            or os.getenv('TASKPIN_ARTIFACTS_DIR')
+            or Path(__file__).parent / 'models' / 'artifacts'
+        )
+
+    # ========================================
+    # PUBLICAR
+    # ========================================
+
+    def publish(
+        self,
+        name: str,
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Callable[[Path], None]]] = None
+    ) -> str:
+        """
+        Publica una nueva versión de un artefacto y la marca como activa.
+
+        Args:
+            name: Nombre del artefacto (p. ej. 'habit_matrix')
+            arrays: Arreglos a guardar, uno por archivo .npy
+            meta: Metadata serializable a JSON
+            files: Archivos extra: nombre -> función que lo escribe en la ruta dada
+
+        Returns:
+            Nombre de la versión publicada
+        """
+        base = self.root / name
+        base.mkdir(parents=True, exist_ok=True)
+
+        version = f"v{int(time.time() * 1000)}-{os.getpid()}"
+        tmp_dir = base / f".tmp-{version}"
+        tmp_dir.mkdir()
+
+        try:
+            for key, array in (arrays or {}).items():
+                np.save(tmp_dir / f"{key}.npy", np.ascontiguousarray(array), allow_pickle=False)
+            for filename, write in (files or {}).items():
+                write(tmp_dir / filename)
+
+            meta = dict(meta or {})
+            meta.setdefault('published_at', time.time())
+            (tmp_dir / self.META_FILE).write_text(json.dumps(meta, default=str))
+
+            os.replace(tmp_dir, base / version)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self.set_current(name, version)
+        self._cleanup(name, keep=version)
+        return version
+
+    def set_current(self, name: str, version: str):
+        """Marca una versión existente como activa (cambio atómico del puntero)."""
+        base = self.root / name
+        if not (base / version).is_dir():
+            raise ValueError(f"La versión {version} de {name} no existe")
+
+        pointer_tmp = base / f".{self.POINTER_FILE}.{os.getpid()}"
+        pointer_tmp.write_text(version)
+        os.replace(pointer_tmp, base / self.POINTER_FILE)
+
+    def _cleanup(self, name: str, keep: str):
+        """Borra versiones viejas, conservando las KEEP_VERSIONS más recientes."""
+        for old in self.versions(name)[self.KEEP_VERSIONS:]:
+            if old != keep:
+                shutil.rmtree(self.path(name, old), ignore_errors=True)
+
+    # ========================================
+    # LEER
+    # ========================================
+
+    def versions(self, name: str) -> List[str]:
+        """Versiones disponibles de un artefacto, de la más reciente a la más vieja."""
+        base = self.root / name
+        if not base.is_dir():
+            return []
+        return sorted(
+            (p.name for p in base.iterdir() if p.is_dir() and p.name.startswith('v')),
+            reverse=True
+        )
+
+    def path(self, name: str, version: str) -> Path:
+        """Directorio de una versión (para leer sus archivos extra)."""
+        return self.root / name / version
+
+    def read_meta(self, name: str, version: str) -> Optional[Dict[str, Any]]:
+        """Metadata de una versión, o None si no existe."""
+        try:
+            return json.loads((self.path(name, version) / self.META_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def current_version(self, name: str) -> Optional[str]:
+        """Versión activa de un artefacto (lectura barata del puntero)."""
+        try:
+            return (self.root / name / self.POINTER_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self, name: str, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Abre una versión (por defecto la activa) con mmap de solo lectura.
+
+        Returns:
+            Dict con 'version', 'meta' y 'arrays' (np.memmap de solo lectura),
+            o None si no hay versión publicada o está dañada
+        """
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+
+        path = self.root / name / version
+        try:
+            meta = json.loads((path / self.META_FILE).read_text())
+            arrays = {
+                file.stem: np.load(file, mmap_mode='r', allow_pickle=False)
+                for file in path.glob('*.npy')
+            }
+        except (FileNotFoundError, ValueError) as e:
+            print(f"❌ Error cargando artefacto {name}/{version}: {e}")
+            return None
+
+        return {'version': version, 'meta': meta, 'arrays': arrays}
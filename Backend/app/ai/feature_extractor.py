@@ -8,9 +8,12 @@ Funciones principales:
 - get_user_habit_matrix(): Matriz usuarios × hábitos para recomendaciones
 - get_user_habit_vector(): Vector de hábitos de un usuario específico
 - get_habit_completion_features(): Features para predicción de completado
+- get_users_habits_features(): Features de todos los hábitos de varios usuarios
 """
 
 import numpy as np
+from pathlib import Path
+from scipy import sparse
 from datetime import date, timedelta
 from typing import Dict, List, Tuple, Optional
 from ..database import get_pool
@@ -65,7 +68,7 @@ class FeatureExtractor:
                 """)
                 return [row[0] for row in cur.fetchall()]
     
-    def get_user_habit_matrix(self) -> Tuple[np.ndarray, List[int], List[int]]:
+    def get_user_habit_matrix(self) -> Tuple[sparse.csr_matrix, List[int], List[int]]:
         """
         Crea la matriz Usuario × Hábito para filtrado colaborativo.
         
@@ -75,9 +78,14 @@ class FeatureExtractor:
         M[i,j] = 1 si usuario_i tiene habito_j
         M[i,j] = 0 si no
         
+        La matriz es dispersa (CSR): cada usuario tiene solo unos pocos
+        hábitos del catálogo, así que solo se guardan las celdas con 1 y
+        la memoria crece con el número de suscripciones, no con
+        usuarios × hábitos.
+        
         Returns:
             Tuple de:
-            - matrix: numpy array de shape (n_usuarios, n_habitos)
+            - matrix: scipy.sparse.csr_matrix de shape (n_usuarios, n_habitos)
             - user_ids: lista de user_id correspondientes a cada fila
             - habit_ids: lista de habito_id correspondientes a cada columna
         """
@@ -86,14 +94,15 @@ class FeatureExtractor:
         user_ids = self.get_all_user_ids()
         
         if not habit_ids or not user_ids:
-            return np.array([]), [], []
+            return sparse.csr_matrix((0, 0), dtype=np.float32), [], []
         
         # Crear mapeos de ID a índice
         habit_to_idx = {hid: idx for idx, hid in enumerate(habit_ids)}
         user_to_idx = {uid: idx for idx, uid in enumerate(user_ids)}
         
-        # Inicializar matriz con ceros
-        matrix = np.zeros((len(user_ids), len(habit_ids)), dtype=np.float32)
+        # Coordenadas (fila, columna) de las celdas con 1
+        rows = []
+        cols = []
         
         # Obtener todos los hábitos de usuario activos
         with self.pool.connection() as conn:
@@ -104,11 +113,21 @@ class FeatureExtractor:
                     WHERE activo = true;
                 """)
                 
-                for user_id, habito_id in cur.fetchall():
-                    if user_id in user_to_idx and habito_id in habit_to_idx:
-                        i = user_to_idx[user_id]
-                        j = habit_to_idx[habito_id]
-                        matrix[i, j] = 1.0
+                for user_id, habito_id in cur:
+                    i = user_to_idx.get(user_id)
+                    j = habit_to_idx.get(habito_id)
+                    if i is not None and j is not None:
+                        rows.append(i)
+                        cols.append(j)
+        
+        matrix = sparse.csr_matrix(
+            (
+                np.ones(len(rows), dtype=np.float32),
+                (np.array(rows, dtype=np.int32), np.array(cols, dtype=np.int32))
+            ),
+            shape=(len(user_ids), len(habit_ids)),
+            dtype=np.float32
+        )
         
         return matrix, user_ids, habit_ids
     
@@ -146,6 +165,36 @@ class FeatureExtractor:
         
         return vector, habit_ids
     
+    def get_habit_catalog(self) -> List[Dict]:
+        """
+        Obtiene la información de todos los hábitos predeterminados
+        (candidatos a recomendar), en el mismo orden que get_all_habit_ids.
+        
+        Returns:
+            Lista de dicts con info de cada hábito
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT hp.habito_id, hp.nombre, hp.descripcion, 
+                           hp.puntos_base, ch.nombre as categoria
+                    FROM habitos_predeterminados hp
+                    INNER JOIN categorias_habitos ch ON hp.categoria_id = ch.categoria_id
+                    WHERE hp.es_personalizado = false OR hp.es_personalizado IS NULL
+                    ORDER BY hp.habito_id;
+                """)
+                
+                return [
+                    {
+                        'habito_id': row[0],
+                        'nombre': row[1],
+                        'descripcion': row[2],
+                        'puntos_base': row[3],
+                        'categoria': row[4]
+                    }
+                    for row in cur.fetchall()
+                ]
+    
     def get_habits_user_doesnt_have(self, user_id: int) -> List[Dict]:
         """
         Obtiene los hábitos que el usuario NO tiene (candidatos a recomendar).
@@ -187,6 +236,9 @@ class FeatureExtractor:
     # FUNCIONES PARA PREDICTOR DE COMPLETADO
     # ========================================
     
+    # Días de historial usados para las features de completado
+    HISTORY_DAYS = 30
+    
     def get_habit_completion_features(self, user_id: int, habito_usuario_id: int) -> Optional[Dict]:
         """
         Extrae características de un hábito para predecir completado.
@@ -207,79 +259,16 @@ class FeatureExtractor:
         Returns:
             Dict con las features o None si no existe el hábito
         """
-        hoy = date.today()
-        ayer = hoy - timedelta(days=1)
-        hace_7_dias = hoy - timedelta(days=7)
-        hace_30_dias = hoy - timedelta(days=30)
-        
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                # Verificar que el hábito existe y pertenece al usuario
-                cur.execute("""
-                    SELECT habito_usuario_id, fecha_agregado
-                    FROM habitos_usuario
-                    WHERE habito_usuario_id = %s 
-                      AND user_id = %s 
-                      AND activo = true;
-                """, (habito_usuario_id, user_id))
-                
-                result = cur.fetchone()
-                if not result:
-                    return None
-                
-                fecha_agregado = result[1]
-                dias_desde_agregado = (hoy - fecha_agregado).days if fecha_agregado else 0
-                
-                # Obtener historial de completado
-                cur.execute("""
-                    SELECT fecha, completado
-                    FROM seguimiento_habitos
-                    WHERE habito_usuario_id = %s
-                      AND fecha >= %s
-                    ORDER BY fecha DESC;
-                """, (habito_usuario_id, hace_30_dias))
-                
-                historial = {row[0]: row[1] for row in cur.fetchall()}
-                
-                # Calcular tasa de éxito últimos 7 días
-                dias_7 = [(hoy - timedelta(days=i)) for i in range(1, 8)]
-                completados_7 = sum(1 for d in dias_7 if historial.get(d, False))
-                tasa_7_dias = completados_7 / 7.0
-                
-                # Calcular tasa de éxito últimos 30 días
-                dias_30 = [(hoy - timedelta(days=i)) for i in range(1, 31)]
-                completados_30 = sum(1 for d in dias_30 if historial.get(d, False))
-                tasa_30_dias = completados_30 / 30.0
-                
-                # Verificar si completó ayer
-                completado_ayer = 1 if historial.get(ayer, False) else 0
-                
-                # Calcular racha actual
-                racha_actual = 0
-                fecha_check = ayer
-                while historial.get(fecha_check, False):
-                    racha_actual += 1
-                    fecha_check -= timedelta(days=1)
-                
-                # Features actuales (momento de predicción)
-                from datetime import datetime
-                ahora = datetime.now()
-                
-                return {
-                    'dia_semana': hoy.weekday(),  # 0=Lunes, 6=Domingo
-                    'hora_actual': ahora.hour,
-                    'racha_actual': racha_actual,
-                    'tasa_exito_7_dias': round(tasa_7_dias, 3),
-                    'tasa_exito_30_dias': round(tasa_30_dias, 3),
-                    'completado_ayer': completado_ayer,
-                    'dias_desde_agregado': dias_desde_agregado
-                }
+        habits = self._habits_completion_features([user_id], [habito_usuario_id])
+        return habits[0]['features'] if habits else None
     
     def get_all_user_habits_features(self, user_id: int) -> List[Dict]:
         """
         Obtiene features de TODOS los hábitos activos de un usuario.
         
         Útil para hacer predicciones batch de todos los hábitos.
+        Una sola consulta para todos los hábitos (ver
+        _habits_completion_features).
         
         Args:
             user_id: ID del usuario
@@ -287,32 +276,176 @@ class FeatureExtractor:
         Returns:
             Lista de dicts con habito_usuario_id, nombre, y features
         """
+        return self._habits_completion_features([user_id])
+    
+    def get_habits_features(self, user_id: int, habito_usuario_ids: List[int]) -> List[Dict]:
+        """
+        Features de algunos hábitos activos de un usuario, en una sola
+        consulta (para recalcular solo las predicciones afectadas).
+        
+        Args:
+            user_id: ID del usuario
+            habito_usuario_ids: IDs de los hábitos del usuario
+            
+        Returns:
+            Lista de hábitos (mismo formato que get_all_user_habits_features);
+            los hábitos inactivos o de otro usuario no aparecen
+        """
+        if not habito_usuario_ids:
+            return []
+        return self._habits_completion_features([user_id], list(habito_usuario_ids))
+    
+    def get_users_habits_features(self, user_ids: List[int]) -> Dict[int, List[Dict]]:
+        """
+        Features de todos los hábitos activos de varios usuarios, en una
+        sola consulta (para predicciones en lote).
+        
+        Args:
+            user_ids: IDs de los usuarios
+            
+        Returns:
+            Dict user_id -> lista de hábitos (mismo formato que
+            get_all_user_habits_features)
+        """
+        results = {user_id: [] for user_id in user_ids}
+        for habit in self._habits_completion_features(user_ids):
+            results[habit['user_id']].append(habit)
+        return results
+    
+    def _habits_completion_features(
+        self,
+        user_ids: List[int],
+        habito_usuario_ids: Optional[List[int]] = None
+    ) -> List[Dict]:
+        """
+        Calcula las features de completado de los hábitos activos de los
+        usuarios dados con UNA consulta y numpy.
+        
+        El historial sale del almacén de features (habito_features: los
+        últimos días en bits, sin leer seguimiento_habitos); solo para
+        los hábitos que aún no tienen fila se traen las fechas
+        completadas de los últimos HISTORY_DAYS días. Con eso se arma un
+        arreglo booleano hábitos × días:
+        
+            H[h, d] = completó el hábito h hace d+1 días
+        
+        y todas las features salen de operaciones por fila:
+        - completado_ayer = H[:, 0]
+        - tasa_exito_7_dias = media de H[:, :7]
+        - tasa_exito_30_dias = media de H
+        - racha_actual = primera columna en False (máximo HISTORY_DAYS)
+        
+        Args:
+            user_ids: IDs de los usuarios
+            habito_usuario_ids: Limitar a esos hábitos (opcional)
+            
+        Returns:
+            Lista de dicts con user_id, habito_usuario_id, habito_id,
+            nombre y features, ordenada por usuario y habito_usuario_id
+        """
+        if not user_ids:
+            return []
+        
+        hoy = date.today()
+        desde = hoy - timedelta(days=self.HISTORY_DAYS)
+        
         with self.pool.connection() as conn:
             with conn.cursor() as cur:
-                # Obtener todos los hábitos del usuario
                 cur.execute("""
-                    SELECT hu.habito_usuario_id, hp.nombre, hp.habito_id
+                    SELECT hu.user_id, hu.habito_usuario_id, hp.nombre, hp.habito_id,
+                           hu.fecha_agregado, hf.fecha_base, hf.bits,
+                           COALESCE(
+                               array_agg(sh.fecha) FILTER (WHERE sh.completado = true),
+                               '{}'
+                           ) AS fechas_completadas
                     FROM habitos_usuario hu
                     INNER JOIN habitos_predeterminados hp ON hu.habito_id = hp.habito_id
-                    WHERE hu.user_id = %s AND hu.activo = true
-                    ORDER BY hu.habito_usuario_id;
-                """, (user_id,))
+                    LEFT JOIN habito_features hf ON hf.habito_usuario_id = hu.habito_usuario_id
+                    LEFT JOIN seguimiento_habitos sh
+                           ON sh.habito_usuario_id = hu.habito_usuario_id
+                          AND hf.habito_usuario_id IS NULL
+                          AND sh.fecha >= %s
+                          AND sh.fecha < %s
+                    WHERE hu.user_id = ANY(%s)
+                      AND hu.activo = true
+                      AND (%s::int[] IS NULL OR hu.habito_usuario_id = ANY(%s::int[]))
+                    GROUP BY hu.user_id, hu.habito_usuario_id, hp.nombre,
+                             hp.habito_id, hu.fecha_agregado, hf.fecha_base, hf.bits
+                    ORDER BY hu.user_id, hu.habito_usuario_id;
+                """, (desde, hoy, list(user_ids), habito_usuario_ids, habito_usuario_ids))
                 
-                habitos = cur.fetchall()
+                rows = cur.fetchall()
+        
+        if not rows:
+            return []
+        
+        # Arreglo hábitos × días (columna d = hace d+1 días)
+        history = np.zeros((len(rows), self.HISTORY_DAYS), dtype=bool)
+        
+        # Con almacén: bit i = completado el día fecha_base - i, así que
+        # "hace d+1 días" es el bit d+1 - (días desde fecha_base)
+        stored = np.array([row[6] is not None for row in rows])
+        if stored.any():
+            bits = np.array([row[6] for row in rows if row[6] is not None], dtype=np.int64)
+            elapsed = np.array([(hoy - row[5]).days for row in rows if row[6] is not None])
+            shifts = np.arange(1, self.HISTORY_DAYS + 1)[None, :] - elapsed[:, None]
+            history[stored] = (shifts >= 0) & (
+                (bits[:, None] >> np.clip(shifts, 0, 63)) & 1
+            ).astype(bool)
+        
+        for i, row in enumerate(rows):
+            for fecha in row[7]:
+                history[i, (hoy - fecha).days - 1] = True
+        
+        completado_ayer = history[:, 0]
+        tasa_7_dias = history[:, :7].sum(axis=1) / 7.0
+        tasa_30_dias = history.sum(axis=1) / float(self.HISTORY_DAYS)
+        # Racha = días seguidos completados desde ayer
+        racha_actual = np.where(
+            history.all(axis=1), self.HISTORY_DAYS, np.argmin(history, axis=1)
+        )
+        
+        # Features actuales (momento de predicción)
+        from datetime import datetime
+        ahora = datetime.now()
         
         results = []
-        for habito_usuario_id, nombre, habito_id in habitos:
-            features = self.get_habit_completion_features(user_id, habito_usuario_id)
-            if features:
-                results.append({
-                    'habito_usuario_id': habito_usuario_id,
-                    'habito_id': habito_id,
-                    'nombre': nombre,
-                    'features': features
-                })
+        for i, (user_id, hu_id, nombre, habito_id, fecha_agregado, *_) in enumerate(rows):
+            results.append({
+                'user_id': user_id,
+                'habito_usuario_id': hu_id,
+                'habito_id': habito_id,
+                'nombre': nombre,
+                'features': {
+                    'dia_semana': hoy.weekday(),  # 0=Lunes, 6=Domingo
+                    'hora_actual': ahora.hour,
+                    'racha_actual': int(racha_actual[i]),
+                    'tasa_exito_7_dias': round(float(tasa_7_dias[i]), 3),
+                    'tasa_exito_30_dias': round(float(tasa_30_dias[i]), 3),
+                    'completado_ayer': int(completado_ayer[i]),
+                    'dias_desde_agregado': (hoy - fecha_agregado).days if fecha_agregado else 0
+                }
+            })
         
         return results
     
+    # Historial de entrenamiento, fechas como días enteros desde 2000-01-01
+    # para operar con numpy
+    _TRAINING_HISTORY_QUERY = """
+        SELECT 
+            sh.habito_usuario_id,
+            sh.fecha - DATE '2000-01-01' AS dia,
+            COALESCE(sh.completado, false),
+            COALESCE(sh.fecha - hu.fecha_agregado, 0) AS dias_desde_agregado
+        FROM seguimiento_habitos sh
+        INNER JOIN habitos_usuario hu ON sh.habito_usuario_id = hu.habito_usuario_id
+        WHERE sh.fecha < CURRENT_DATE  -- Solo datos pasados
+        ORDER BY sh.habito_usuario_id, sh.fecha
+    """
+    
+    # Filas leídas del cursor del servidor por viaje en modo streaming
+    TRAINING_CHUNK_ROWS = 50000
+    
     def get_training_data_for_predictor(self, min_records: int = 100) -> Tuple[np.ndarray, np.ndarray]:
         """
         Prepara datos de entrenamiento para el modelo de predicción.
@@ -320,6 +453,11 @@ class FeatureExtractor:
         Obtiene historial de todos los usuarios y construye un dataset
         con features y labels (completado/no completado).
         
+        Todo el historial se lee con UNA consulta (ordenada por hábito y
+        fecha) y las features de cada registro se calculan con numpy
+        sobre ventanas móviles (ver build_training_features), en lugar de
+        una consulta de historial por registro.
+        
         Args:
             min_records: Mínimo de registros requeridos
             
@@ -328,79 +466,249 @@ class FeatureExtractor:
             - X: numpy array de features (n_samples, n_features)
             - y: numpy array de labels (n_samples,) - 1=completado, 0=no
         """
-        X_list = []
-        y_list = []
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(self._TRAINING_HISTORY_QUERY)
+                registros = cur.fetchall()
+        
+        if registros:
+            columns = np.array(registros, dtype=np.int64)
+            X, y = self.build_training_features(
+                columns[:, 0], columns[:, 1], columns[:, 2].astype(bool), columns[:, 3]
+            )
+            
+            # Mismo orden que antes: cronológico
+            order = np.lexsort((columns[:, 0], columns[:, 1]))
+            X, y = X[order], y[order]
+        else:
+            X = np.empty((0, 5), dtype=np.float32)
+            y = np.empty(0, dtype=np.int32)
+        
+        if len(X) < min_records:
+            print(f"Advertencia: Solo {len(X)} registros disponibles (mínimo: {min_records})")
+        
+        return X, y
+    
+    def get_training_data_streaming(
+        self,
+        min_records: int = 100,
+        chunk_size: int = TRAINING_CHUNK_ROWS,
+        out_dir: Optional[str] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Igual que get_training_data_for_predictor, pero sin cargar todo el
+        historial en memoria.
         
+        - Cuenta los registros y los lee en la MISMA transacción
+          (REPEATABLE READ: ambos ven la misma foto de la tabla)
+        - X e y se preasignan (float32/int32) con ese conteo; con
+          `out_dir` son memmaps en disco (np.lib.format.open_memmap)
+        - El historial se lee con un cursor del lado del servidor en
+          bloques de `chunk_size` filas; cada bloque se convierte en
+          features en cuanto sus hábitos están completos (las filas del
+          último hábito del bloque esperan al siguiente)
+        
+        La memoria pico es X + y + un bloque, en lugar de varias veces
+        el historial completo como tuplas de Python.
+        
+        Los registros salen ordenados por hábito y fecha (no
+        cronológicamente); train_test_split los baraja de todos modos.
+        
+        Args:
+            min_records: Mínimo de registros requeridos
+            chunk_size: Filas por viaje al servidor
+            out_dir: Directorio para X.npy / y.npy en disco (opcional)
+            
+        Returns:
+            Tuple (X, y) como en get_training_data_for_predictor
+        """
         with self.pool.connection() as conn:
             with conn.cursor() as cur:
-                # Obtener historial con features calculables
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;")
                 cur.execute("""
-                    SELECT 
-                        sh.habito_usuario_id,
-                        sh.fecha,
-                        sh.completado,
-                        hu.user_id,
-                        hu.fecha_agregado
+                    SELECT COUNT(*)
                     FROM seguimiento_habitos sh
                     INNER JOIN habitos_usuario hu ON sh.habito_usuario_id = hu.habito_usuario_id
-                    WHERE sh.fecha < CURRENT_DATE  -- Solo datos pasados
-                    ORDER BY sh.fecha;
+                    WHERE sh.fecha < CURRENT_DATE;
                 """)
+                total = cur.fetchone()[0]
+            
+            if out_dir:
+                Path(out_dir).mkdir(parents=True, exist_ok=True)
+                X = np.lib.format.open_memmap(
+                    str(Path(out_dir) / 'X.npy'), mode='w+', dtype=np.float32, shape=(total, 5)
+                )
+                y = np.lib.format.open_memmap(
+                    str(Path(out_dir) / 'y.npy'), mode='w+', dtype=np.int32, shape=(total,)
+                )
+            else:
+                X = np.empty((total, 5), dtype=np.float32)
+                y = np.empty(total, dtype=np.int32)
+            
+            offset = 0
+            pending = np.empty((0, 4), dtype=np.int64)
+            
+            with conn.cursor(name='training_history') as cur:
+                cur.itersize = chunk_size
+                cur.execute(self._TRAINING_HISTORY_QUERY)
                 
-                registros = cur.fetchall()
-                
-                # Para cada registro, calcular features del día anterior
-                # (simulamos que predecimos basándonos en datos disponibles)
-                for habito_usuario_id, fecha, completado, user_id, fecha_agregado in registros:
-                    # Calcular features para ese día
-                    dia_semana = fecha.weekday()
-                    dias_desde_agregado = (fecha - fecha_agregado).days if fecha_agregado else 0
-                    
-                    # Obtener historial previo a esa fecha
-                    cur.execute("""
-                        SELECT fecha, completado
-                        FROM seguimiento_habitos
-                        WHERE habito_usuario_id = %s
-                          AND fecha < %s
-                          AND fecha >= %s
-                        ORDER BY fecha DESC;
-                    """, (habito_usuario_id, fecha, fecha - timedelta(days=30)))
-                    
-                    historial_previo = {row[0]: row[1] for row in cur.fetchall()}
-                    
-                    # Calcular features
-                    ayer = fecha - timedelta(days=1)
-                    completado_ayer = 1 if historial_previo.get(ayer, False) else 0
-                    
-                    # Tasa últimos 7 días antes de esta fecha
-                    dias_7 = [(fecha - timedelta(days=i)) for i in range(1, 8)]
-                    completados_7 = sum(1 for d in dias_7 if historial_previo.get(d, False))
-                    tasa_7 = completados_7 / 7.0
-                    
-                    # Racha antes de esta fecha
-                    racha = 0
-                    fecha_check = ayer
-                    while historial_previo.get(fecha_check, False):
-                        racha += 1
-                        fecha_check -= timedelta(days=1)
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if rows:
+                        columns = np.vstack([pending, np.array(rows, dtype=np.int64)])
+                        # Filas del último hábito: pueden seguir en el próximo bloque
+                        cut = int(np.searchsorted(columns[:, 0], columns[-1, 0]))
+                        ready, pending = columns[:cut], columns[cut:]
+                    else:
+                        ready, pending = pending, pending[:0]
                     
-                    # Feature vector (sin hora porque es dato histórico)
-                    # [dia_semana, racha, tasa_7, completado_ayer, dias_agregado]
-                    features = [
-                        dia_semana,
-                        racha,
-                        tasa_7,
-                        completado_ayer,
-                        min(dias_desde_agregado, 365)  # Cap a 1 año
-                    ]
+                    if len(ready):
+                        chunk_X, chunk_y = self.build_training_features(
+                            ready[:, 0], ready[:, 1], ready[:, 2].astype(bool), ready[:, 3]
+                        )
+                        end = min(offset + len(chunk_X), total)
+                        X[offset:end] = chunk_X[:end - offset]
+                        y[offset:end] = chunk_y[:end - offset]
+                        offset = end
                     
-                    X_list.append(features)
-                    y_list.append(1 if completado else 0)
+                    if not rows:
+                        break
+        
+        if offset < total:
+            X, y = X[:offset], y[:offset]
+        
+        if len(X) < min_records:
+            print(f"Advertencia: Solo {len(X)} registros disponibles (mínimo: {min_records})")
+        
+        return X, y
+    
+    def get_training_data_since(self, watermark: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Datos de entrenamiento solo de los registros posteriores a
+        `watermark` (para entrenamiento incremental).
+        
+        Se leen también los 30 días previos a la marca, porque las
+        features de los registros nuevos (racha, tasa 7 días, ayer)
+        dependen de ese historial; esas filas de contexto no se devuelven.
+        
+        Args:
+            watermark: Última fecha incluida en el entrenamiento anterior
+            
+        Returns:
+            Tuple (X, y) de los registros con fecha > watermark
+        """
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT 
+                        sh.habito_usuario_id,
+                        sh.fecha - DATE '2000-01-01' AS dia,
+                        COALESCE(sh.completado, false),
+                        COALESCE(sh.fecha - hu.fecha_agregado, 0) AS dias_desde_agregado
+                    FROM seguimiento_habitos sh
+                    INNER JOIN habitos_usuario hu ON sh.habito_usuario_id = hu.habito_usuario_id
+                    WHERE sh.fecha < CURRENT_DATE
+                      AND sh.fecha > %s::date - 30
+                      AND sh.habito_usuario_id IN (
+                          SELECT habito_usuario_id
+                          FROM seguimiento_habitos
+                          WHERE fecha > %s AND fecha < CURRENT_DATE
+                      )
+                    ORDER BY sh.habito_usuario_id, sh.fecha;
+                """, (watermark, watermark))
+                
+                registros = cur.fetchall()
+        
+        if not registros:
+            return np.empty((0, 5), dtype=np.float32), np.empty(0, dtype=np.int32)
+        
+        columns = np.array(registros, dtype=np.int64)
+        X, y = self.build_training_features(
+            columns[:, 0], columns[:, 1], columns[:, 2].astype(bool), columns[:, 3]
+        )
+        
+        # Descartar las filas de contexto (fecha <= watermark)
+        new_rows = columns[:, 1] > (watermark - date(2000, 1, 1)).days
+        return X[new_rows], y[new_rows]
+    
+    @staticmethod
+    def build_training_features(
+        habito_usuario_ids: np.ndarray,
+        dias: np.ndarray,
+        completados: np.ndarray,
+        dias_desde_agregado: np.ndarray,
+        history_days: int = 30
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Features de entrenamiento de cada registro de seguimiento, con
+        ventanas móviles de numpy.
+        
+        Los registros deben venir ordenados por (habito_usuario_id, día).
+        Cada hábito se expande a una serie diaria booleana C (días sin
+        registro = no completado) precedida de `history_days` días vacíos
+        que separan un hábito del siguiente. Para el registro en la
+        posición p de la serie, usando solo días anteriores:
+        
+        - completado_ayer = C[p-1]
+        - tasa_7          = (S[p] - S[p-7]) / 7, con S = suma acumulada de C
+        - racha           = longitud de la corrida de True que termina
+                            en p-1, máximo `history_days`
+        
+        Args:
+            habito_usuario_ids: Hábito de cada registro
+            dias: Fecha de cada registro como número de días desde 2000-01-01
+            completados: Label de cada registro
+            dias_desde_agregado: Días entre la fecha agregada y el registro
+            history_days: Días de historial considerados (tope de la racha)
+            
+        Returns:
+            Tuple (X float32 (n, 5), y int32 (n,)) en el orden de entrada
+        """
+        n = len(dias)
+        if n == 0:
+            return np.empty((0, 5), dtype=np.float32), np.empty(0, dtype=np.int32)
+        
+        # Límites de cada hábito dentro de los registros
+        starts = np.flatnonzero(np.r_[True, habito_usuario_ids[1:] != habito_usuario_ids[:-1]])
+        ends = np.r_[starts[1:], n]
+        first_day = dias[starts]
+        spans = dias[ends - 1] - first_day + 1
+        
+        # Cada hábito ocupa history_days (relleno) + span posiciones
+        segment_len = spans + history_days
+        segment_start = np.r_[0, np.cumsum(segment_len)[:-1]]
+        group = np.repeat(np.arange(len(starts)), ends - starts)
+        positions = segment_start[group] + history_days + (dias - first_day[group])
+        
+        series = np.zeros(int(segment_len.sum()), dtype=bool)
+        series[positions] = completados
+        
+        # Suma acumulada: S[i] = completados en series[:i]
+        cumulative = np.r_[0, np.cumsum(series, dtype=np.int64)]
+        tasa_7 = (cumulative[positions] - cumulative[positions - 7]) / 7.0
+        
+        completado_ayer = series[positions - 1]
+        
+        # Corrida de True que termina en cada posición: i - último False
+        index = np.arange(len(series))
+        last_false = np.maximum.accumulate(np.where(series, -1, index))
+        run_length = index - last_false
+        racha = np.minimum(run_length[positions - 1], history_days)
+        
+        # 2000-01-01 fue sábado (weekday 5)
+        dia_semana = (dias + 5) % 7
         
-        if len(X_list) < min_records:
-            print(f"Advertencia: Solo {len(X_list)} registros disponibles (mínimo: {min_records})")
+        # [dia_semana, racha, tasa_7, completado_ayer, dias_agregado]
+        X = np.column_stack([
+            dia_semana,
+            racha,
+            tasa_7,
+            completado_ayer,
+            np.minimum(dias_desde_agregado, 365)  # Cap a 1 año
+        ]).astype(np.float32)
+        y = completados.astype(np.int32)
         
-        return np.array(X_list, dtype=np.float32), np.array(y_list, dtype=np.int32)
+        return X, y
     
     # ========================================
     # FUNCIONES AUXILIARES
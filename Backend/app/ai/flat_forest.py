@@ -0,0 +1,189 @@
+"""
+Bosque Aplanado para Taskpin AI
+===============================
+
+predict_proba de sklearn recorre los árboles como objetos Python (uno por
+estimador, con validación de entrada y arranque de hilos en cada llamada).
+Para lotes chicos, como los 5 features de los hábitos de un usuario, ese
+costo fijo domina.
+
+FlatForest guarda todos los nodos del bosque en arreglos numpy contiguos:
+
+    feature[n]    feature que usa el nodo n (0 en las hojas)
+    threshold[n]  umbral: izquierda si x[feature] <= threshold
+    left[n]       hijo izquierdo (índice global; en una hoja, el mismo nodo)
+    right[n]      hijo derecho   (índice global; en una hoja, el mismo nodo)
+    value[n]      probabilidad de cada clase en el nodo (normalizada)
+    roots[t]      nodo raíz del árbol t
+
+Como las hojas apuntan a sí mismas, evaluar es bajar `depth` niveles para
+todas las filas y todos los árboles a la vez, sin ramas:
+
+    nodo = where(x[feature[nodo]] <= threshold[nodo], left[nodo], right[nodo])
+
+El resultado es el promedio de value en las hojas, igual que
+RandomForestClassifier.predict_proba. Solo depende de numpy: la API no
+necesita importar sklearn para predecir.
+"""
+
+import numpy as np
+from typing import Dict
+
+
+class FlatForest:
+    """
+    Bosque de árboles de decisión en arreglos planos, evaluado con numpy.
+    """
+
+    # Filas evaluadas a la vez
+    BLOCK_ROWS = 4096
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, depth: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.depth = int(depth)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    # ========================================
+    # EXPORTAR / CARGAR
+    # ========================================
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'FlatForest':
+        """
+        Aplana un RandomForestClassifier entrenado.
+
+        Args:
+            model: RandomForestClassifier (o cualquier ensemble con
+                estimators_ de árboles de sklearn)
+        """
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        depth = 0
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            local = np.arange(n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, local, tree.children_left).astype(np.int32) + offset)
+            rights.append(np.where(is_leaf, local, tree.children_right).astype(np.int32) + offset)
+
+            # Igual que DecisionTreeClassifier.predict_proba: normalizar por nodo
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            depth=depth
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Arreglos para guardar (uno por archivo .npy)."""
+        return {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'roots': self.roots,
+            'classes': self.classes,
+            'depth': np.array([self.depth], dtype=np.int32)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'FlatForest':
+        """Reconstruye el bosque desde arreglos (p. ej. mmap del ArtifactStore)."""
+        return cls(
+            feature=arrays['feature'],
+            threshold=arrays['threshold'],
+            left=arrays['left'],
+            right=arrays['right'],
+            value=arrays['value'],
+            roots=arrays['roots'],
+            classes=arrays['classes'],
+            depth=int(arrays['depth'][0])
+        )
+
+    # ========================================
+    # EVALUAR
+    # ========================================
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidad de cada clase para cada fila de X (n × n_clases).
+
+        Los features se comparan en float32, como lo hace sklearn. Las
+        filas se evalúan en bloques de BLOCK_ROWS para no crear matrices
+        de nodos (filas × árboles) enormes.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if len(X) <= self.BLOCK_ROWS:
+            return self._predict_block(X)
+        return np.concatenate([
+            self._predict_block(X[start:start + self.BLOCK_ROWS])
+            for start in range(0, len(X), self.BLOCK_ROWS)
+        ])
+
+    def _predict_block(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat_X = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+
+        # (n_filas × n_árboles): nodo actual de cada fila en cada árbol
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        for _ in range(self.depth):
+            go_left = flat_X[row_offsets + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.value[nodes].mean(axis=1)
+
+    def check_parity(self, model, n_rows: int = 2000, seed: int = 0) -> bool:
+        """
+        Compara predict_proba contra el modelo de sklearn en filas
+        sintéticas que incluyen los umbrales exactos (caso borde de <=).
+
+        Returns:
+            True si ambas predicciones coinciden
+        """
+        rng = np.random.default_rng(seed)
+        n_features = model.n_features_in_
+        X = np.empty((n_rows, n_features), dtype=np.float32)
+
+        is_split = self.left != np.arange(len(self.left))
+        for f in range(n_features):
+            splits = self.threshold[is_split & (self.feature == f)].astype(np.float32)
+            if len(splits) == 0:
+                X[:, f] = rng.random(n_rows)
+                continue
+            low, high = splits.min() - 1.0, splits.max() + 1.0
+            X[:, f] = np.where(
+                rng.random(n_rows) < 0.5,
+                rng.choice(splits, size=n_rows),
+                rng.uniform(low, high, size=n_rows)
+            )
+
+        return bool(np.allclose(self.predict_proba(X), model.predict_proba(X), atol=1e-9))
@@ -0,0 +1,196 @@
+"""
+Índice MinHash/LSH para Taskpin AI
+==================================
+
+Búsqueda aproximada de vecinos para cuando la búsqueda exacta contra
+todos los usuarios deja de escalar (cientos de miles de usuarios).
+
+Los vectores de hábitos son binarios, es decir, CONJUNTOS de hábitos, así
+que se usa MinHash (estima similitud de Jaccard):
+
+    firma[i] = min{ hᵢ(h) : h ∈ hábitos del usuario }
+
+La firma (bands × rows valores) se parte en `bands` bandas de `rows`
+valores. Dos usuarios son candidatos si coinciden en al menos una banda
+completa. La probabilidad de que un par con Jaccard s sea candidato es:
+
+    P(s) = 1 - (1 - s^rows)^bands
+
+Más bandas / menos filas por banda → más recall y más candidatos (más
+lento). Menos bandas / más filas → menos candidatos (más rápido) pero
+se pierden vecinos poco similares.
+
+Los candidatos se re-ordenan con la similitud coseno exacta, así que el
+resultado solo difiere del exacto por los vecinos que LSH no encontró.
+"""
+
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Set
+
+
+class MinHashLSH:
+    """
+    Firmas MinHash por usuario + tablas hash por banda.
+    """
+
+    # Configuración por defecto: umbral ≈ (1/bands)^(1/rows) ≈ 0.3
+    DEFAULT_BANDS = 16
+    DEFAULT_ROWS = 2
+
+    # Primo de Mersenne 2^31 - 1 para las funciones hash universales
+    _PRIME = (1 << 31) - 1
+
+    # Valor de firma para usuarios sin hábitos (nunca son candidatos)
+    _EMPTY = np.iinfo(np.int64).max
+
+    # Filas de la matriz procesadas a la vez al calcular firmas
+    _BLOCK_ROWS = 8192
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS, seed: int = 42):
+        if bands < 1 or rows < 1:
+            raise ValueError("bands y rows deben ser >= 1")
+
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+
+        # hᵢ(x) = (aᵢ·x + bᵢ) mod p
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self._PRIME, size=self.num_perm, dtype=np.int64)
+        self._b = rng.integers(0, self._PRIME, size=self.num_perm, dtype=np.int64)
+
+        self._hash_table = np.empty((0, self.num_perm), dtype=np.int64)
+        self.signatures = np.empty((0, self.num_perm), dtype=np.int64)
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(bands)]
+
+    @property
+    def threshold(self) -> float:
+        """Jaccard aproximado a partir del cual un par suele ser candidato."""
+        return (1.0 / self.bands) ** (1.0 / self.rows)
+
+    def __len__(self) -> int:
+        return self.signatures.shape[0]
+
+    # ========================================
+    # FIRMAS
+    # ========================================
+
+    def _ensure_hash_table(self, n_habits: int):
+        """Precalcula hᵢ(columna) para todas las columnas: (n_habits × num_perm)."""
+        if self._hash_table.shape[0] >= n_habits:
+            return
+        cols = np.arange(n_habits, dtype=np.int64)[:, None]
+        self._hash_table = (cols * self._a[None, :] + self._b[None, :]) % self._PRIME
+
+    def _compute_signatures(self, matrix: sparse.csr_matrix) -> np.ndarray:
+        """
+        Firmas MinHash de todas las filas de la matriz.
+
+        Para cada fila se toma el mínimo de hᵢ sobre sus columnas no
+        cero, con np.minimum.reduceat sobre los índices del CSR.
+        """
+        n_rows, n_habits = matrix.shape
+        self._ensure_hash_table(n_habits)
+        signatures = np.full((n_rows, self.num_perm), self._EMPTY, dtype=np.int64)
+
+        for start in range(0, n_rows, self._BLOCK_ROWS):
+            end = min(start + self._BLOCK_ROWS, n_rows)
+            indptr = matrix.indptr[start:end + 1]
+            indices = matrix.indices[indptr[0]:indptr[-1]]
+            if len(indices) == 0:
+                continue
+
+            offsets = indptr[:-1] - indptr[0]
+            non_empty = np.diff(indptr) > 0
+            hashed = self._hash_table[indices]
+            mins = np.minimum.reduceat(hashed, offsets[non_empty], axis=0)
+            signatures[start:end][non_empty] = mins
+
+        return signatures
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        """Clave de cada banda de una firma."""
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def _insert(self, row: int):
+        signature = self.signatures[row]
+        if signature[0] == self._EMPTY:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band].setdefault(key, set()).add(row)
+
+    def _remove(self, row: int):
+        signature = self.signatures[row]
+        if signature[0] == self._EMPTY:
+            return
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    # ========================================
+    # CONSTRUCCIÓN Y ACTUALIZACIÓN
+    # ========================================
+
+    def build(self, matrix: sparse.csr_matrix):
+        """Calcula las firmas de todos los usuarios y llena las tablas."""
+        self.signatures = self._compute_signatures(matrix)
+        self._buckets = [{} for _ in range(self.bands)]
+
+        # Agrupar por banda de forma vectorizada: las filas con la misma
+        # clave de banda quedan contiguas tras ordenar
+        non_empty = np.flatnonzero(self.signatures[:, 0] != self._EMPTY)
+        for band in range(self.bands):
+            band_sig = np.ascontiguousarray(
+                self.signatures[non_empty, band * self.rows:(band + 1) * self.rows]
+            )
+            keys = band_sig.view(np.dtype((np.void, band_sig.dtype.itemsize * self.rows))).ravel()
+            order = np.argsort(keys, kind='stable')
+            sorted_keys = keys[order]
+            boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+            table = self._buckets[band]
+            for group in np.split(order, boundaries):
+                if len(group) == 0:
+                    continue
+                table[band_sig[group[0]].tobytes()] = set(non_empty[group].tolist())
+
+    def update_rows(self, matrix: sparse.csr_matrix, rows: np.ndarray):
+        """
+        Recalcula las firmas de las filas modificadas (o nuevas) y las
+        mueve de cubeta. Solo toca esas filas.
+        """
+        n_rows = matrix.shape[0]
+        if n_rows > len(self.signatures):
+            extra = np.full(
+                (n_rows - len(self.signatures), self.num_perm), self._EMPTY, dtype=np.int64
+            )
+            self.signatures = np.vstack([self.signatures, extra])
+
+        rows = np.unique(rows)
+        new_signatures = self._compute_signatures(matrix[rows])
+        for row, signature in zip(rows.tolist(), new_signatures):
+            self._remove(row)
+            self.signatures[row] = signature
+            self._insert(row)
+
+    # ========================================
+    # CONSULTA
+    # ========================================
+
+    def candidates(self, row: int) -> np.ndarray:
+        """Filas que comparten al menos una banda con la fila dada (sin ella)."""
+        signature = self.signatures[row]
+        if signature[0] == self._EMPTY:
+            return np.empty(0, dtype=np.int64)
+
+        found: Set[int] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self._buckets[band].get(key, ()))
+        found.discard(row)
+        return np.fromiter(found, dtype=np.int64, count=len(found))
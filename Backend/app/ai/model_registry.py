@@ -0,0 +1,141 @@
+"""
+Registro de Modelos para Taskpin AI
+===================================
+
+Versiones del modelo de predicción sobre el ArtifactStore:
+
+    <artifacts>/predictor/
+        CURRENT                      -> versión activa
+        v1718049600123-4242/
+            model.joblib             (el RandomForest, para reentrenar)
+            feature.npy, value.npy…  (el bosque aplanado, para predecir)
+            meta.json                (watermark, métricas, features)
+
+Publicar escribe la versión completa en un directorio temporal, la mueve
+a su lugar y recién entonces cambia CURRENT (os.replace, atómico): un
+worker nunca abre un modelo a medio escribir. Después se avisa por
+Redis pub/sub para que los workers de la API cambien de modelo sin
+reiniciar; si Redis no está, los workers revisan CURRENT periódicamente.
+
+Para predecir basta el bosque aplanado (ver flat_forest.py), que se abre
+con mmap y no necesita sklearn; el modelo joblib solo se carga cuando se
+pide (entrenamiento incremental) o si la versión no trae bosque.
+"""
+
+import joblib
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .artifact_store import ArtifactStore
+from .flat_forest import FlatForest
+
+# Import Redis client (graceful fallback if not available)
+try:
+    from ..core.redis_client import redis_client
+except ImportError:
+    redis_client = None
+
+
+class ModelRegistry:
+    """
+    Versiones del modelo con metadata y puntero "current" atómico.
+    """
+
+    ARTIFACT_NAME = 'predictor'
+    MODEL_FILE = 'model.joblib'
+
+    # Canal de Redis donde se anuncia cada versión publicada
+    CHANNEL = 'models:predictor:published'
+
+    def __init__(self, store: Optional[ArtifactStore] = None):
+        self.store = store or ArtifactStore()
+
+    def publish(self, model: Any, meta: Dict[str, Any], forest: Optional[FlatForest] = None) -> str:
+        """
+        Publica una versión nueva del modelo, la activa y la anuncia.
+
+        Args:
+            model: Modelo entrenado
+            meta: Metadata (watermark, métricas, features)
+            forest: Bosque aplanado del modelo (opcional)
+
+        Returns:
+            Versión publicada
+        """
+        version = self.store.publish(
+            self.ARTIFACT_NAME,
+            arrays=forest.to_arrays() if forest is not None else None,
+            meta=meta,
+            files={self.MODEL_FILE: lambda path: joblib.dump(model, path)}
+        )
+        self._notify(version)
+        return version
+
+    def activate(self, version: str):
+        """Vuelve a activar una versión anterior (rollback) y lo anuncia."""
+        self.store.set_current(self.ARTIFACT_NAME, version)
+        self._notify(version)
+
+    def _notify(self, version: str):
+        if redis_client is not None:
+            redis_client.publish(self.CHANNEL, version)
+
+    def current_version(self) -> Optional[str]:
+        return self.store.current_version(self.ARTIFACT_NAME)
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Versiones disponibles con su metadata (la más reciente primero)."""
+        current = self.current_version()
+        return [
+            {
+                'version': version,
+                'current': version == current,
+                **(self.store.read_meta(self.ARTIFACT_NAME, version) or {})
+            }
+            for version in self.store.versions(self.ARTIFACT_NAME)
+        ]
+
+    def load(self, version: Optional[str] = None, with_model: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Carga una versión (por defecto la activa): el bosque aplanado con
+        mmap y, si se pide o no hay bosque, el modelo joblib.
+
+        Args:
+            version: Versión a cargar (opcional)
+            with_model: Cargar también el modelo de sklearn
+
+        Returns:
+            Dict con 'version', 'meta', 'forest' y 'model' (None si no se
+            cargó), o None si no hay modelo
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None
+
+        loaded = self.store.load(self.ARTIFACT_NAME, version)
+        if loaded is None:
+            return None
+
+        forest = FlatForest.from_arrays(loaded['arrays']) if loaded['arrays'] else None
+        model = None
+        if with_model or forest is None:
+            model = self.load_model(version)
+            if model is None and forest is None:
+                return None
+
+        return {'version': version, 'meta': loaded['meta'], 'forest': forest, 'model': model}
+
+    def load_model(self, version: str) -> Optional[Any]:
+        """
+        Carga el modelo de sklearn de una versión. Los arreglos numpy del
+        modelo se abren con mmap (mmap_mode='r').
+        """
+        model_path = self.store.path(self.ARTIFACT_NAME, version) / self.MODEL_FILE
+        if not Path(model_path).exists():
+            return None
+
+        try:
+            return joblib.load(model_path, mmap_mode='r')
+        except Exception as e:
+            print(f"❌ Error cargando modelo {version}: {e}")
+            return None
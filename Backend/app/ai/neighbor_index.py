@@ -0,0 +1,199 @@
+"""
+Índice de Vecinos Precalculado para Taskpin AI
+
+Guarda, para cada usuario, sus K usuarios más similares (similitud coseno)
+en dos arreglos compactos:
+
+    neighbors[i, :] = user_id de los K vecinos del usuario i (-1 = vacío)
+    scores[i, :]    = similitud de cada vecino (orden descendente)
+
+El índice se construye en background (Celery) con productos de matrices
+por bloques de usuarios, y las peticiones solo hacen una búsqueda.
+
+Se publica en el ArtifactStore: los workers de la API lo abren con mmap
+y comparten una sola copia en memoria.
+"""
+
+import time
+import numpy as np
+from scipy import sparse
+from typing import Dict, List, Optional
+
+from .artifact_store import ArtifactStore
+
+
+class NeighborIndex:
+    """
+    Top-K vecinos por usuario, respaldado por arreglos numpy.
+    """
+
+    # Vecinos guardados por usuario (cubre top_n de todos los endpoints)
+    DEFAULT_K = 50
+
+    # Memoria máxima del bloque denso de similitudes (bytes)
+    BLOCK_BYTES = 64 * 1024 * 1024
+
+    # Nombre del artefacto en el ArtifactStore
+    ARTIFACT_NAME = 'neighbor_index'
+
+    def __init__(
+        self,
+        user_ids: np.ndarray,
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        built_at: float
+    ):
+        self.user_ids = user_ids
+        self.neighbors = neighbors
+        self.scores = scores
+        self.built_at = built_at
+        # Búsqueda de fila por user_id con búsqueda binaria: los arreglos
+        # pueden estar mapeados (compartidos), solo el orden es privado
+        self._order = np.argsort(user_ids, kind='stable')
+        self._sorted_ids = user_ids[self._order]
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self._row(user_id) is not None
+
+    def _row(self, user_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self._sorted_ids, user_id))
+        if pos < len(self._sorted_ids) and self._sorted_ids[pos] == user_id:
+            return int(self._order[pos])
+        return None
+
+    # ========================================
+    # CONSTRUCCIÓN
+    # ========================================
+
+    @classmethod
+    def build(
+        cls,
+        matrix: sparse.csr_matrix,
+        inv_norms: np.ndarray,
+        user_ids: List[int],
+        k: int = DEFAULT_K,
+        block_size: Optional[int] = None,
+        built_at: Optional[float] = None
+    ) -> 'NeighborIndex':
+        """
+        Calcula los K vecinos de todos los usuarios.
+
+        Para cada bloque B de usuarios:
+            S = diag(1/‖B‖) · (B · Mᵀ) · diag(1/‖M‖)
+        y se eligen los K mayores de cada fila con argpartition.
+
+        Args:
+            matrix: Matriz usuario-hábito (CSR, binaria)
+            inv_norms: Inverso de la norma de cada fila (0 si la fila está vacía)
+            user_ids: user_id de cada fila
+            k: Vecinos por usuario
+            block_size: Usuarios por bloque (por defecto según BLOCK_BYTES)
+            built_at: Momento (epoch) en que se leyó la matriz; por defecto,
+                el inicio de la construcción. Los usuarios con deltas
+                posteriores no se sirven desde el índice
+        """
+        if built_at is None:
+            built_at = time.time()
+        n_users = matrix.shape[0]
+        k = max(0, min(k, n_users - 1))
+        user_ids_arr = np.asarray(user_ids, dtype=np.int64)
+
+        neighbors = np.full((n_users, k), -1, dtype=np.int64)
+        scores = np.zeros((n_users, k), dtype=np.float32)
+
+        if n_users == 0 or k == 0:
+            return cls(user_ids_arr, neighbors, scores, built_at)
+
+        if block_size is None:
+            block_size = max(1, min(4096, cls.BLOCK_BYTES // (4 * n_users)))
+
+        matrix_t = matrix.T.tocsr()
+
+        for start in range(0, n_users, block_size):
+            end = min(start + block_size, n_users)
+
+            # Similitudes del bloque contra todos los usuarios: (b × n)
+            block = (matrix[start:end] @ matrix_t).toarray()
+            block *= inv_norms[start:end, None]
+            block *= inv_norms[None, :]
+
+            # Excluir al propio usuario
+            rows = np.arange(end - start)
+            block[rows, start + rows] = 0.0
+
+            # Top K por fila (sin ordenar) y luego ordenar solo esos K
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            # Similitud 0 = no es vecino
+            valid = top_scores > 0
+            neighbors[start:end] = np.where(valid, user_ids_arr[top], -1)
+            scores[start:end] = np.where(valid, top_scores, 0.0)
+
+        return cls(user_ids_arr, neighbors, scores, built_at)
+
+    # ========================================
+    # CONSULTA
+    # ========================================
+
+    def lookup(self, user_id: int, top_n: int) -> Optional[List[Dict]]:
+        """
+        Vecinos precalculados de un usuario.
+
+        Returns:
+            Lista de dicts con user_id y similarity (mismo formato que
+            HabitRecommender.find_similar_users), o None si el usuario
+            no está en el índice o top_n excede K.
+        """
+        row = self._row(user_id)
+        if row is None or top_n > self.k:
+            return None
+
+        return [
+            {
+                'user_id': int(uid),
+                'similarity': round(float(score), 4)
+            }
+            for uid, score in zip(self.neighbors[row, :top_n], self.scores[row, :top_n])
+            if uid >= 0
+        ]
+
+    # ========================================
+    # PERSISTENCIA
+    # ========================================
+
+    def publish(self, store: ArtifactStore) -> str:
+        """Publica el índice como nueva versión activa (swap atómico)."""
+        return store.publish(
+            self.ARTIFACT_NAME,
+            {
+                'user_ids': self.user_ids,
+                'neighbors': self.neighbors,
+                'scores': self.scores
+            },
+            meta={'built_at': self.built_at, 'k': self.k}
+        )
+
+    @classmethod
+    def load(cls, store: ArtifactStore, version: Optional[str] = None) -> Optional['NeighborIndex']:
+        """Abre una versión publicada con mmap, o None si no existe."""
+        artifact = store.load(cls.ARTIFACT_NAME, version)
+        if artifact is None:
+            return None
+        arrays = artifact['arrays']
+        return cls(
+            arrays['user_ids'],
+            arrays['neighbors'],
+            arrays['scores'],
+            float(artifact['meta']['built_at'])
+        )
@@ -23,26 +23,36 @@ Features utilizadas:
 El modelo se entrena con datos históricos de seguimiento_habitos.
 
 CACHE: Las predicciones se cachean en Redis por 30 minutos.
+
+MODELO VERSIONADO: cada entrenamiento publica una versión nueva en el
+ModelRegistry (modelo + metadata, puntero "current" atómico). Los workers
+de la API cambian de versión en un hilo de fondo (aviso por Redis pub/sub
+o revisión periódica), sin reiniciar y sin bloquear peticiones.
+
+PREDICCIÓN SIN SKLEARN: al entrenar, el bosque se aplana en arreglos numpy
+(FlatForest) y se verifica contra predict_proba. La API predice con esos
+arreglos (abiertos con mmap) y solo importa sklearn para entrenar.
 """
 
+import copy
+import os
+import threading
 import numpy as np
 import joblib
 import time
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from .feature_extractor import FeatureExtractor
+from .flat_forest import FlatForest
+from .model_registry import ModelRegistry
 
 # Import Redis client (graceful fallback if not available)
 try:
     from ..core.redis_client import redis_client
-    REDIS_AVAILABLE = redis_client.is_connected
 except ImportError:
     redis_client = None
-    REDIS_AVAILABLE = False
 
 
 class HabitPredictor:
@@ -62,26 +72,91 @@ class HabitPredictor:
         'dias_desde_agregado'
     ]
     
-    def __init__(self, model_path: Optional[str] = None):
+    # Intervalo mínimo entre revisiones de la versión activa (segundos)
+    MODEL_CHECK_INTERVAL = 30.0
+    
+    # Filas a partir de las cuales vale la pena predecir con todos los
+    # cores; para lotes chicos el arranque de hilos cuesta más que predecir.
+    # Los hilos se eligen por llamada con joblib.parallel_config (local al
+    # hilo de la petición): el n_jobs del modelo compartido queda en None
+    # y nunca se modifica al predecir
+    PARALLEL_PREDICT_MIN_ROWS = 2000
+    
+    # Entrenamiento incremental: árboles nuevos por corrida y máximo total.
+    # Los árboles del último entrenamiento completo (base) se conservan;
+    # al pasar el máximo se descartan los incrementales más viejos
+    INCREMENTAL_TREES = 20
+    MAX_TREES = 300
+    
+    # Usuarios por lote al precalcular las predicciones de todos
+    PRECOMPUTE_BATCH_USERS = 500
+    
+    def __init__(self, model_path: Optional[str] = None, registry: Optional[ModelRegistry] = None):
         """
         Inicializa el predictor.
         
         Args:
-            model_path: Ruta al modelo guardado (opcional)
+            model_path: Ruta a un modelo suelto de versiones anteriores
+                (solo se usa si el registro está vacío)
+            registry: Registro de modelos (opcional)
         """
         self.feature_extractor = FeatureExtractor()
-        self.model = None
-        self.is_trained = False
-        self.training_accuracy = None
+        self.registry = registry or ModelRegistry()
+        # Modelo en uso: (forest, model, meta, version). Se reemplaza
+        # completo con una sola asignación (ver _set_model) y quien lo lee
+        # lo toma una sola vez, así nunca mezcla piezas de dos versiones.
+        # forest es el bosque aplanado (None: se predice con model)
+        self._active = (None, None, {}, None)
+        self._last_model_check = 0.0
+        self._watcher = None
         self.model_path = model_path or str(
             Path(__file__).parent / 'models' / 'predictor.pkl'
         )
         
         # Intentar cargar modelo existente
-        if Path(self.model_path).exists():
-            self.load_model()
+        self.load_model()
+    
+    @property
+    def forest(self) -> Optional[FlatForest]:
+        return self._active[0]
+    
+    @property
+    def model(self):
+        return self._active[1]
+    
+    @property
+    def model_meta(self) -> Dict:
+        return self._active[2]
     
-    def _create_model(self) -> RandomForestClassifier:
+    @property
+    def model_version(self) -> Optional[str]:
+        return self._active[3]
+    
+    @property
+    def is_trained(self) -> bool:
+        forest, model, _, _ = self._active
+        return forest is not None or model is not None
+    
+    @property
+    def training_accuracy(self) -> Optional[float]:
+        return self.model_meta.get('training_accuracy')
+    
+    @property
+    def training_watermark(self) -> Optional[str]:
+        """Última fecha de seguimiento incluida en el entrenamiento."""
+        return self.model_meta.get('training_watermark')
+    
+    @property
+    def base_trees(self) -> Optional[int]:
+        """Árboles del último entrenamiento completo (al inicio del bosque)."""
+        return self.model_meta.get('base_trees')
+    
+    @property
+    def base_watermark(self) -> Optional[str]:
+        """Marca del último entrenamiento completo."""
+        return self.model_meta.get('base_watermark')
+    
+    def _create_model(self) -> 'RandomForestClassifier':
         """
         Crea una nueva instancia del modelo Random Forest.
         
@@ -90,17 +165,21 @@ class HabitPredictor:
         - max_depth=10: Profundidad máxima para evitar overfitting
         - min_samples_split=5: Mínimo de muestras para dividir un nodo
         - random_state=42: Reproducibilidad
+        - n_jobs=None: hilos según joblib.parallel_config (todos los
+          cores al entrenar, según el tamaño del lote al predecir)
         """
+        from sklearn.ensemble import RandomForestClassifier
+        
         return RandomForestClassifier(
             n_estimators=100,
             max_depth=10,
             min_samples_split=5,
             min_samples_leaf=2,
             random_state=42,
-            n_jobs=-1  # Usar todos los cores
+            n_jobs=None
         )
     
-    def train(self, test_size: float = 0.2, save: bool = True) -> Dict:
+    def train(self, test_size: float = 0.2, save: bool = True, streaming: bool = False) -> Dict:
         """
         Entrena el modelo con datos históricos.
         
@@ -114,12 +193,23 @@ class HabitPredictor:
         Args:
             test_size: Proporción de datos para test (default 20%)
             save: Si guardar el modelo después de entrenar
+            streaming: Leer el historial por bloques con cursor del
+                servidor (para historiales grandes, ver
+                FeatureExtractor.get_training_data_streaming)
             
         Returns:
             Dict con métricas de entrenamiento
         """
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score
+        
         print("📊 Obteniendo datos de entrenamiento...")
-        X, y = self.feature_extractor.get_training_data_for_predictor(min_records=50)
+        # Se entrena con registros anteriores a hoy
+        watermark = date.today() - timedelta(days=1)
+        if streaming:
+            X, y = self.feature_extractor.get_training_data_streaming(min_records=50)
+        else:
+            X, y = self.feature_extractor.get_training_data_for_predictor(min_records=50)
         
         if len(X) < 50:
             return {
@@ -129,8 +219,9 @@ class HabitPredictor:
             }
         
         print(f"   Registros totales: {len(X)}")
-        print(f"   Positivos (completados): {sum(y)}")
-        print(f"   Negativos (no completados): {len(y) - sum(y)}")
+        positivos = int(y.sum())
+        print(f"   Positivos (completados): {positivos}")
+        print(f"   Negativos (no completados): {len(y) - positivos}")
         
         # Dividir en train/test
         X_train, X_test, y_train, y_test = train_test_split(
@@ -141,21 +232,30 @@ class HabitPredictor:
         print(f"   Train: {len(X_train)} registros")
         print(f"   Test: {len(X_test)} registros")
         
-        # Crear y entrenar modelo
-        self.model = self._create_model()
-        self.model.fit(X_train, y_train)
+        # Crear y entrenar modelo (en locales: el modelo en uso sigue
+        # atendiendo peticiones hasta que se publique el nuevo)
+        model = self._create_model()
+        with joblib.parallel_config(n_jobs=-1):  # Usar todos los cores
+            model.fit(X_train, y_train)
+        forest = self._flatten_model(model)
         
         # Evaluar
-        y_pred = self.model.predict(X_test)
+        y_pred = model.predict(X_test)
         accuracy = accuracy_score(y_test, y_pred)
-        self.training_accuracy = accuracy
-        self.is_trained = True
+        meta = self._build_meta(
+            model,
+            accuracy,
+            watermark.isoformat(),
+            base_trees=len(model.estimators_),
+            base_watermark=watermark.isoformat()
+        )
+        self._set_model(model, meta, None, forest)
         
         print(f"\n✅ Entrenamiento completado!")
         print(f"   Accuracy: {accuracy:.2%}")
         
         # Feature importance
-        importances = dict(zip(self.FEATURE_NAMES, self.model.feature_importances_))
+        importances = dict(zip(self.FEATURE_NAMES, model.feature_importances_))
         sorted_importances = sorted(importances.items(), key=lambda x: x[1], reverse=True)
         
         print(f"\n📈 Importancia de features:")
@@ -175,6 +275,133 @@ class HabitPredictor:
             'feature_importance': {k: round(v, 4) for k, v in importances.items()}
         }
     
+    def train_incremental(self, test_size: float = 0.2, save: bool = True) -> Dict:
+        """
+        Entrena solo con los registros posteriores a la última marca de
+        entrenamiento (training_watermark), agregando árboles nuevos al
+        bosque con warm_start en lugar de reentrenar todo.
+        
+        Cada corrida agrega INCREMENTAL_TREES árboles entrenados con los
+        datos nuevos. Los árboles base (del último entrenamiento completo,
+        con todo el historial) se conservan siempre; si el bosque pasa de
+        MAX_TREES se descartan los incrementales más viejos, así que la
+        parte incremental es una ventana sobre los datos recientes. El
+        historial completo se vuelve a aprender con el reentrenamiento
+        completo semanal (beat: full-retrain-predictor). El costo crece con
+        los datos nuevos, no con el historial total.
+        
+        Cada corrida usa una semilla derivada de la marca nueva: con
+        random_state fijo y el bosque en MAX_TREES, sklearn les daría las
+        mismas semillas a los árboles nuevos de todas las noches.
+        
+        Si no hay modelo, marca previa o registro de árboles base, hace un
+        entrenamiento completo.
+        
+        Args:
+            test_size: Proporción de datos nuevos para evaluar
+            save: Si guardar el modelo después de entrenar
+            
+        Returns:
+            Dict con métricas de entrenamiento
+        """
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import accuracy_score
+        
+        self._ensure_model()
+        _, model, meta, version = self._active
+        if model is None and version:
+            # Los workers solo cargan el bosque aplanado; para agregar
+            # árboles hace falta el modelo de sklearn
+            model = self.registry.load_model(version)
+        
+        if model is None or not meta.get('training_watermark') or meta.get('base_trees') is None:
+            print("ℹ️ Sin modelo, marca previa o árboles base: entrenamiento completo")
+            return self.train(test_size=test_size, save=save, streaming=True)
+        
+        since = date.fromisoformat(meta['training_watermark'])
+        watermark = date.today() - timedelta(days=1)
+        
+        print(f"📊 Obteniendo datos nuevos (posteriores a {since})...")
+        X, y = self.feature_extractor.get_training_data_since(since)
+        
+        if len(X) < 50 or len(np.unique(y)) < len(model.classes_):
+            return {
+                'success': False,
+                'error': f'Insuficientes datos nuevos ({len(X)} registros)',
+                'min_required': 50,
+                'watermark': meta['training_watermark']
+            }
+        
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=42, stratify=y
+        )
+        
+        print(f"\n🌲 Agregando {self.INCREMENTAL_TREES} árboles...")
+        print(f"   Train: {len(X_train)} registros nuevos")
+        
+        # Copia propia del modelo (los árboles se comparten, no se modifican):
+        # el modelo en uso puede estar atendiendo peticiones
+        model = copy.copy(model)
+        model.n_jobs = None
+        
+        # Descartar los árboles incrementales más viejos si se pasa del máximo
+        model.estimators_ = self._rotate_estimators(model.estimators_, meta['base_trees'])
+        model.n_estimators = len(model.estimators_) + self.INCREMENTAL_TREES
+        
+        model.random_state = self._incremental_seed(watermark)
+        model.warm_start = True
+        with joblib.parallel_config(n_jobs=-1):
+            model.fit(X_train, y_train)
+        model.warm_start = False
+        forest = self._flatten_model(model)
+        
+        # Evaluar con los datos nuevos
+        accuracy = accuracy_score(y_test, model.predict(X_test))
+        meta = self._build_meta(
+            model,
+            accuracy,
+            watermark.isoformat(),
+            base_trees=meta['base_trees'],
+            base_watermark=meta.get('base_watermark')
+        )
+        self._set_model(model, meta, None, forest)
+        
+        print(f"\n✅ Entrenamiento incremental completado!")
+        print(f"   Árboles: {len(model.estimators_)}")
+        print(f"   Accuracy (datos nuevos): {accuracy:.2%}")
+        
+        if save:
+            self.save_model()
+        
+        return {
+            'success': True,
+            'incremental': True,
+            'total_records': len(X),
+            'train_records': len(X_train),
+            'test_records': len(X_test),
+            'n_estimators': len(model.estimators_),
+            'accuracy': round(accuracy, 4),
+            'watermark': self.training_watermark
+        }
+    
+    @classmethod
+    def _rotate_estimators(cls, estimators, base_trees: int) -> list:
+        """
+        Árboles que quedan antes de agregar INCREMENTAL_TREES: todos los
+        base y, de los incrementales, los más nuevos que entren en MAX_TREES.
+        """
+        estimators = list(estimators)
+        base, incremental = estimators[:base_trees], estimators[base_trees:]
+        excess = len(estimators) + cls.INCREMENTAL_TREES - cls.MAX_TREES
+        if excess > 0:
+            incremental = incremental[excess:]
+        return base + incremental
+    
+    @staticmethod
+    def _incremental_seed(watermark: date) -> int:
+        """Semilla de una corrida incremental (distinta por marca, reproducible)."""
+        return int(watermark.strftime('%Y%m%d'))
+    
     def predict(self, user_id: int, habito_usuario_id: int) -> Optional[Dict]:
         """
         Predice la probabilidad de completar un hábito hoy.
@@ -186,10 +413,8 @@ class HabitPredictor:
         Returns:
             Dict con probabilidad y factores, o None si no hay modelo
         """
-        if not self.is_trained:
-            # Intentar cargar modelo
-            if not self.load_model():
-                return None
+        if not self._ensure_model():
+            return None
         
         # Obtener features actuales
         features = self.feature_extractor.get_habit_completion_features(
@@ -199,18 +424,8 @@ class HabitPredictor:
         if not features:
             return None
         
-        # Construir vector de features en el orden correcto
-        X = np.array([[
-            features['dia_semana'],
-            features['racha_actual'],
-            features['tasa_exito_7_dias'],
-            features['completado_ayer'],
-            features['dias_desde_agregado']
-        ]], dtype=np.float32)
-        
         # Predecir probabilidad
-        proba = self.model.predict_proba(X)[0]
-        prob_completar = float(proba[1]) if len(proba) > 1 else float(proba[0])
+        prob_completar = float(self._predict_probabilities(self._features_matrix([features]))[0])
         
         # Analizar factores
         factores_positivos, factores_negativos = self._analyze_factors(features)
@@ -239,7 +454,7 @@ class HabitPredictor:
         # Intentar obtener de cache
         cache_key = f"predictions:user:{user_id}"
         
-        if use_cache and REDIS_AVAILABLE and redis_client:
+        if use_cache and redis_client and redis_client.is_connected:
             cached = redis_client.get_json(cache_key)
             if cached is not None:
                 print(f"[Cache HIT] Predictions for user {user_id}")
@@ -247,9 +462,8 @@ class HabitPredictor:
         
         start_time = time.time()
         
-        if not self.is_trained:
-            if not self.load_model():
-                return []
+        if not self._ensure_model():
+            return []
         
         # Obtener todos los hábitos con sus features
         habits_features = self.feature_extractor.get_all_user_habits_features(user_id)
@@ -257,32 +471,155 @@ class HabitPredictor:
         if not habits_features:
             return []
         
-        predictions = []
+        # Una sola llamada al modelo para todos los hábitos
+        X = self._features_matrix([habit['features'] for habit in habits_features])
+        probabilities = self._predict_probabilities(X)
+        predictions = self._build_predictions(habits_features, probabilities)
         
-        for habit in habits_features:
-            features = habit['features']
-            
-            # Construir vector
-            X = np.array([[
-                features['dia_semana'],
-                features['racha_actual'],
-                features['tasa_exito_7_dias'],
-                features['completado_ayer'],
-                features['dias_desde_agregado']
-            ]], dtype=np.float32)
+        # Guardar en cache (30 minutos = 1800 segundos)
+        if use_cache and redis_client and redis_client.is_connected:
+            redis_client.set_json(cache_key, predictions, ttl=1800)
+            elapsed = time.time() - start_time
+            print(f"[Cache SET] Predictions for user {user_id} ({elapsed:.3f}s)")
+        
+        return predictions
+    
+    def refresh_habit_predictions(self, user_id: int, habito_usuario_ids: List[int]) -> List[Dict]:
+        """
+        Recalcula solo las predicciones de los hábitos dados y las
+        reemplaza en la lista cacheada del usuario, sin descartarla (el
+        cache sigue caliente). Si no hay cache, calcula todos los hábitos.
+        
+        Args:
+            user_id: ID del usuario
+            habito_usuario_ids: Hábitos a recalcular
             
-            # Predecir
-            proba = self.model.predict_proba(X)[0]
-            prob_completar = float(proba[1]) if len(proba) > 1 else float(proba[0])
+        Returns:
+            Predicciones del usuario ya actualizadas
+        """
+        cache_key = f"predictions:user:{user_id}"
+        cached = redis_client.get_json(cache_key) if redis_client and redis_client.is_connected else None
+        if cached is None:
+            return self.predict_all_habits(user_id, use_cache=True)
+        
+        if not self._ensure_model():
+            return cached
+        
+        habits = self.feature_extractor.get_habits_features(user_id, habito_usuario_ids)
+        fresh = []
+        if habits:
+            X = self._features_matrix([habit['features'] for habit in habits])
+            fresh = self._build_predictions(habits, self._predict_probabilities(X))
+        
+        # Los hábitos pedidos que ya no vienen (desactivados) se quitan
+        refreshed = set(habito_usuario_ids)
+        predictions = [p for p in cached if p['habito_usuario_id'] not in refreshed] + fresh
+        predictions.sort(key=lambda x: x['probabilidad'], reverse=True)
+        
+        # Conservar el vencimiento original (p. ej. el del precálculo nocturno)
+        redis_client.set_json(cache_key, predictions, ttl=redis_client.get_ttl(cache_key) or 1800)
+        
+        return predictions
+    
+    def predict_many_users(self, user_ids: List[int]) -> Dict[int, List[Dict]]:
+        """
+        Predice todos los hábitos de muchos usuarios con una sola llamada
+        al modelo (para trabajos de precálculo).
+        
+        Args:
+            user_ids: IDs de los usuarios
             
+        Returns:
+            Dict user_id -> predicciones (mismo formato que predict_all_habits)
+        """
+        if not self._ensure_model():
+            return {}
+        
+        # Features de todos los usuarios en una sola consulta
+        habits_by_user = self.feature_extractor.get_users_habits_features(user_ids)
+        
+        all_habits = [habit for habits in habits_by_user.values() for habit in habits]
+        if not all_habits:
+            return {user_id: [] for user_id in user_ids}
+        
+        X = self._features_matrix([habit['features'] for habit in all_habits])
+        probabilities = self._predict_probabilities(X)
+        
+        # Repartir las probabilidades por usuario (mismo orden de filas)
+        results = {}
+        offset = 0
+        for user_id, habits in habits_by_user.items():
+            results[user_id] = self._build_predictions(
+                habits, probabilities[offset:offset + len(habits)]
+            )
+            offset += len(habits)
+        
+        return results
+    
+    def iter_all_predictions(
+        self,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        batch_size: Optional[int] = None
+    ) -> Iterable[Dict[int, List[Dict]]]:
+        """
+        Genera las predicciones de hoy de todos los usuarios activos (o de
+        un shard: user_id % shard_count == shard_index), por lotes.
+        
+        Cada lote es una consulta de features y una llamada al modelo
+        (predict_many_users). Pensado para Celery: produce un dict
+        {user_id: predicciones} por lote, para guardarlo en cache sin
+        acumular todo en memoria.
+        """
+        if not self._ensure_model():
+            return
+        
+        batch_size = batch_size or self.PRECOMPUTE_BATCH_USERS
+        user_ids = [
+            user_id for user_id in self.feature_extractor.get_all_user_ids()
+            if user_id % shard_count == shard_index
+        ]
+        
+        for start in range(0, len(user_ids), batch_size):
+            yield self.predict_many_users(user_ids[start:start + batch_size])
+    
+    def _features_matrix(self, features_list: List[Dict]) -> np.ndarray:
+        """Apila los dicts de features en una matriz (n × 5) en orden FEATURE_NAMES."""
+        return np.array(
+            [[features[name] for name in self.FEATURE_NAMES] for features in features_list],
+            dtype=np.float32
+        )
+    
+    def _predict_probabilities(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidad de completar para cada fila de X, en una sola llamada
+        a predict_proba (del bosque aplanado si existe).
+        """
+        # Una sola lectura: el hilo de fondo puede cambiar el modelo
+        forest, model, _, _ = self._active
+        if forest is not None:
+            proba = forest.predict_proba(X)
+            return proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
+        
+        # Lotes chicos en un solo hilo (sin overhead de arranque de hilos)
+        n_jobs = -1 if len(X) >= self.PARALLEL_PREDICT_MIN_ROWS else 1
+        with joblib.parallel_config(n_jobs=n_jobs):
+            proba = model.predict_proba(X)
+        return proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
+    
+    def _build_predictions(self, habits_features: List[Dict], probabilities: np.ndarray) -> List[Dict]:
+        """Arma la respuesta por hábito, ordenada por probabilidad descendente."""
+        predictions = []
+        
+        for habit, prob_completar in zip(habits_features, probabilities):
             # Analizar factores
-            factores_pos, factores_neg = self._analyze_factors(features)
+            factores_pos, factores_neg = self._analyze_factors(habit['features'])
             
             predictions.append({
                 'habito_usuario_id': habit['habito_usuario_id'],
                 'habito_id': habit['habito_id'],
                 'nombre': habit['nombre'],
-                'probabilidad': round(prob_completar, 3),
+                'probabilidad': round(float(prob_completar), 3),
                 'factores_positivos': factores_pos,
                 'factores_negativos': factores_neg
             })
@@ -290,12 +627,6 @@ class HabitPredictor:
         # Ordenar por probabilidad descendente
         predictions.sort(key=lambda x: x['probabilidad'], reverse=True)
         
-        # Guardar en cache (30 minutos = 1800 segundos)
-        if use_cache and REDIS_AVAILABLE and redis_client:
-            redis_client.set_json(cache_key, predictions, ttl=1800)
-            elapsed = time.time() - start_time
-            print(f"[Cache SET] Predictions for user {user_id} ({elapsed:.3f}s)")
-        
         return predictions
     
     def _analyze_factors(self, features: Dict) -> Tuple[List[str], List[str]]:
@@ -350,71 +681,190 @@ class HabitPredictor:
     
     def save_model(self, path: Optional[str] = None) -> bool:
         """
-        Guarda el modelo entrenado en disco.
+        Publica el modelo entrenado como nueva versión en el registro
+        (o, con `path`, lo exporta a un archivo suelto).
         
         Args:
-            path: Ruta donde guardar (usa default si no se especifica)
+            path: Ruta de exportación (opcional)
             
         Returns:
             True si se guardó correctamente
         """
-        if not self.is_trained:
+        forest, model, meta, _ = self._active
+        if model is None:
             print("⚠️ No hay modelo entrenado para guardar")
             return False
         
-        save_path = path or self.model_path
-        
-        # Crear directorio si no existe
-        Path(save_path).parent.mkdir(parents=True, exist_ok=True)
-        
-        # Guardar modelo y metadata
-        data = {
-            'model': self.model,
-            'feature_names': self.FEATURE_NAMES,
-            'training_accuracy': self.training_accuracy
-        }
+        if path:
+            # Escribir a un temporal y reemplazar: nunca queda un archivo
+            # a medio escribir
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            joblib.dump({'model': model, **meta}, tmp_path)
+            os.replace(tmp_path, path)
+            print(f"💾 Modelo exportado a: {path}")
+            return True
         
-        joblib.dump(data, save_path)
-        print(f"💾 Modelo guardado en: {save_path}")
+        version = self.registry.publish(model, meta, forest=forest)
+        self._set_model(model, meta, version, forest)
+        print(f"💾 Modelo publicado: versión {version}")
         
         return True
     
-    def load_model(self, path: Optional[str] = None) -> bool:
+    def load_model(self, path: Optional[str] = None, version: Optional[str] = None) -> bool:
         """
-        Carga un modelo guardado desde disco.
+        Carga un modelo: la versión indicada o la activa del registro.
+        Si el registro está vacío, carga el archivo suelto de versiones
+        anteriores (model_path), si existe.
         
         Args:
-            path: Ruta del modelo (usa default si no se especifica)
+            path: Ruta de un archivo suelto (opcional)
+            version: Versión del registro (opcional)
             
         Returns:
             True si se cargó correctamente
         """
+        if path is None:
+            loaded = self.registry.load(version)
+            if loaded is not None:
+                self._set_model(loaded['model'], loaded['meta'], loaded['version'], loaded['forest'])
+                print(f"📂 Modelo cargado: versión {loaded['version']}")
+                return True
+            if version is not None:
+                return False
+        
         load_path = path or self.model_path
         
         if not Path(load_path).exists():
             return False
         
         try:
-            data = joblib.load(load_path)
-            self.model = data['model']
-            self.training_accuracy = data.get('training_accuracy')
-            self.is_trained = True
+            data = joblib.load(load_path, mmap_mode='r')
+            self._set_model(data['model'], data, None)
             print(f"📂 Modelo cargado desde: {load_path}")
             return True
         except Exception as e:
             print(f"❌ Error cargando modelo: {e}")
             return False
     
+    def _set_model(self, model, meta: Dict, version: Optional[str], forest: Optional[FlatForest] = None):
+        """Cambia el modelo en uso (una sola asignación; las peticiones en
+        curso terminan con el modelo anterior)."""
+        if model is not None and model is not self.model:
+            # Modelos guardados con n_jobs fijo: se ajusta una vez, antes de
+            # que lo vea cualquier petición (ver PARALLEL_PREDICT_MIN_ROWS)
+            model.n_jobs = None
+        self._active = (forest, model, meta, version)
+    
+    def _build_meta(
+        self,
+        model,
+        accuracy: float,
+        watermark: str,
+        base_trees: int,
+        base_watermark: Optional[str]
+    ) -> Dict:
+        """Metadata de un modelo recién entrenado (se publica con él)."""
+        return {
+            'feature_names': self.FEATURE_NAMES,
+            'training_accuracy': accuracy,
+            'training_watermark': watermark,
+            'base_trees': base_trees,
+            'base_watermark': base_watermark,
+            'n_estimators': len(getattr(model, 'estimators_', [])),
+            'max_depth': model.max_depth
+        }
+    
+    def _flatten_model(self, model) -> Optional[FlatForest]:
+        """
+        Aplana el modelo recién entrenado y lo compara contra
+        predict_proba; si no coinciden, se sigue prediciendo con sklearn.
+        """
+        forest = FlatForest.from_sklearn(model)
+        if not forest.check_parity(model):
+            print("⚠️ El bosque aplanado no coincide con predict_proba; se usará sklearn")
+            return None
+        return forest
+    
+    def _refresh_model(self):
+        """Carga la versión activa del registro si cambió."""
+        version = self.registry.current_version()
+        if version is not None and version != self.model_version:
+            self.load_model(version=version)
+    
+    def _ensure_model(self) -> bool:
+        """
+        Asegura que haya un modelo cargado y que sea la versión activa.
+        
+        Con el watcher corriendo, el cambio de versión lo hace el hilo de
+        fondo; si no, se revisa aquí como máximo cada
+        MODEL_CHECK_INTERVAL segundos.
+        
+        Returns:
+            True si hay modelo disponible
+        """
+        if self._watcher is not None and self.is_trained:
+            return True
+        
+        now = time.monotonic()
+        if self.is_trained and now - self._last_model_check < self.MODEL_CHECK_INTERVAL:
+            return True
+        self._last_model_check = now
+        
+        self._refresh_model()
+        if not self.is_trained:
+            self.load_model()
+        
+        return self.is_trained
+    
+    def start_model_watcher(self):
+        """
+        Inicia un hilo de fondo que cambia al modelo recién publicado en
+        cuanto llega el aviso por Redis pub/sub (o, sin Redis, cada
+        MODEL_CHECK_INTERVAL segundos). La carga ocurre fuera de las
+        peticiones: ninguna espera a que se lea el modelo nuevo.
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch_models, name="model-watcher", daemon=True
+        )
+        self._watcher.start()
+    
+    def _watch_models(self):
+        pubsub = None
+        while True:
+            try:
+                if pubsub is None and redis_client and redis_client.is_connected:
+                    pubsub = redis_client.subscribe(ModelRegistry.CHANNEL)
+                
+                if pubsub is not None:
+                    # Espera un aviso; sin aviso, igual revisa al vencer el timeout
+                    pubsub.get_message(timeout=self.MODEL_CHECK_INTERVAL)
+                else:
+                    time.sleep(self.MODEL_CHECK_INTERVAL)
+                
+                self._refresh_model()
+            except Exception as e:
+                print(f"[Predictor] Model watcher error: {e}")
+                pubsub = None
+                time.sleep(self.MODEL_CHECK_INTERVAL)
+    
     def get_model_info(self) -> Dict:
         """
         Retorna información sobre el estado del modelo.
         """
+        _, model, meta, version = self._active
         return {
             'is_trained': self.is_trained,
-            'model_path': self.model_path,
-            'model_exists': Path(self.model_path).exists(),
-            'training_accuracy': self.training_accuracy,
+            'model_version': version,
+            'model_exists': self.registry.current_version() is not None or Path(self.model_path).exists(),
+            'training_accuracy': meta.get('training_accuracy'),
+            'training_watermark': meta.get('training_watermark'),
+            'base_trees': meta.get('base_trees'),
+            'base_watermark': meta.get('base_watermark'),
             'feature_names': self.FEATURE_NAMES,
-            'n_estimators': self.model.n_estimators if self.model else None,
-            'max_depth': self.model.max_depth if self.model else None
+            'n_estimators': model.n_estimators if model else meta.get('n_estimators'),
+            'max_depth': model.max_depth if model else meta.get('max_depth'),
+            'versions': self.registry.versions()
         }
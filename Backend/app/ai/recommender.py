@@ -19,20 +19,38 @@ El sistema encuentra usuarios con patrones similares de hábitos
 y recomienda los hábitos que ellos tienen pero el usuario actual no.
 
 CACHE: Las recomendaciones se cachean en Redis por 1 hora.
+
+ACTUALIZACIÓN INCREMENTAL: los cambios de suscripción se publican como
+deltas (user_id, habito_id, activo) en un stream de Redis; cada
+recomendador los aplica sobre su matriz en memoria en lugar de recargarla.
+
+ÍNDICE DE VECINOS: una tarea de Celery precalcula los K vecinos de cada
+usuario (NeighborIndex); las consultas lo leen en lugar de recalcular la
+similitud contra todos los usuarios.
+
+MODO APROXIMADO: con search_mode='lsh' la búsqueda en vivo solo compara
+contra los candidatos de un índice MinHash/LSH (ver lsh_index.py).
+
+MEMORIA COMPARTIDA: la matriz y el índice de vecinos se publican en el
+ArtifactStore; cada worker los abre con mmap (una sola copia en el page
+cache para todos) y cambia de versión cuando se publica una nueva.
 """
 
 import numpy as np
+import threading
 import time
-from typing import Dict, List, Tuple, Optional
+from scipy import sparse
+from typing import Dict, Iterable, List, Tuple, Optional
 from .feature_extractor import FeatureExtractor
+from .artifact_store import ArtifactStore
+from .neighbor_index import NeighborIndex
+from .lsh_index import MinHashLSH
 
 # Import Redis client (graceful fallback if not available)
 try:
     from ..core.redis_client import redis_client
-    REDIS_AVAILABLE = redis_client.is_connected
 except ImportError:
     redis_client = None
-    REDIS_AVAILABLE = False
 
 
 class HabitRecommender:
@@ -44,20 +62,461 @@ class HabitRecommender:
     usuarios similares sí.
     """
     
-    def __init__(self):
+    # Intervalo mínimo entre lecturas del stream de deltas (segundos)
+    DELTA_SYNC_INTERVAL = 1.0
+    
+    # Intervalo mínimo entre revisiones de versiones publicadas (segundos)
+    ARTIFACT_CHECK_INTERVAL = 30.0
+    
+    # Artefacto de la matriz en el ArtifactStore y antigüedad máxima con
+    # la que se usa en lugar de leer la BD (el índice se publica cada hora)
+    MATRIX_ARTIFACT = 'habit_matrix'
+    MATRIX_SNAPSHOT_MAX_AGE = 2 * 3600
+    
+    # Usuarios similares considerados al recomendar
+    RECOMMENDATION_NEIGHBORS = 15
+    
+    # Modos de búsqueda de vecinos en vivo
+    SEARCH_MODES = ('exact', 'lsh')
+    
+    def __init__(
+        self,
+        artifact_store: Optional[ArtifactStore] = None,
+        search_mode: str = 'exact',
+        lsh_bands: int = MinHashLSH.DEFAULT_BANDS,
+        lsh_rows: int = MinHashLSH.DEFAULT_ROWS
+    ):
+        """
+        Args:
+            artifact_store: Almacén de la matriz y el índice publicados
+            search_mode: 'exact' (coseno contra todos) o 'lsh' (coseno
+                solo contra los candidatos MinHash/LSH)
+            lsh_bands: Bandas LSH (más bandas = más recall, más lento)
+            lsh_rows: Valores por banda (más filas = menos candidatos)
+        """
+        if search_mode not in self.SEARCH_MODES:
+            raise ValueError(f"search_mode debe ser uno de {self.SEARCH_MODES}")
+        
         self.feature_extractor = FeatureExtractor()
+        self.search_mode = search_mode
+        self._lsh = MinHashLSH(bands=lsh_bands, rows=lsh_rows) if search_mode == 'lsh' else None
+        self.artifact_store = artifact_store or ArtifactStore()
+        self._neighbor_index = None
+        self._index_version = None
+        self._last_index_check = 0.0
+        # Versión publicada de la matriz en uso (None = cargada de la BD)
+        self._matrix_version = None
+        self._last_matrix_check = 0.0
+        # user_id -> momento (epoch) del último delta aplicado a su fila
+        self._dirty_users = {}
         self._matrix_cache = None
+        self._inv_norms_cache = None
+        self._popularity_cache = None
         self._user_ids_cache = None
         self._habit_ids_cache = None
+        self._user_index = {}
+        self._habit_index = {}
+        # Info de cada columna (None si no es recomendable) y máscara de
+        # columnas recomendables; se cargan junto con la matriz
+        self._habit_info = None
+        self._recommendable = None
+        self._delta_cursor = "0-0"
+        self._last_delta_sync = 0.0
+        self._lock = threading.Lock()
     
     def _load_matrix(self, force_reload: bool = False):
-        """Carga la matriz usuario-hábito (con cache)"""
-        if self._matrix_cache is None or force_reload:
+        """
+        Carga la matriz usuario-hábito (con cache).
+        
+        La matriz es dispersa (CSR). Junto con ella se guardan:
+        - el inverso de la norma de cada fila, para normalizar sin
+          duplicar la matriz (sim = M·mᵤ / (‖M‖ ‖mᵤ‖) en un solo producto)
+        - la popularidad de cada hábito (suma por columna)
+        - índices user_id → fila y habito_id → columna
+        
+        Si la matriz ya está cargada, solo aplica los deltas publicados
+        desde la última sincronización (o cambia a una versión nueva de
+        la matriz si se publicó una).
+        """
+        with self._lock:
+            self._refresh_matrix(force_reload)
+            return self._matrix_cache, self._user_ids_cache, self._habit_ids_cache
+    
+    def _refresh_matrix(self, force_reload: bool = False):
+        """Recarga o sincroniza la matriz (con self._lock tomado por quien llama)."""
+        if self._matrix_cache is None or force_reload or self._matrix_version_changed():
+            self._full_reload()
+        else:
+            self._sync_deltas()
+    
+    def _snapshot(self) -> Dict:
+        """
+        Estado consistente para atender una consulta: matriz, normas,
+        popularidad, índices y catálogo tomados juntos bajo self._lock.
+        
+        Las recargas y los deltas publican objetos nuevos en lugar de
+        modificar los existentes, así que la consulta puede trabajar con
+        estas referencias fuera del lock sin mezclar dos estados (un
+        vecino que no está en el índice de usuarios, un catálogo ya
+        descartado).
+        """
+        with self._lock:
+            self._refresh_matrix()
+            habit_info, recommendable = self._load_habit_catalog()
+            return {
+                'matrix': self._matrix_cache,
+                'inv_norms': self._inv_norms_cache,
+                'popularity': self._popularity_cache,
+                'user_ids': self._user_ids_cache,
+                'user_index': self._user_index,
+                'habit_index': self._habit_index,
+                'habit_info': habit_info,
+                'recommendable': recommendable
+            }
+    
+    def _matrix_version_changed(self) -> bool:
+        """True si hay una versión publicada de la matriz distinta a la actual."""
+        now = time.monotonic()
+        if now - self._last_matrix_check < self.ARTIFACT_CHECK_INTERVAL:
+            return False
+        self._last_matrix_check = now
+        
+        version = self.artifact_store.current_version(self.MATRIX_ARTIFACT)
+        return version is not None and version != self._matrix_version
+    
+    def _load_matrix_snapshot(self) -> Optional[Dict]:
+        """
+        Abre la matriz publicada (mmap) si es reciente y el stream de
+        deltas todavía conserva todo lo posterior a ella.
+        """
+        artifact = self.artifact_store.load(self.MATRIX_ARTIFACT)
+        if artifact is None:
+            return None
+        
+        meta = artifact['meta']
+        if time.time() - meta.get('published_at', 0) > self.MATRIX_SNAPSHOT_MAX_AGE:
+            return None
+        
+        info = self._delta_stream_info()
+        if (
+            info
+            and info["first_id"]
+            and info["length"] >= redis_client.HABIT_DELTAS_MAXLEN
+            and self._stream_id(info["first_id"]) > self._stream_id(meta['delta_cursor'])
+        ):
+            return None
+        
+        return artifact
+    
+    def _full_reload(self, from_store: bool = True):
+        """
+        Reconstruye la matriz completa: desde la versión publicada en el
+        ArtifactStore si es utilizable, o desde habitos_usuario.
+        
+        La matriz publicada se usa tal cual (arreglos mapeados, de solo
+        lectura): los deltas generan una matriz nueva privada del worker
+        (copy-on-write) sin tocar la copia compartida.
+        """
+        artifact = self._load_matrix_snapshot() if from_store else None
+        
+        if artifact is not None:
+            arrays, meta = artifact['arrays'], artifact['meta']
+            matrix = sparse.csr_matrix(
+                (arrays['data'], arrays['indices'], arrays['indptr']),
+                shape=tuple(meta['shape']),
+                copy=False
+            )
+            user_ids = arrays['user_ids'].tolist()
+            habit_ids = arrays['habit_ids'].tolist()
+            cursor = meta['delta_cursor']
+            self._matrix_version = artifact['version']
+        else:
+            # Tomar la posición del stream ANTES de leer la BD: los deltas
+            # publicados durante la carga se vuelven a aplicar (son idempotentes)
+            info = self._delta_stream_info()
+            cursor = (info or {}).get("last_id") or "0-0"
+            
             matrix, user_ids, habit_ids = self.feature_extractor.get_user_habit_matrix()
-            self._matrix_cache = matrix
-            self._user_ids_cache = user_ids
-            self._habit_ids_cache = habit_ids
-        return self._matrix_cache, self._user_ids_cache, self._habit_ids_cache
+            self._matrix_version = None
+        
+        self._matrix_cache = matrix
+        self._user_ids_cache = list(user_ids)
+        self._habit_ids_cache = habit_ids
+        self._user_index = {uid: idx for idx, uid in enumerate(user_ids)}
+        self._habit_index = {hid: idx for idx, hid in enumerate(habit_ids)}
+        
+        # Matriz binaria: ‖fila‖² = número de hábitos de la fila
+        norms = np.sqrt(matrix.getnnz(axis=1)).astype(np.float32)
+        inv_norms = np.zeros_like(norms)
+        # Usuarios sin hábitos quedan con inverso 0 (similitud 0)
+        np.divide(1.0, norms, out=inv_norms, where=norms > 0)
+        self._inv_norms_cache = inv_norms
+        self._popularity_cache = np.asarray(matrix.sum(axis=0)).ravel()
+        
+        if self._lsh is not None:
+            self._lsh.build(matrix)
+        
+        # El catálogo se vuelve a leer la próxima vez que se necesite
+        self._habit_info = None
+        self._recommendable = None
+        
+        self._delta_cursor = cursor
+        self._last_delta_sync = time.monotonic()
+        self._last_matrix_check = time.monotonic()
+        
+        if artifact is not None:
+            # Ponerse al día con los deltas posteriores a la publicación
+            self._last_delta_sync = 0.0
+            self._sync_deltas()
+    
+    def _publish_matrix_snapshot(self) -> str:
+        """Publica la matriz actual en el ArtifactStore para los demás workers."""
+        matrix = self._matrix_cache
+        version = self.artifact_store.publish(
+            self.MATRIX_ARTIFACT,
+            {
+                'data': matrix.data,
+                'indices': matrix.indices,
+                'indptr': matrix.indptr,
+                'user_ids': np.asarray(self._user_ids_cache, dtype=np.int64),
+                'habit_ids': np.asarray(self._habit_ids_cache, dtype=np.int64)
+            },
+            meta={'shape': list(matrix.shape), 'delta_cursor': self._delta_cursor}
+        )
+        self._matrix_version = version
+        return version
+    
+    # ========================================
+    # ACTUALIZACIÓN INCREMENTAL
+    # ========================================
+    
+    @staticmethod
+    def _delta_stream_info() -> Optional[Dict]:
+        if redis_client and redis_client.is_connected:
+            return redis_client.stream_info(redis_client.HABIT_DELTAS_STREAM)
+        return None
+    
+    @staticmethod
+    def _stream_id(entry_id: str) -> Tuple[int, int]:
+        ms, _, seq = entry_id.partition("-")
+        return int(ms), int(seq or 0)
+    
+    def _sync_deltas(self):
+        """
+        Lee del stream los deltas posteriores al cursor y los aplica.
+        
+        Si el stream fue recortado más allá del cursor (se perdieron
+        deltas), hace una recarga completa.
+        """
+        if not (redis_client and redis_client.is_connected):
+            return
+        
+        now = time.monotonic()
+        if now - self._last_delta_sync < self.DELTA_SYNC_INTERVAL:
+            return
+        self._last_delta_sync = now
+        
+        stream = redis_client.HABIT_DELTAS_STREAM
+        entries = redis_client.stream_read(stream, self._delta_cursor)
+        if not entries:
+            return
+        
+        info = redis_client.stream_info(stream)
+        if (
+            info
+            and info["length"] >= redis_client.HABIT_DELTAS_MAXLEN
+            and self._stream_id(info["first_id"]) > self._stream_id(self._delta_cursor)
+        ):
+            print("[Recommender] Delta stream trimmed past cursor, reloading matrix")
+            self._full_reload(from_store=False)
+            return
+        
+        while entries:
+            self._apply_deltas(
+                (int(f["user_id"]), int(f["habito_id"]), f["activo"] == "1")
+                for _, f in entries
+            )
+            self._delta_cursor = entries[-1][0]
+            entries = redis_client.stream_read(stream, self._delta_cursor)
+    
+    def apply_habit_delta(self, user_id: int, habito_id: int, activo: bool):
+        """
+        Aplica un cambio de suscripción directamente sobre la matriz en memoria.
+        
+        Se usa cuando Redis no está disponible para propagar el delta
+        (sin Redis, los deltas no se comparten entre procesos).
+        """
+        with self._lock:
+            if self._matrix_cache is not None:
+                self._apply_deltas([(user_id, habito_id, activo)])
+    
+    def _apply_deltas(self, deltas: Iterable[Tuple[int, int, bool]]):
+        """
+        Parchea las filas afectadas de la matriz, sus normas y la
+        popularidad de los hábitos, sin tocar el resto de la matriz.
+        
+        Semántica de asignación (M[u,h] = activo): aplicar el mismo delta
+        dos veces no cambia el resultado.
+        
+        Copia al escribir: la matriz, las normas, la popularidad y los
+        índices de usuarios se arman como objetos nuevos y se publican al
+        final (con self._lock tomado por quien llama). Un lector que tomó
+        referencias antes sigue viendo un estado completo y consistente,
+        nunca una CSR a medio redimensionar.
+        """
+        user_ids = self._user_ids_cache
+        user_index = self._user_index
+        targets = {}
+        for user_id, habito_id, activo in deltas:
+            col = self._habit_index.get(habito_id)
+            if col is None:
+                continue  # Hábito fuera del catálogo (p. ej. personalizado)
+            row = user_index.get(user_id)
+            if row is None:
+                if not activo:
+                    continue
+                # Usuario nuevo: agregar una fila vacía (en copias)
+                if user_ids is self._user_ids_cache:
+                    user_ids = list(user_ids)
+                    user_index = dict(user_index)
+                row = len(user_ids)
+                user_ids.append(user_id)
+                user_index[user_id] = row
+            targets[(row, col)] = 1.0 if activo else 0.0
+        
+        if not targets:
+            return
+        
+        matrix = self._matrix_cache
+        inv_norms_all = self._inv_norms_cache
+        n_new = len(user_ids) - matrix.shape[0]
+        if n_new > 0:
+            # Filas vacías al final: indptr repite el último offset
+            indptr = np.concatenate(
+                [matrix.indptr, np.full(n_new, matrix.indptr[-1], dtype=matrix.indptr.dtype)]
+            )
+            matrix = sparse.csr_matrix(
+                (matrix.data, matrix.indices, indptr),
+                shape=(len(user_ids), matrix.shape[1])
+            )
+            inv_norms_all = np.concatenate(
+                [inv_norms_all, np.zeros(n_new, dtype=np.float32)]
+            )
+        
+        rows = np.fromiter((r for r, _ in targets), dtype=np.int32, count=len(targets))
+        cols = np.fromiter((c for _, c in targets), dtype=np.int32, count=len(targets))
+        values = np.fromiter(targets.values(), dtype=np.float32, count=len(targets))
+        
+        # Diferencia respecto al valor actual de cada celda
+        current = np.asarray(matrix[rows, cols]).ravel()
+        diff = values - current
+        changed = diff != 0
+        if not changed.any():
+            return
+        rows, cols, diff = rows[changed], cols[changed], diff[changed]
+        
+        delta = sparse.csr_matrix((diff, (rows, cols)), shape=matrix.shape, dtype=np.float32)
+        matrix = (matrix + delta).tocsr()
+        matrix.eliminate_zeros()
+        
+        # Normas de las filas tocadas y popularidad de las columnas tocadas
+        touched = np.unique(rows)
+        norms = np.sqrt(np.diff(matrix.indptr)[touched]).astype(np.float32)
+        inv_norms = np.zeros_like(norms)
+        np.divide(1.0, norms, out=inv_norms, where=norms > 0)
+        if inv_norms_all is self._inv_norms_cache:
+            inv_norms_all = inv_norms_all.copy()
+        inv_norms_all[touched] = inv_norms
+        popularity = self._popularity_cache.copy()
+        np.add.at(popularity, cols, diff)
+        
+        # Publicar: los lectores toman estas referencias con self._lock
+        self._user_ids_cache = user_ids
+        self._user_index = user_index
+        self._inv_norms_cache = inv_norms_all
+        self._popularity_cache = popularity
+        self._matrix_cache = matrix
+        
+        # Usuarios cuyo vector cambió: el índice precalculado ya no los
+        # representa, usan la ruta exacta hasta la siguiente reconstrucción
+        now = time.time()
+        for row in touched:
+            self._dirty_users[user_ids[row]] = now
+        
+        if self._lsh is not None:
+            self._lsh.update_rows(matrix, touched)
+    
+    # ========================================
+    # ÍNDICE DE VECINOS PRECALCULADO
+    # ========================================
+    
+    def _get_neighbor_index(self) -> Optional[NeighborIndex]:
+        """
+        Devuelve el índice de vecinos publicado, cambiando de versión si
+        se publicó una nueva (se revisa como máximo cada
+        ARTIFACT_CHECK_INTERVAL segundos).
+        """
+        now = time.monotonic()
+        if now - self._last_index_check < self.ARTIFACT_CHECK_INTERVAL:
+            return self._neighbor_index
+        self._last_index_check = now
+        
+        version = self.artifact_store.current_version(NeighborIndex.ARTIFACT_NAME)
+        if version is None:
+            self._neighbor_index = None
+            self._index_version = None
+            return None
+        
+        if version != self._index_version:
+            index = NeighborIndex.load(self.artifact_store, version)
+            if index is not None:
+                self._neighbor_index = index
+                self._index_version = version
+                print(f"[Recommender] Neighbor index loaded ({len(index)} users, k={index.k})")
+        
+        return self._neighbor_index
+    
+    def build_neighbor_index(self, k: int = NeighborIndex.DEFAULT_K) -> Dict:
+        """
+        Recalcula el índice de vecinos de todos los usuarios y lo publica,
+        junto con la matriz recién leída de la BD, en el ArtifactStore.
+        
+        Pensado para ejecutarse en background (Celery).
+        
+        Args:
+            k: Vecinos a guardar por usuario
+            
+        Returns:
+            Dict con estadísticas de la construcción
+        """
+        # También es la marca del índice: se toma antes de leer la BD, así
+        # cualquier delta aplicado durante la lectura o la construcción
+        # queda posterior y esos usuarios usan la ruta exacta
+        start_time = time.time()
+        
+        with self._lock:
+            self._full_reload(from_store=False)
+            matrix_version = self._publish_matrix_snapshot()
+            matrix = self._matrix_cache
+            inv_norms = self._inv_norms_cache
+            user_ids = list(self._user_ids_cache)
+        
+        index = NeighborIndex.build(matrix, inv_norms, user_ids, k=k, built_at=start_time)
+        index_version = index.publish(self.artifact_store)
+        
+        self._neighbor_index = index
+        self._index_version = index_version
+        
+        elapsed = time.time() - start_time
+        print(f"[Recommender] Neighbor index built: {len(index)} users, k={index.k} ({elapsed:.2f}s)")
+        
+        return {
+            'users': len(index),
+            'k': index.k,
+            'elapsed_seconds': round(elapsed, 3),
+            'matrix_version': matrix_version,
+            'index_version': index_version
+        }
     
     def cosine_similarity(self, vec_a: np.ndarray, vec_b: np.ndarray) -> float:
         """
@@ -91,56 +550,143 @@ class HabitRecommender:
         
         return float(similarity)
     
-    def find_similar_users(self, user_id: int, top_n: int = 10) -> List[Dict]:
+    def find_similar_users(
+        self,
+        user_id: int,
+        top_n: int = 10,
+        use_index: bool = True,
+        snapshot: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Encuentra los N usuarios más similares al usuario dado.
         
+        Si hay un índice de vecinos precalculado que cubre al usuario
+        (y su vector no cambió desde que se construyó), es una búsqueda
+        directa. Si no, se calcula en vivo:
+        
         Proceso:
         1. Obtener vector de hábitos del usuario
-        2. Calcular similitud con todos los demás usuarios
+        2. Calcular similitud con todos los demás usuarios (o, en modo
+           'lsh', solo con los candidatos del índice LSH)
         3. Ordenar por similitud descendente
         4. Retornar top N (excluyendo al usuario mismo)
         
         Args:
             user_id: ID del usuario
             top_n: Número de usuarios similares a retornar
+            use_index: Si usar el índice precalculado (default True)
+            snapshot: Estado de _snapshot() a usar (si no, se toma uno)
             
         Returns:
             Lista de dicts con user_id y similarity score
         """
-        matrix, user_ids, habit_ids = self._load_matrix()
+        if snapshot is None:
+            snapshot = self._snapshot()
+        matrix = snapshot['matrix']
+        inv_norms = snapshot['inv_norms']
+        user_ids = snapshot['user_ids']
+        user_index = snapshot['user_index']
+        
+        if use_index:
+            index = self._get_neighbor_index()
+            if index is not None and self._dirty_users.get(user_id, 0.0) <= index.built_at:
+                similar = index.lookup(user_id, top_n)
+                if similar is not None:
+                    # Descartar vecinos que ya no están en la matriz actual
+                    return [s for s in similar if s['user_id'] in user_index]
         
         if len(user_ids) == 0:
             return []
         
-        # Verificar que el usuario existe en la matriz
-        if user_id not in user_ids:
+        # Verificar que el usuario existe en la matriz (O(1) con el índice)
+        user_idx = user_index.get(user_id)
+        if user_idx is None:
             return []
         
-        # Obtener índice del usuario
-        user_idx = user_ids.index(user_id)
-        user_vector = matrix[user_idx]
-        
-        # Calcular similitud con todos los usuarios
-        similarities = []
-        for i, other_user_id in enumerate(user_ids):
-            if other_user_id == user_id:
-                continue  # Saltar el mismo usuario
-            
-            other_vector = matrix[i]
-            sim = self.cosine_similarity(user_vector, other_vector)
-            
-            if sim > 0:  # Solo incluir si hay alguna similitud
-                similarities.append({
-                    'user_id': other_user_id,
-                    'similarity': round(sim, 4)
-                })
-        
-        # Ordenar por similitud descendente
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        
-        # Retornar top N
-        return similarities[:top_n]
+        # Similitud coseno en un solo producto matriz dispersa × vector:
+        # sim = (M · mᵤ) / (‖M‖ ‖mᵤ‖)
+        user_vector = matrix[user_idx].toarray().ravel() * inv_norms[user_idx]
+        
+        if self._lsh is not None:
+            # Solo las filas candidatas (ordenadas para desempates estables).
+            # El índice LSH se actualiza en su lugar: consultarlo con el lock
+            # y descartar filas posteriores a la matriz del snapshot
+            with self._lock:
+                rows = self._lsh.candidates(user_idx)
+            rows = np.sort(rows[rows < matrix.shape[0]])
+            similarities = (matrix[rows] @ user_vector) * inv_norms[rows]
+        else:
+            rows = None
+            similarities = (matrix @ user_vector) * inv_norms
+            similarities[user_idx] = 0.0  # Saltar el mismo usuario
+        
+        # Top N sin ordenar todo el vector: argpartition es O(n)
+        k = min(top_n, len(similarities) - (0 if rows is not None else 1))
+        if k <= 0:
+            return []
+        top_idx = np.argpartition(-similarities, k - 1)[:k]
+        top_idx = top_idx[np.argsort(-similarities[top_idx], kind='stable')]
+        
+        # Solo incluir si hay alguna similitud
+        return [
+            {
+                'user_id': user_ids[i if rows is None else rows[i]],
+                'similarity': round(float(similarities[i]), 4)
+            }
+            for i in top_idx
+            if similarities[i] > 0
+        ]
+    
+    def _load_habit_catalog(self):
+        """
+        Info de los hábitos alineada con las columnas de la matriz
+        (una sola consulta, cacheada hasta la siguiente recarga completa).
+        Con self._lock tomado por quien llama.
+        """
+        if self._habit_info is None:
+            info = [None] * len(self._habit_ids_cache)
+            for habit in self.feature_extractor.get_habit_catalog():
+                col = self._habit_index.get(habit['habito_id'])
+                if col is not None:
+                    info[col] = habit
+            self._recommendable = np.array([h is not None for h in info], dtype=bool)
+            self._habit_info = info
+        return self._habit_info, self._recommendable
+    
+    def _candidate_mask(self, user_id: int, snapshot: Dict) -> np.ndarray:
+        """
+        Máscara booleana de columnas que se le pueden recomendar al
+        usuario: hábitos del catálogo que no tiene activos.
+        """
+        recommendable = snapshot['recommendable']
+        user_idx = snapshot['user_index'].get(user_id)
+        
+        if user_idx is None:
+            # Usuario fuera de la matriz: consultar sus hábitos en la BD
+            mask = np.zeros(len(recommendable), dtype=bool)
+            for habit in self.feature_extractor.get_habits_user_doesnt_have(user_id):
+                col = snapshot['habit_index'].get(habit['habito_id'])
+                if col is not None:
+                    mask[col] = True
+            return mask & recommendable
+        
+        matrix = snapshot['matrix']
+        owned = matrix.indices[matrix.indptr[user_idx]:matrix.indptr[user_idx + 1]]
+        mask = recommendable.copy()
+        mask[owned] = False
+        return mask
+    
+    @staticmethod
+    def _habit_entry(info: Dict, score: float, razon: str) -> Dict:
+        return {
+            'habito_id': info['habito_id'],
+            'nombre': info['nombre'],
+            'descripcion': info.get('descripcion'),
+            'categoria': info.get('categoria'),
+            'puntos_base': info.get('puntos_base', 10),
+            'score': score,
+            'razon': razon
+        }
     
     def get_recommendations(self, user_id: int, limit: int = 5, use_cache: bool = True) -> List[Dict]:
         """
@@ -148,10 +694,11 @@ class HabitRecommender:
         
         Algoritmo:
         1. Encontrar usuarios similares
-        2. Obtener hábitos que el usuario NO tiene
-        3. Contar cuántos usuarios similares tienen cada hábito
-        4. Calcular score = (usuarios con hábito / total similares)
-        5. Ordenar por score y retornar top N
+        2. Obtener hábitos que el usuario NO tiene (máscara sobre su fila
+           de la matriz, sin consultar la BD)
+        3. Score de todos los hábitos en un solo producto:
+           score = simᵀ · M[similares, :] / total similares
+        4. Ordenar por score y retornar top N
         
         CACHE: Resultados cacheados en Redis por 1 hora (3600 segundos).
         
@@ -166,7 +713,7 @@ class HabitRecommender:
         # Intentar obtener de cache
         cache_key = f"recommendations:user:{user_id}:limit:{limit}"
         
-        if use_cache and REDIS_AVAILABLE and redis_client:
+        if use_cache and redis_client and redis_client.is_connected:
             cached = redis_client.get_json(cache_key)
             if cached is not None:
                 print(f"[Cache HIT] Recommendations for user {user_id}")
@@ -174,135 +721,208 @@ class HabitRecommender:
         
         start_time = time.time()
         
+        # Un solo estado para vecinos, candidatos y scores
+        snapshot = self._snapshot()
+        
         # Obtener usuarios similares
-        similar_users = self.find_similar_users(user_id, top_n=15)
+        similar_users = self.find_similar_users(
+            user_id, top_n=self.RECOMMENDATION_NEIGHBORS, snapshot=snapshot
+        )
         
         if not similar_users:
             # Si no hay usuarios similares, recomendar hábitos populares
-            return self._get_popular_habits(user_id, limit)
+            return self._get_popular_habits(user_id, limit, snapshot=snapshot)
         
-        matrix, user_ids, habit_ids = self._load_matrix()
+        matrix = snapshot['matrix']
+        user_index = snapshot['user_index']
         
-        # Obtener hábitos que el usuario actual NO tiene
-        habits_user_doesnt_have = self.feature_extractor.get_habits_user_doesnt_have(user_id)
+        # Hábitos del catálogo que el usuario actual NO tiene
+        candidates = self._candidate_mask(user_id, snapshot)
         
-        if not habits_user_doesnt_have:
+        if not candidates.any():
             return []  # El usuario ya tiene todos los hábitos
         
-        # Crear mapeo de habito_id a índice
-        habit_to_idx = {hid: idx for idx, hid in enumerate(habit_ids)}
+        habit_info = snapshot['habit_info']
         
-        # Contar cuántos usuarios similares tienen cada hábito
-        habit_scores = {}
+        # Submatriz vecinos × hábitos y vector de similitudes
+        similar_rows = matrix[[user_index[s['user_id']] for s in similar_users]]
+        similarities = np.array([s['similarity'] for s in similar_users], dtype=np.float64)
         total_similar = len(similar_users)
         
-        for habit in habits_user_doesnt_have:
-            habito_id = habit['habito_id']
-            
-            if habito_id not in habit_to_idx:
-                continue
-            
-            habit_idx = habit_to_idx[habito_id]
-            
-            # Contar usuarios similares que tienen este hábito
-            count = 0
-            weighted_count = 0.0
-            
-            for similar in similar_users:
-                similar_user_id = similar['user_id']
-                similarity = similar['similarity']
-                
-                if similar_user_id in user_ids:
-                    similar_idx = user_ids.index(similar_user_id)
-                    if matrix[similar_idx, habit_idx] == 1:
-                        count += 1
-                        weighted_count += similarity  # Ponderar por similitud
-            
-            if count > 0:
-                # Score ponderado por similitud
-                score = weighted_count / total_similar
-                habit_scores[habito_id] = {
-                    'count': count,
-                    'score': score,
-                    'info': habit
-                }
-        
-        # Ordenar por score
-        sorted_habits = sorted(
-            habit_scores.items(),
-            key=lambda x: x[1]['score'],
-            reverse=True
-        )
+        # Por hábito: suma de similitudes de los vecinos que lo tienen
+        # (score ponderado) y número de vecinos que lo tienen
+        weighted = similar_rows.T @ similarities
+        counts = similar_rows.getnnz(axis=0)
+        scores = weighted / total_similar
+        
+        # Ordenar por score (estable: empates por habito_id)
+        cols = np.flatnonzero(candidates & (counts > 0))
+        cols = cols[np.argsort(-scores[cols], kind='stable')][:limit]
         
         # Construir respuesta
         recommendations = []
-        for habito_id, data in sorted_habits[:limit]:
-            info = data['info']
-            count = data['count']
-            score = data['score']
-            
+        for col in cols:
             # Calcular porcentaje para la razón
-            percentage = int((count / total_similar) * 100)
+            percentage = int((counts[col] / total_similar) * 100)
             
-            recommendations.append({
-                'habito_id': habito_id,
-                'nombre': info['nombre'],
-                'descripcion': info.get('descripcion'),
-                'categoria': info.get('categoria'),
-                'puntos_base': info.get('puntos_base', 10),
-                'score': round(score, 3),
-                'razon': f"{percentage}% de usuarios similares tienen este hábito"
-            })
+            recommendations.append(self._habit_entry(
+                habit_info[col],
+                round(float(scores[col]), 3),
+                f"{percentage}% de usuarios similares tienen este hábito"
+            ))
         
         # Guardar en cache (1 hora = 3600 segundos)
-        if use_cache and REDIS_AVAILABLE and redis_client:
+        if use_cache and redis_client and redis_client.is_connected:
             redis_client.set_json(cache_key, recommendations, ttl=3600)
             elapsed = time.time() - start_time
             print(f"[Cache SET] Recommendations for user {user_id} ({elapsed:.3f}s)")
         
         return recommendations
     
-    def _get_popular_habits(self, user_id: int, limit: int = 5) -> List[Dict]:
+    def _get_popular_habits(
+        self,
+        user_id: int,
+        limit: int = 5,
+        snapshot: Optional[Dict] = None
+    ) -> List[Dict]:
         """
         Fallback: recomendar hábitos más populares que el usuario no tiene.
         Se usa cuando no hay suficientes usuarios similares.
         """
-        matrix, user_ids, habit_ids = self._load_matrix()
+        if snapshot is None:
+            snapshot = self._snapshot()
+        user_ids = snapshot['user_ids']
+        habit_info = snapshot['habit_info']
         
-        # Obtener hábitos que el usuario no tiene
-        habits_available = self.feature_extractor.get_habits_user_doesnt_have(user_id)
+        # Hábitos del catálogo que el usuario no tiene
+        candidates = self._candidate_mask(user_id, snapshot)
         
-        if not habits_available:
+        if not candidates.any():
             return []
         
-        # Contar popularidad de cada hábito
-        habit_to_idx = {hid: idx for idx, hid in enumerate(habit_ids)}
-        
-        popularity = []
-        for habit in habits_available:
-            habito_id = habit['habito_id']
-            if habito_id in habit_to_idx:
-                idx = habit_to_idx[habito_id]
-                count = int(np.sum(matrix[:, idx]))
-                popularity.append({
-                    'habito_id': habito_id,
-                    'nombre': habit['nombre'],
-                    'descripcion': habit.get('descripcion'),
-                    'categoria': habit.get('categoria'),
-                    'puntos_base': habit.get('puntos_base', 10),
-                    'score': count / len(user_ids),
-                    'razon': f"Popular entre {count} usuarios",
-                    'count': count
-                })
-        
-        # Ordenar por popularidad
-        popularity.sort(key=lambda x: x['count'], reverse=True)
-        
-        # Remover count del output
-        for p in popularity:
-            del p['count']
-        
-        return popularity[:limit]
+        # Popularidad de cada hábito (suma por columna, precalculada),
+        # ordenada de mayor a menor (empates por habito_id)
+        counts = snapshot['popularity'].astype(np.int64)
+        cols = np.flatnonzero(candidates)
+        cols = cols[np.argsort(-counts[cols], kind='stable')][:limit]
+        
+        return [
+            self._habit_entry(
+                habit_info[col],
+                int(counts[col]) / len(user_ids),
+                f"Popular entre {int(counts[col])} usuarios"
+            )
+            for col in cols
+        ]
+    
+    def iter_all_recommendations(
+        self,
+        limit: int = 5,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        block_size: Optional[int] = None
+    ) -> Iterable[Dict[int, List[Dict]]]:
+        """
+        Genera las recomendaciones de todos los usuarios (o de un shard:
+        user_id % shard_count == shard_index) en una sola pasada.
+        
+        Mismo algoritmo que get_recommendations, pero por bloques de
+        usuarios con productos de matrices:
+            S = similitudes del bloque contra todos (b × n)
+            W = top RECOMMENDATION_NEIGHBORS de cada fila de S (dispersa)
+            scores = W · M (b × hábitos)
+        
+        Pensado para Celery: produce un dict {user_id: recomendaciones}
+        por bloque, para guardarlo en cache sin acumular todo en memoria.
+        """
+        with self._lock:
+            self._full_reload()
+            matrix = self._matrix_cache
+            inv_norms = self._inv_norms_cache
+            user_ids = list(self._user_ids_cache)
+            popularity = self._popularity_cache.astype(np.int64)
+            habit_info, recommendable = self._load_habit_catalog()
+        
+        n_users = matrix.shape[0]
+        shard_rows = np.array(
+            [row for row, uid in enumerate(user_ids) if uid % shard_count == shard_index],
+            dtype=np.int64
+        )
+        if len(shard_rows) == 0:
+            return
+        
+        k = min(self.RECOMMENDATION_NEIGHBORS, n_users - 1)
+        if block_size is None:
+            block_size = max(1, min(4096, NeighborIndex.BLOCK_BYTES // (4 * n_users)))
+        
+        matrix_t = matrix.T.tocsr()
+        popular_order = np.argsort(-popularity, kind='stable')
+        
+        for start in range(0, len(shard_rows), block_size):
+            rows = shard_rows[start:start + block_size]
+            b = len(rows)
+            block_results = {}
+            
+            if k > 0:
+                # Similitudes del bloque contra todos, sin el propio usuario
+                sims = (matrix[rows] @ matrix_t).toarray()
+                sims *= inv_norms[rows, None]
+                sims *= inv_norms[None, :]
+                sims[np.arange(b), rows] = 0.0
+                
+                # Top K vecinos por fila como matriz dispersa de pesos
+                top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+                top_sims = np.round(np.take_along_axis(sims, top, axis=1).astype(np.float64), 4)
+                weights = sparse.csr_matrix(
+                    (top_sims.ravel(), (np.repeat(np.arange(b), k), top.ravel())),
+                    shape=(b, n_users)
+                )
+                weights.data[weights.data < 0] = 0.0
+                weights.eliminate_zeros()
+                
+                weighted = (weights @ matrix).toarray()
+                neighbors = weights.copy()
+                neighbors.data[:] = 1.0
+                counts = (neighbors @ matrix).toarray()
+                n_similar = weights.getnnz(axis=1)
+            else:
+                n_similar = np.zeros(b, dtype=np.int64)
+            
+            candidates = recommendable[None, :] & (matrix[rows].toarray() == 0)
+            
+            for i, row in enumerate(rows):
+                user_cand = candidates[i]
+                if not user_cand.any():
+                    block_results[user_ids[row]] = []
+                    continue
+                
+                total_similar = int(n_similar[i])
+                if total_similar == 0:
+                    # Sin usuarios similares: hábitos populares
+                    cols = popular_order[user_cand[popular_order]][:limit]
+                    block_results[user_ids[row]] = [
+                        self._habit_entry(
+                            habit_info[col],
+                            int(popularity[col]) / n_users,
+                            f"Popular entre {int(popularity[col])} usuarios"
+                        )
+                        for col in cols
+                    ]
+                    continue
+                
+                scores = weighted[i] / total_similar
+                cols = np.flatnonzero(user_cand & (counts[i] > 0))
+                cols = cols[np.argsort(-scores[cols], kind='stable')][:limit]
+                block_results[user_ids[row]] = [
+                    self._habit_entry(
+                        habit_info[col],
+                        round(float(scores[col]), 3),
+                        f"{int((counts[i, col] / total_similar) * 100)}% de usuarios similares tienen este hábito"
+                    )
+                    for col in cols
+                ]
+            
+            yield block_results
     
     def get_recommendation_explanation(self, user_id: int, habito_id: int) -> Optional[Dict]:
         """
@@ -315,29 +935,29 @@ class HabitRecommender:
         Returns:
             Dict con explicación detallada o None
         """
-        similar_users = self.find_similar_users(user_id, top_n=10)
+        snapshot = self._snapshot()
+        similar_users = self.find_similar_users(user_id, top_n=10, snapshot=snapshot)
         
         if not similar_users:
             return None
         
-        matrix, user_ids, habit_ids = self._load_matrix()
-        
-        if habito_id not in habit_ids:
+        habit_idx = snapshot['habit_index'].get(habito_id)
+        if habit_idx is None:
             return None
         
-        habit_idx = habit_ids.index(habito_id)
+        # Columna del hábito restringida a los usuarios similares
+        similar_rows = [snapshot['user_index'][s['user_id']] for s in similar_users]
+        has_habit = snapshot['matrix'][similar_rows, :][:, habit_idx].toarray().ravel()
         
         # Encontrar usuarios similares que tienen este hábito
-        users_with_habit = []
-        for similar in similar_users:
-            similar_user_id = similar['user_id']
-            if similar_user_id in user_ids:
-                similar_idx = user_ids.index(similar_user_id)
-                if matrix[similar_idx, habit_idx] == 1:
-                    users_with_habit.append({
-                        'user_id': similar_user_id,
-                        'similarity': similar['similarity']
-                    })
+        users_with_habit = [
+            {
+                'user_id': similar['user_id'],
+                'similarity': similar['similarity']
+            }
+            for similar, flag in zip(similar_users, has_habit)
+            if flag == 1
+        ]
         
         habit_info = self.feature_extractor.get_habit_info(habito_id)
         
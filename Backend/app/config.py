@@ -20,6 +20,42 @@ DATABASE_PORT = os.getenv('DATABASE_PORT', '5432')
 # Connection string para psycopg
 DATABASE_URL = f"dbname={DATABASE_NAME} user={DATABASE_USER} password={DATABASE_PASSWORD} host={DATABASE_HOST} port={DATABASE_PORT}"
 
+# Connection Pool Configuration
+# Tamaños por pool y por proceso. Cada worker de la API abre el pool
+# síncrono y el asíncrono; Celery solo el síncrono. El total
+# (workers_api × (DB_POOL_MAX_SIZE + DB_ASYNC_POOL_MAX_SIZE) +
+#  workers_celery × DB_POOL_MAX_SIZE) debe quedar bajo max_connections.
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+DB_ASYNC_POOL_MIN_SIZE = int(os.getenv('DB_ASYNC_POOL_MIN_SIZE', str(DB_POOL_MIN_SIZE)))
+DB_ASYNC_POOL_MAX_SIZE = int(os.getenv('DB_ASYNC_POOL_MAX_SIZE', str(DB_POOL_MAX_SIZE)))
+# Segundos máximos esperando una conexión libre (luego PoolTimeout)
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Requests en cola antes de rechazar de inmediato (0 = sin límite)
+DB_POOL_MAX_WAITING = int(os.getenv('DB_POOL_MAX_WAITING', '0'))
+# Segundos que una conexión sobrante puede quedar ociosa antes de cerrarse
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '600'))
+# Segundos de vida máxima de una conexión (se recicla al vencer)
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+# Segundos reintentando una conexión caída antes de darla por perdida
+DB_POOL_RECONNECT_TIMEOUT = float(os.getenv('DB_POOL_RECONNECT_TIMEOUT', '300'))
+
+# Startup Configuration
+# Segundos que el arranque espera las conexiones mínimas de la base de datos
+DB_STARTUP_TIMEOUT = float(os.getenv('DB_STARTUP_TIMEOUT', '10'))
+# Cargar el modelo de IA al arrancar (false: en el primer uso, para
+# workers que no atienden rutas de IA)
+PRELOAD_AI_MODELS = os.getenv('PRELOAD_AI_MODELS', 'true').lower() == 'true'
+
+# Recommender Configuration
+# Búsqueda de usuarios similares: 'exact' (coseno contra todos) o 'lsh'
+# (coseno solo contra candidatos MinHash/LSH, más rápido con muchos
+# usuarios). Con 'lsh': más bandas = más recall y más lento; más filas
+# por banda = menos candidatos. Medir con scripts/benchmark_lsh.py.
+RECOMMENDER_SEARCH_MODE = os.getenv('RECOMMENDER_SEARCH_MODE', 'exact').lower()
+RECOMMENDER_LSH_BANDS = int(os.getenv('RECOMMENDER_LSH_BANDS', '16'))
+RECOMMENDER_LSH_ROWS = int(os.getenv('RECOMMENDER_LSH_ROWS', '2'))
+
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'mi_clave_secreta')
 JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
@@ -2,11 +2,19 @@
 Redis Client for Taskpin
 ========================
 Conexión a Redis usando db=1 para no interferir con otros proyectos.
+
+La conexión no se abre al importar: la API llama connect() en su lifespan
+y los demás procesos conectan en el primer uso. Si Redis se cae (o no
+estaba al arrancar), un hilo de fondo reintenta cada RECONNECT_INTERVAL
+segundos y el cache vuelve solo; mientras tanto las operaciones fallan
+rápido sin esperar timeouts.
 """
 
 import json
 import os
-from typing import Any, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import timedelta
 
 try:
@@ -25,6 +33,9 @@ class RedisClient:
     
     PREFIX = "taskpin:"  # Prefijo para todas las keys
     
+    # Segundos entre reintentos de conexión mientras Redis no responde
+    RECONNECT_INTERVAL = 5.0
+    
     def __init__(
         self,
         host: str = "localhost",
@@ -37,26 +48,38 @@ class RedisClient:
         self.db = db
         self._client: Optional[redis.Redis] = None
         self._connected = False
+        self._attempted = False
+        self._reconnect_thread: Optional[threading.Thread] = None
+        self._reconnect_lock = threading.Lock()
         self.decode_responses = decode_responses
-        
-        if REDIS_AVAILABLE:
-            self._connect()
+    
+    def connect(self) -> bool:
+        """
+        Conecta a Redis (lo llama el lifespan de la API). Si falla, deja
+        un hilo reintentando en segundo plano.
+        """
+        if self._connect():
+            return True
+        self._start_reconnect()
+        return False
     
     def _connect(self) -> bool:
         """Intenta conectar a Redis."""
+        self._attempted = True
         if not REDIS_AVAILABLE:
             print("[Redis] redis-py not installed. Running without cache.")
             return False
             
         try:
-            self._client = redis.Redis(
-                host=self.host,
-                port=self.port,
-                db=self.db,
-                decode_responses=self.decode_responses,
-                socket_connect_timeout=5,
-                socket_timeout=5
-            )
+            if self._client is None:
+                self._client = redis.Redis(
+                    host=self.host,
+                    port=self.port,
+                    db=self.db,
+                    decode_responses=self.decode_responses,
+                    socket_connect_timeout=5,
+                    socket_timeout=5
+                )
             # Test connection
             self._client.ping()
             self._connected = True
@@ -68,12 +91,45 @@ class RedisClient:
             return False
         except Exception as e:
             print(f"[Redis] Unexpected error: {e}. Running without cache.")
+            self._on_error(e)
             self._connected = False
             return False
     
+    def _start_reconnect(self):
+        """Arranca el hilo de reconexión (si no hay uno corriendo)."""
+        if not REDIS_AVAILABLE:
+            return
+        with self._reconnect_lock:
+            if self._reconnect_thread is not None and self._reconnect_thread.is_alive():
+                return
+            self._reconnect_thread = threading.Thread(
+                target=self._reconnect_loop, name="redis-reconnect", daemon=True
+            )
+            self._reconnect_thread.start()
+    
+    def _reconnect_loop(self):
+        while not self._connected:
+            time.sleep(self.RECONNECT_INTERVAL)
+            try:
+                self._client.ping()
+                self._connected = True
+                print(f"[Redis] Reconnected to {self.host}:{self.port} db={self.db}")
+            except Exception:
+                pass
+    
+    def _on_error(self, e: Exception):
+        """Si el error es de conexión, marca Redis como caído y reintenta en fondo."""
+        if REDIS_AVAILABLE and isinstance(e, (redis.ConnectionError, redis.TimeoutError)):
+            if self._connected:
+                print("[Redis] Connection lost. Running without cache until it comes back.")
+            self._connected = False
+            self._start_reconnect()
+    
     @property
     def is_connected(self) -> bool:
-        """Verifica si está conectado a Redis."""
+        """Verifica si está conectado a Redis (conecta en el primer uso)."""
+        if not self._attempted:
+            self.connect()
         return self._connected and self._client is not None
     
     def _make_key(self, key: str) -> str:
@@ -92,6 +148,7 @@ class RedisClient:
             return self._client.get(self._make_key(key))
         except Exception as e:
             print(f"[Redis] GET error: {e}")
+            self._on_error(e)
             return None
     
     def set(
@@ -124,6 +181,7 @@ class RedisClient:
             return True
         except Exception as e:
             print(f"[Redis] SET error: {e}")
+            self._on_error(e)
             return False
     
     def delete(self, key: str) -> bool:
@@ -135,15 +193,28 @@ class RedisClient:
             return True
         except Exception as e:
             print(f"[Redis] DELETE error: {e}")
+            self._on_error(e)
             return False
     
+    def get_ttl(self, key: str) -> Optional[int]:
+        """Segundos de vida que le quedan a una key (None si no existe o no expira)."""
+        if not self.is_connected:
+            return None
+        try:
+            ttl = self._client.ttl(self._make_key(key))
+            return ttl if ttl > 0 else None
+        except Exception as e:
+            self._on_error(e)
+            return None
+    
     def exists(self, key: str) -> bool:
         """Verifica si una key existe."""
         if not self.is_connected:
             return False
         try:
             return self._client.exists(self._make_key(key)) > 0
-        except Exception:
+        except Exception as e:
+            self._on_error(e)
             return False
     
     # ==================== OPERACIONES JSON ====================
@@ -173,6 +244,41 @@ class RedisClient:
             print(f"[Redis] JSON serialization error: {e}")
             return False
     
+    def set_many_json(
+        self,
+        items: Dict[str, Any],
+        ttl: Optional[int] = None,
+        chunk_size: int = 1000
+    ) -> int:
+        """
+        Guarda muchas keys JSON con pipelines de SETEX (un round-trip
+        por cada `chunk_size` keys en lugar de uno por key).
+        
+        Returns:
+            Número de keys guardadas
+        """
+        if not self.is_connected:
+            return 0
+        
+        saved = 0
+        try:
+            keys = list(items.keys())
+            for start in range(0, len(keys), chunk_size):
+                pipe = self._client.pipeline(transaction=False)
+                chunk = keys[start:start + chunk_size]
+                for key in chunk:
+                    value = json.dumps(items[key], ensure_ascii=False, default=str)
+                    if ttl:
+                        pipe.setex(self._make_key(key), ttl, value)
+                    else:
+                        pipe.set(self._make_key(key), value)
+                pipe.execute()
+                saved += len(chunk)
+        except Exception as e:
+            print(f"[Redis] Pipelined SET error: {e}")
+            self._on_error(e)
+        return saved
+    
     # ==================== CACHE HELPERS ====================
     
     def cache_predictions(self, user_id: int, predictions: list, ttl: int = 3600) -> bool:
@@ -206,6 +312,298 @@ class RedisClient:
         self.delete(f"predictions:user:{user_id}")
         self.delete(f"recommendations:user:{user_id}")
     
+    def delete_pattern(self, pattern: str) -> int:
+        """Elimina todas las keys que coinciden con el patrón (usa SCAN, no KEYS)."""
+        if not self.is_connected:
+            return 0
+        try:
+            keys = list(self._client.scan_iter(match=self._make_key(pattern), count=100))
+            if keys:
+                self._client.delete(*keys)
+            return len(keys)
+        except Exception as e:
+            print(f"[Redis] DELETE pattern error: {e}")
+            self._on_error(e)
+            return 0
+    
+    # ==================== PUB/SUB ====================
+    
+    def publish(self, channel: str, message: str) -> int:
+        """
+        Publica un mensaje en un canal.
+        
+        Returns:
+            Número de suscriptores que lo recibieron (0 si falló)
+        """
+        if not self.is_connected:
+            return 0
+        try:
+            return self._client.publish(self._make_key(channel), message)
+        except Exception as e:
+            print(f"[Redis] PUBLISH error: {e}")
+            self._on_error(e)
+            return 0
+    
+    def subscribe(self, channel: str):
+        """
+        Se suscribe a un canal.
+        
+        Returns:
+            Objeto PubSub de redis-py (leer con get_message), o None si
+            Redis no está disponible
+        """
+        if not self.is_connected:
+            return None
+        try:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self._make_key(channel))
+            return pubsub
+        except Exception as e:
+            print(f"[Redis] SUBSCRIBE error: {e}")
+            self._on_error(e)
+            return None
+    
+    # ==================== STREAMS ====================
+    
+    def stream_add(self, key: str, fields: Dict[str, Any], maxlen: Optional[int] = None) -> Optional[str]:
+        """
+        Agrega una entrada a un stream (XADD).
+        
+        Args:
+            key: Clave del stream
+            fields: Campos de la entrada
+            maxlen: Longitud máxima aproximada (recorte con ~)
+            
+        Returns:
+            ID de la entrada o None si falló
+        """
+        if not self.is_connected:
+            return None
+        try:
+            return self._client.xadd(
+                self._make_key(key), fields, maxlen=maxlen, approximate=True
+            )
+        except Exception as e:
+            print(f"[Redis] XADD error: {e}")
+            self._on_error(e)
+            return None
+    
+    def stream_read(self, key: str, after_id: str, count: int = 1000) -> Optional[List[Tuple[str, Dict[str, str]]]]:
+        """
+        Lee las entradas de un stream posteriores a after_id (XREAD sin bloqueo).
+        
+        Returns:
+            Lista de (id, campos) o None si Redis no está disponible
+        """
+        if not self.is_connected:
+            return None
+        try:
+            result = self._client.xread({self._make_key(key): after_id}, count=count)
+            return result[0][1] if result else []
+        except Exception as e:
+            print(f"[Redis] XREAD error: {e}")
+            self._on_error(e)
+            return None
+    
+    def stream_info(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene longitud, primer y último ID de un stream.
+        
+        Returns:
+            Dict con length, first_id, last_id (IDs None si está vacío),
+            o None si Redis no está disponible
+        """
+        if not self.is_connected:
+            return None
+        try:
+            full_key = self._make_key(key)
+            pipe = self._client.pipeline(transaction=False)
+            pipe.xlen(full_key)
+            pipe.xrange(full_key, count=1)
+            pipe.xrevrange(full_key, count=1)
+            length, first, last = pipe.execute()
+            return {
+                "length": length,
+                "first_id": first[0][0] if first else None,
+                "last_id": last[0][0] if last else None,
+            }
+        except Exception as e:
+            print(f"[Redis] Stream info error: {e}")
+            self._on_error(e)
+            return None
+    
+    # ==================== DELTAS MATRIZ USUARIO-HÁBITO ====================
+    
+    HABIT_DELTAS_STREAM = "matrix:habit_deltas"
+    HABIT_DELTAS_MAXLEN = 100000
+    
+    def publish_habit_delta(self, user_id: int, habito_id: int, activo: bool) -> bool:
+        """
+        Publica un cambio de suscripción (usuario agregó/quitó un hábito)
+        para que los recomendadores parcheen su matriz sin recargarla.
+        
+        También descarta las recomendaciones cacheadas del usuario.
+        """
+        entry_id = self.stream_add(
+            self.HABIT_DELTAS_STREAM,
+            {"user_id": user_id, "habito_id": habito_id, "activo": int(activo)},
+            maxlen=self.HABIT_DELTAS_MAXLEN
+        )
+        self.delete_pattern(f"recommendations:user:{user_id}:*")
+        return entry_id is not None
+    
+    # ==================== REFRESCO DE PREDICCIONES ====================
+    
+    # Ventana (segundos) en la que varios toggles de un usuario se juntan
+    # en un solo recálculo
+    PREDICTION_REFRESH_WINDOW = 2
+    
+    def mark_prediction_refresh(self, user_id: int, habito_usuario_id: int) -> bool:
+        """
+        Anota un hábito cuya predicción hay que recalcular.
+        
+        Returns:
+            True si abrió una ventana nueva (quien llama debe encolar el
+            recálculo); False si ya hay uno programado o Redis no está
+        """
+        return self.mark_prediction_refresh_many(user_id, [habito_usuario_id])
+    
+    def mark_prediction_refresh_many(self, user_id: int, habito_usuario_ids: List[int]) -> bool:
+        """
+        Anota varios hábitos de un usuario en un solo viaje a Redis (un
+        SADD con todos y el SET NX de la ventana en el mismo pipeline).
+        
+        Returns:
+            Igual que mark_prediction_refresh
+        """
+        if not self.is_connected or not habito_usuario_ids:
+            return False
+        try:
+            pending_key = self._make_key(f"predictions:refresh:user:{user_id}:habits")
+            pipe = self._client.pipeline()
+            pipe.sadd(pending_key, *habito_usuario_ids)
+            pipe.expire(pending_key, 300)
+            pipe.set(
+                self._make_key(f"predictions:refresh:user:{user_id}:scheduled"), 1,
+                nx=True, ex=self.PREDICTION_REFRESH_WINDOW + 60
+            )
+            return bool(pipe.execute()[2])
+        except Exception as e:
+            print(f"[Redis] Prediction refresh mark error: {e}")
+            self._on_error(e)
+            return False
+    
+    def pop_prediction_refresh(self, user_id: int) -> List[int]:
+        """
+        Cierra la ventana del usuario y devuelve los hábitos anotados.
+        Los toggles que lleguen después abren una ventana nueva.
+        """
+        if not self.is_connected:
+            return []
+        try:
+            pending_key = self._make_key(f"predictions:refresh:user:{user_id}:habits")
+            self._client.delete(self._make_key(f"predictions:refresh:user:{user_id}:scheduled"))
+            pipe = self._client.pipeline(transaction=True)
+            pipe.smembers(pending_key)
+            pipe.delete(pending_key)
+            return sorted(int(h) for h in pipe.execute()[0])
+        except Exception as e:
+            print(f"[Redis] Prediction refresh pop error: {e}")
+            self._on_error(e)
+            return []
+    
+    # ==================== IDEMPOTENCIA ====================
+
+    # Cuánto se guarda la respuesta de una petición con Idempotency-Key
+    IDEMPOTENCY_TTL = 24 * 3600
+    # Cuánto dura la marca "en proceso" (si el proceso muere a medias,
+    # la key se libera sola pasado este tiempo)
+    IDEMPOTENCY_PENDING_TTL = 60
+
+    def _idempotency_key(self, scope: str, user_id: int, key: str) -> str:
+        return self._make_key(f"idempotency:{scope}:user:{user_id}:{key}")
+
+    def claim_idempotency_key(
+        self, scope: str, user_id: int, key: str, fingerprint: str
+    ) -> Tuple[str, Optional[Any]]:
+        """
+        Reserva una Idempotency-Key antes de ejecutar la petición.
+
+        Args:
+            scope: Endpoint (las keys de endpoints distintos no se mezclan)
+            fingerprint: Identifica la petición (p. ej. el recurso); una
+                misma key con otra huella es un error del cliente
+
+        Returns:
+            (estado, respuesta):
+            - ("nueva", None): reservada, quien llama ejecuta y luego
+              guarda con store_idempotent_response()
+            - ("completada", respuesta): ya se ejecutó, repetir respuesta
+            - ("en_proceso", None): otra petición con la key sigue corriendo
+            - ("conflicto", None): la key se usó con otra petición
+            - ("sin_redis", None): Redis no está, se ejecuta sin idempotencia
+
+        Es de mejor esfuerzo: ver store_idempotent_response().
+        """
+        if not self.is_connected:
+            return "sin_redis", None
+        full_key = self._idempotency_key(scope, user_id, key)
+        pending = json.dumps({"estado": "en_proceso", "huella": fingerprint})
+        try:
+            # Dos intentos: la key puede liberarse entre el SET NX y el GET
+            for _ in range(2):
+                if self._client.set(full_key, pending, nx=True, ex=self.IDEMPOTENCY_PENDING_TTL):
+                    return "nueva", None
+                raw = self._client.get(full_key)
+                if raw is None:
+                    continue
+                stored = json.loads(raw)
+                if stored.get("huella") != fingerprint:
+                    return "conflicto", None
+                if stored.get("estado") == "completada":
+                    return "completada", stored.get("respuesta")
+                return "en_proceso", None
+            return "en_proceso", None
+        except Exception as e:
+            print(f"[Redis] Idempotency claim error: {e}")
+            self._on_error(e)
+            return "sin_redis", None
+
+    # Intentos para guardar la respuesta (la escritura ya se aplicó)
+    IDEMPOTENCY_STORE_ATTEMPTS = 3
+
+    def store_idempotent_response(
+        self, scope: str, user_id: int, key: str, fingerprint: str, response: Any
+    ) -> bool:
+        """
+        Guarda la respuesta de una key reservada para repetirla en reintentos.
+
+        La garantía es de mejor esfuerzo: si no se puede guardar (Redis
+        caído), la marca "en proceso" vence a los IDEMPOTENCY_PENDING_TTL
+        segundos y un reintento posterior volvería a aplicar la escritura.
+        Por eso se reintenta y, si aun así falla, se avisa en el log.
+
+        Returns:
+            True si quedó guardada
+        """
+        full_key = self._idempotency_key(scope, user_id, key)
+        value = {"estado": "completada", "huella": fingerprint, "respuesta": response}
+        for attempt in range(self.IDEMPOTENCY_STORE_ATTEMPTS):
+            if self.set_json(full_key, value, ttl=self.IDEMPOTENCY_TTL):
+                return True
+            if attempt + 1 < self.IDEMPOTENCY_STORE_ATTEMPTS:
+                time.sleep(0.05 * (attempt + 1))
+        print(
+            f"[Redis] ERROR: could not store idempotent response for {full_key}. "
+            f"The write was applied; a retry after {self.IDEMPOTENCY_PENDING_TTL}s "
+            f"with the same Idempotency-Key would apply it again."
+        )
+        return False
+
+    def release_idempotency_key(self, scope: str, user_id: int, key: str) -> bool:
+        """Libera una key reservada cuya petición falló (el reintento se ejecuta)."""
+        return self.delete(self._idempotency_key(scope, user_id, key))
+
     # ==================== STATS ====================
     
     def get_stats(self) -> dict:
@@ -225,6 +623,7 @@ class RedisClient:
                 "connected_clients": info.get("connected_clients", 0),
             }
         except Exception as e:
+            self._on_error(e)
             return {"connected": False, "error": str(e)}
 
 
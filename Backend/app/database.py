@@ -2,43 +2,233 @@
 """
 Módulo centralizado para el pool de conexiones a la base de datos.
 Todas las clases de conexión comparten este pool único.
+
+El pool NO se crea al importar: la API lo abre en el lifespan de FastAPI
+(ver main.py) y los procesos sin lifespan (Celery, scripts) lo crean en
+el primer get_pool().
+
+Además hay un pool asíncrono (AsyncConnectionPool) para los endpoints
+`async def` y las clases Async*Connection: sus consultas no ocupan un
+hilo del threadpool de Starlette ni bloquean el event loop. Solo existe
+dentro del event loop de la API (lo abre el lifespan).
+
+Tamaños, timeouts, vida de las conexiones y reintentos salen de config
+(DB_POOL_*). Los pools están instrumentados: además de get_stats() de
+psycopg_pool, cada uno lleva un histograma del tiempo de espera para
+obtener una conexión (checkout) y cuenta errores y reconexiones
+fallidas; get_pool_stats() lo junta todo (/api/system/db/pool).
 """
 
-from psycopg_pool import ConnectionPool
-from .config import DATABASE_URL
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
+from .config import (
+    DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE,
+    DB_ASYNC_POOL_MIN_SIZE, DB_ASYNC_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+    DB_POOL_MAX_WAITING, DB_POOL_MAX_IDLE, DB_POOL_MAX_LIFETIME,
+    DB_POOL_RECONNECT_TIMEOUT
+)
+from bisect import bisect_left
 import logging
+import threading
+import time
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+class CheckoutMetrics:
+    """
+    Métricas de checkout de un pool: histograma acumulable (estilo
+    Prometheus) del tiempo de espera por una conexión, errores de
+    checkout (timeouts, cola llena) y reconexiones fallidas.
+    """
+    
+    # Límites superiores de los buckets, en milisegundos
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)  # último: > 10s
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+        self.reconnect_failures = 0
+    
+    def observe(self, wait_ms: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.BUCKETS_MS, wait_ms)] += 1
+            self.total += 1
+            self.sum_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+    
+    def error(self) -> None:
+        with self._lock:
+            self.errors += 1
+    
+    def reconnect_failed(self) -> None:
+        with self._lock:
+            self.reconnect_failures += 1
+    
+    def _quantile(self, q: float) -> float:
+        """Cota superior del bucket donde cae el cuantil q."""
+        target = q * self.total
+        acumulado = 0
+        for limite, count in zip(self.BUCKETS_MS, self.counts):
+            acumulado += count
+            if acumulado >= target:
+                return float(limite)
+        return self.max_ms
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            acumulado = 0
+            buckets = {}
+            for limite, count in zip(self.BUCKETS_MS, self.counts):
+                acumulado += count
+                buckets[f"le_{limite}ms"] = acumulado
+            buckets["le_inf"] = self.total
+            return {
+                "checkouts": self.total,
+                "checkout_errors": self.errors,
+                "reconnect_failures": self.reconnect_failures,
+                "wait_ms": {
+                    "avg": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+                    "max": round(self.max_ms, 3),
+                    "p50": self._quantile(0.50) if self.total else 0.0,
+                    "p95": self._quantile(0.95) if self.total else 0.0,
+                    "p99": self._quantile(0.99) if self.total else 0.0,
+                },
+                "histogram": buckets
+            }
+
+
+class InstrumentedConnectionPool(ConnectionPool):
+    """ConnectionPool que mide la espera de cada checkout."""
+    
+    def __init__(self, *args, **kwargs):
+        self.metrics = CheckoutMetrics()
+        super().__init__(*args, **kwargs)
+    
+    def getconn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            conn = super().getconn(timeout=timeout)
+        except Exception:
+            self.metrics.error()
+            raise
+        self.metrics.observe((time.perf_counter() - start) * 1000)
+        return conn
+
+
+class InstrumentedAsyncConnectionPool(AsyncConnectionPool):
+    """AsyncConnectionPool que mide la espera de cada checkout."""
+    
+    def __init__(self, *args, **kwargs):
+        self.metrics = CheckoutMetrics()
+        super().__init__(*args, **kwargs)
+    
+    async def getconn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            conn = await super().getconn(timeout=timeout)
+        except Exception:
+            self.metrics.error()
+            raise
+        self.metrics.observe((time.perf_counter() - start) * 1000)
+        return conn
+
+
+def _on_reconnect_failed(pool) -> None:
+    """
+    psycopg_pool agotó DB_POOL_RECONNECT_TIMEOUT sin poder reponer una
+    conexión. El pool queda con una menos y vuelve a intentarlo cuando
+    un request la necesite.
+    """
+    pool.metrics.reconnect_failed()
+    logger.error(f"[{pool.name}] No se pudo reconectar en {DB_POOL_RECONNECT_TIMEOUT}s")
+
+
+def _pool_kwargs(name: str, min_size: int, max_size: int) -> dict:
+    """Parámetros comunes de los pools (desde config)."""
+    return dict(
+        min_size=min_size,
+        max_size=max_size,
+        name=name,
+        timeout=DB_POOL_TIMEOUT,
+        max_waiting=DB_POOL_MAX_WAITING,
+        max_idle=DB_POOL_MAX_IDLE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        reconnect_timeout=DB_POOL_RECONNECT_TIMEOUT,
+        open=False
+    )
+
+
 # Pool de conexiones único para toda la aplicación
-# Se inicializa cuando se importa este módulo
-connection_pool: ConnectionPool = None
+# Se inicializa con init_pool() (lifespan) o en el primer get_pool()
+connection_pool: InstrumentedConnectionPool = None
+_pool_lock = threading.Lock()
 
-def init_pool():
+# Pool asíncrono de la API; se inicializa con init_async_pool() (lifespan)
+async_pool: InstrumentedAsyncConnectionPool = None
+
+def init_pool(wait_timeout: float = 0.0) -> bool:
     """
     Inicializa el pool de conexiones.
     Debe llamarse al iniciar la aplicación.
+    
+    Las conexiones se crean en segundo plano; si la base de datos no
+    responde, el pool sigue reintentando solo.
+    
+    Args:
+        wait_timeout: Segundos a esperar las conexiones mínimas (0 = no esperar)
+        
+    Returns:
+        True si las conexiones mínimas quedaron listas dentro del tiempo
     """
     global connection_pool
     
-    if connection_pool is not None:
-        logger.warning("El pool de conexiones ya está inicializado")
-        return
+    # El lifespan y un get_pool() concurrente (p. ej. al precargar el
+    # modelo) no deben crear dos pools
+    with _pool_lock:
+        if connection_pool is not None:
+            logger.warning("El pool de conexiones ya está inicializado")
+        else:
+            try:
+                pool = InstrumentedConnectionPool(
+                    DATABASE_URL,
+                    reconnect_failed=_on_reconnect_failed,
+                    **_pool_kwargs("pool-sync", DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+                )
+                pool.open(wait=False)
+                connection_pool = pool
+                logger.info(f"Pool de conexiones inicializado: min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE}")
+            except Exception as e:
+                logger.error(f"Error al inicializar pool de conexiones: {e}")
+                raise
     
+    if wait_timeout <= 0:
+        return True
     try:
-        connection_pool = ConnectionPool(
-            DATABASE_URL,
-            min_size=2,      # Mínimo 2 conexiones siempre disponibles
-            max_size=10,     # Máximo 10 conexiones simultáneas
-            open=True        # Crear conexiones al inicializar
-        )
-        logger.info(f"Pool de conexiones inicializado: min={2}, max={10}")
-    except Exception as e:
-        logger.error(f"Error al inicializar pool de conexiones: {e}")
-        raise
+        connection_pool.wait(timeout=wait_timeout)
+        return True
+    except PoolTimeout:
+        logger.error(f"La base de datos no respondió en {wait_timeout}s; el pool sigue reintentando")
+        return False
+
+def check_pool(timeout: float = 2.0) -> bool:
+    """
+    Verifica que la base de datos responda (SELECT 1 con una conexión
+    del pool). Para el endpoint de readiness.
+    """
+    if connection_pool is None:
+        return False
+    try:
+        with connection_pool.connection(timeout=timeout) as conn:
+            conn.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
 
-def get_pool() -> ConnectionPool:
+def get_pool() -> InstrumentedConnectionPool:
     """
     Obtiene el pool de conexiones.
     Si no está inicializado, lo inicializa automáticamente.
@@ -63,5 +253,120 @@ def close_pool():
         connection_pool = None
         logger.info("Pool de conexiones cerrado")
 
-# Inicializar automáticamente al importar el módulo
-init_pool()
+
+# ============================================
+# POOL ASÍNCRONO
+# ============================================
+
+async def init_async_pool(wait_timeout: float = 0.0) -> bool:
+    """
+    Inicializa el pool asíncrono. Debe llamarse desde el event loop de la
+    API (lifespan); igual que init_pool(), las conexiones se crean en
+    segundo plano y el pool sigue reintentando si la base no responde.
+    
+    Args:
+        wait_timeout: Segundos a esperar las conexiones mínimas (0 = no esperar)
+        
+    Returns:
+        True si las conexiones mínimas quedaron listas dentro del tiempo
+    """
+    global async_pool
+    
+    if async_pool is not None:
+        logger.warning("El pool asíncrono ya está inicializado")
+    else:
+        pool = InstrumentedAsyncConnectionPool(
+            DATABASE_URL,
+            reconnect_failed=_on_reconnect_failed,
+            **_pool_kwargs("pool-async", DB_ASYNC_POOL_MIN_SIZE, DB_ASYNC_POOL_MAX_SIZE)
+        )
+        await pool.open(wait=False)
+        async_pool = pool
+        logger.info(f"Pool asíncrono inicializado: min={DB_ASYNC_POOL_MIN_SIZE}, max={DB_ASYNC_POOL_MAX_SIZE}")
+    
+    if wait_timeout <= 0:
+        return True
+    try:
+        await async_pool.wait(timeout=wait_timeout)
+        return True
+    except PoolTimeout:
+        logger.error(f"La base de datos no respondió en {wait_timeout}s; el pool asíncrono sigue reintentando")
+        return False
+
+async def check_async_pool(timeout: float = 2.0) -> bool:
+    """SELECT 1 con una conexión del pool asíncrono (readiness)."""
+    if async_pool is None:
+        return False
+    try:
+        async with async_pool.connection(timeout=timeout) as conn:
+            await conn.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+def get_async_pool() -> InstrumentedAsyncConnectionPool:
+    """
+    Obtiene el pool asíncrono.
+    A diferencia de get_pool() no se crea solo: pertenece al event loop de
+    la API, así que debe abrirse con init_async_pool() en el lifespan.
+    """
+    if async_pool is None:
+        raise RuntimeError("Pool asíncrono no inicializado (init_async_pool en el lifespan)")
+    return async_pool
+
+async def close_async_pool():
+    """Cierra el pool asíncrono. Debe llamarse al cerrar la aplicación."""
+    global async_pool
+    
+    if async_pool is not None:
+        await async_pool.close()
+        async_pool = None
+        logger.info("Pool asíncrono cerrado")
+
+
+# ============================================
+# MÉTRICAS
+# ============================================
+
+def get_pool_stats() -> dict:
+    """
+    Estado de los pools de este proceso: get_stats() de psycopg_pool
+    (tamaño, disponibles, requests_waiting, errores de conexión,
+    timeouts...) más el histograma de espera de checkout.
+    
+    Returns:
+        Dict con una entrada por pool abierto ("sync", "async") y la
+        configuración que determina cuántas conexiones abre el proceso
+    """
+    pools = {}
+    for key, pool in (("sync", connection_pool), ("async", async_pool)):
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        pools[key] = {
+            "name": pool.name,
+            "size": stats.get("pool_size", 0),
+            "available": stats.get("pool_available", 0),
+            "waiting": stats.get("requests_waiting", 0),
+            "saturated": stats.get("pool_available", 0) == 0
+                and stats.get("pool_size", 0) >= pool.max_size,
+            "stats": stats,
+            "checkout": pool.metrics.snapshot()
+        }
+    
+    return {
+        "pools": pools,
+        "config": {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "async_min_size": DB_ASYNC_POOL_MIN_SIZE,
+            "async_max_size": DB_ASYNC_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+            "max_waiting": DB_POOL_MAX_WAITING,
+            "max_idle": DB_POOL_MAX_IDLE,
+            "max_lifetime": DB_POOL_MAX_LIFETIME,
+            "reconnect_timeout": DB_POOL_RECONNECT_TIMEOUT
+        },
+        # Conexiones máximas que puede abrir este proceso
+        "max_connections_process": sum(p.max_size for p in (connection_pool, async_pool) if p is not None)
+    }
@@ -1,21 +1,29 @@
 # Backend/app/main.py
 
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import Response
+from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi.responses import Response, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT
 from jose import jwt, JWTError
-from datetime import datetime, timedelta, date
-from typing import Optional
+from datetime import datetime, date
+from typing import List, Optional
 from pydantic import BaseModel
 from .model.userConnection import userConnection
+from .model.asyncUserConnection import AsyncUserConnection
 from .model.planesConnection import PlanesConnection
 from .schema.userSchema import UserCreateSchema, UserUpdateSchema, LoginData, UserResponseSchema
 from fastapi.middleware.cors import CORSMiddleware
 from .config import JWT_SECRET_KEY, JWT_ALGORITHM  # Configuración centralizada
+from .config import DB_STARTUP_TIMEOUT, PRELOAD_AI_MODELS
+from .config import RECOMMENDER_SEARCH_MODE, RECOMMENDER_LSH_BANDS, RECOMMENDER_LSH_ROWS
+from .database import init_pool, close_pool, check_pool
+from .database import init_async_pool, close_async_pool, check_async_pool, get_async_pool
+from .database import get_pool_stats
+from contextlib import asynccontextmanager
 
 # IMPORTACIONES PARA HABITOS
 from .model.habitConnection import habitConnection
+from .model.asyncHabitConnection import AsyncHabitConnection
 from .schema.habitSchema import (
     CategoriaHabitoSchema, 
     HabitoPredeterminadoSchema, 
@@ -25,7 +33,8 @@ from .schema.habitSchema import (
     HabitoResponseSchema,
     HabitoFrecuenciaUpdateSchema,
     HabitoPersonalizadoCreateSchema,
-    HabitoPersonalizadoUpdateSchema
+    HabitoPersonalizadoUpdateSchema,
+    HabitoCompletadoLoteSchema
 )
 
 # IMPORTACIONES PARA PLANES
@@ -56,7 +65,7 @@ from .schema.planSchema import (
 )
 
 # IMPORTACIONES PARA ESTADÍSTICAS
-from .model.estadisticasConnection import EstadisticasConnection
+from .model.asyncEstadisticasConnection import AsyncEstadisticasConnection
 from .schema.estadisticasSchema import (
     EstadisticasUsuarioSchema,
     EstadisticasResumenSchema,
@@ -64,7 +73,7 @@ from .schema.estadisticasSchema import (
 )
 
 # IMPORTACIONES PARA REFLEXIONES DIARIAS
-from .model.reflexionesConnection import ReflexionesConnection
+from .model.asyncReflexionesConnection import AsyncReflexionesConnection
 from .schema.reflexionSchema import (
     CrearReflexionSchema,
     ReflexionHoyResponseSchema,
@@ -76,12 +85,19 @@ from .schema.reflexionSchema import (
 from .core.redis_client import redis_client
 from .websocket import ws_manager, WSEvent, create_event
 from .websocket.events import event_habit_completed, event_habit_uncompleted, event_cache_invalidated
+from .websocket.events import event_habits_batch_updated
 from fastapi import WebSocket, WebSocketDisconnect, BackgroundTasks
 import asyncio
+import hashlib
+import json
+import threading
 
 # Celery tasks (importar con manejo de errores por si worker no está corriendo)
 try:
-    from .tasks import train_model_task, generate_recommendations_task, generate_predictions_task
+    from .tasks import (
+        train_model_task, generate_recommendations_task, generate_predictions_task,
+        refresh_user_predictions_task
+    )
     from .tasks.celery_app import celery_app
     CELERY_AVAILABLE = True
 except ImportError:
@@ -92,10 +108,121 @@ except ImportError:
 SECRET_KEY = JWT_SECRET_KEY
 ALGORITHM = JWT_ALGORITHM
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Abre los recursos del worker al arrancar, en paralelo: pools de la base
+    de datos (síncrono y asíncrono), Redis y (si PRELOAD_AI_MODELS) el
+    modelo de IA. Nada de esto
+    ocurre al importar el módulo. Si algo falla el worker arranca igual:
+    /api/system/ready lo reporta y cada recurso se recupera solo.
+    """
+    resources = {
+        "postgresql": asyncio.to_thread(init_pool, DB_STARTUP_TIMEOUT),
+        "postgresql_async": init_async_pool(DB_STARTUP_TIMEOUT),
+        "redis": asyncio.to_thread(redis_client.connect),
+    }
+    if PRELOAD_AI_MODELS:
+        resources["model"] = asyncio.to_thread(get_predictor)
+    
+    start = datetime.now()
+    results = await asyncio.gather(*resources.values(), return_exceptions=True)
+    for name, result in zip(resources, results):
+        if isinstance(result, Exception) or result is False:
+            print(f"[Startup] {name} not ready: {result}")
+    print(f"[Startup] Resources opened in {(datetime.now() - start).total_seconds():.2f}s")
+    
+    yield
+    
+    await close_async_pool()
+    close_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 conn = userConnection()
 habit_conn = habitConnection()
-stats_conn = EstadisticasConnection()
+
+# Endpoints `async def` de usuarios, hábitos, estadísticas y reflexiones:
+# pool asíncrono, sin ocupar hilos del threadpool. Planes e IA siguen
+# con las clases síncronas (corren en el threadpool).
+async_conn = AsyncUserConnection()
+async_habit_conn = AsyncHabitConnection()
+async_stats_conn = AsyncEstadisticasConnection()
+async_reflexiones_conn = AsyncReflexionesConnection()
+
+# ============================================
+# DELTAS DE LA MATRIZ USUARIO-HÁBITO (IA)
+# ============================================
+
+def publicar_delta_habito(user_id: int, habito_id: int, activo: bool) -> None:
+    """
+    Propaga un alta/baja de hábito a la matriz del recomendador sin recargarla.
+    
+    Con Redis, el delta se publica en un stream que todos los workers leen;
+    sin Redis, se aplica solo sobre el recomendador de este proceso.
+    """
+    try:
+        if not redis_client.publish_habit_delta(user_id, habito_id, activo) and _recommender is not None:
+            # Si aún no se creó, cargará la matriz ya con el cambio
+            _recommender.apply_habit_delta(user_id, habito_id, activo)
+    except Exception as e:
+        print(f"[AI] Error publicando delta de hábito: {e}")
+
+def refrescar_predicciones_habito(user_id: int, habito_usuario_id: int) -> None:
+    """
+    Programa el recálculo de la predicción de un hábito tras un toggle.
+    
+    Los toggles de un usuario dentro de PREDICTION_REFRESH_WINDOW segundos
+    se juntan en una sola tarea, que parchea solo esos hábitos en el cache
+    (no se descarta). Si no se puede encolar, se descarta el cache de
+    predicciones como antes.
+    """
+    refrescar_predicciones_habitos(user_id, [habito_usuario_id])
+
+def refrescar_predicciones_habitos(user_id: int, habito_usuario_ids: List[int]) -> None:
+    """
+    Igual que refrescar_predicciones_habito para varios hábitos a la vez
+    (un lote): se anotan todos con un solo pipeline de Redis.
+    """
+    try:
+        if redis_client.mark_prediction_refresh_many(user_id, habito_usuario_ids):
+            if not CELERY_AVAILABLE:
+                raise RuntimeError("Celery not available")
+            refresh_user_predictions_task.apply_async(
+                args=[user_id], countdown=redis_client.PREDICTION_REFRESH_WINDOW
+            )
+    except Exception as e:
+        print(f"[AI] Error programando refresco de predicciones: {e}")
+        redis_client.pop_prediction_refresh(user_id)
+        redis_client.delete(f"predictions:user:{user_id}")
+
+async def reservar_idempotency_key(
+    scope: str, user_id: int, idempotency_key: Optional[str], huella: str, response: Response
+):
+    """
+    Reserva la Idempotency-Key de una escritura (ver
+    RedisClient.claim_idempotency_key).
+    
+    Returns:
+        (reservada, guardada): si guardada no es None es la respuesta del
+        primer intento y hay que devolverla tal cual; si reservada es True,
+        quien llama guarda su respuesta al terminar o libera la key si falla
+    """
+    if idempotency_key is None:
+        return False, None
+    if not 0 < len(idempotency_key) <= 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key inválida (1 a 255 caracteres)")
+    estado, guardada = await asyncio.to_thread(
+        redis_client.claim_idempotency_key, scope, user_id, idempotency_key, huella
+    )
+    if estado == "completada":
+        response.headers["Idempotent-Replayed"] = "true"
+        return False, guardada
+    if estado == "en_proceso":
+        raise HTTPException(status_code=409, detail="Ya hay una petición en proceso con esta Idempotency-Key")
+    if estado == "conflicto":
+        raise HTTPException(status_code=422, detail="La Idempotency-Key ya se usó con otra petición")
+    return estado == "nueva", None
 
 # ============================================
 # SISTEMA DE NIVELES - Función helper
@@ -144,9 +271,11 @@ class TokenData(BaseModel):
     correo: str
     control_id: Optional[int] = None
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> TokenData:
     """
     Verifica el token JWT y retorna los datos del usuario.
+    Es `async def` (solo CPU, sin I/O) para que FastAPI no lo mande al
+    threadpool en cada request.
     Úsalo como dependencia en endpoints protegidos:
     
     @app.get("/ruta-protegida")
@@ -281,31 +410,31 @@ def tuple_to_habito_usuario_dict(data):
 # ============================================
 
 @app.get("/", status_code=HTTP_200_OK)
-def get_all_users():
+async def get_all_users():
     """Obtener todos los usuarios"""
     items = []
-    for data in conn.read_all():
+    for data in await async_conn.read_all():
         user_dict = user_response(data)
         if user_dict:
             items.append(user_dict)
     return items
 
 @app.get("/api/usuario/{user_id}", status_code=HTTP_200_OK)
-def get_one_user(user_id: int, current_user: TokenData = Depends(verify_token)):
+async def get_one_user(user_id: int, current_user: TokenData = Depends(verify_token)):
     """Obtener un usuario por ID (PROTEGIDO)"""
     # Verificar que el usuario solo puede ver sus propios datos
     verify_user_access(user_id, current_user)
     
-    data = conn.read_one(user_id)
+    data = await async_conn.read_one(user_id)
     if not data:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return user_response(data)
 
 @app.post("/register", status_code=HTTP_201_CREATED)
-def register(user_data: UserCreateSchema):
+async def register(user_data: UserCreateSchema):
     """Registrar nuevo usuario"""
     # Verificar si el correo ya existe
-    existing_user = conn.read_by_email(user_data.correo)
+    existing_user = await async_conn.read_by_email(user_data.correo)
     if existing_user:
         raise HTTPException(status_code=400, detail="El correo electrónico ya está registrado")
     
@@ -314,10 +443,10 @@ def register(user_data: UserCreateSchema):
         data["activo"] = True
         
         # Insertar usuario y obtener su ID
-        user_id = conn.write(data)
+        user_id = await async_conn.write(data)
         
         # Crear registro de estadísticas para el nuevo usuario (puntos, rachas, nivel)
-        stats_conn.crear_estadisticas_usuario(user_id)
+        await async_stats_conn.crear_estadisticas_usuario(user_id)
         
         return {"message": "Usuario registrado correctamente", "user_id": user_id}
     
@@ -325,10 +454,10 @@ def register(user_data: UserCreateSchema):
         raise HTTPException(status_code=500, detail=f"Error al registrar usuario: {str(e)}")
 
 @app.post("/login")
-def login(user_data: LoginData):
+async def login(user_data: LoginData):
     """Iniciar sesión y crear sesión en control"""
     # Usar el método authenticate_user que verifica la contraseña hasheada
-    user = conn.authenticate_user(user_data.correo, user_data.contraseña)
+    user = await async_conn.authenticate_user(user_data.correo, user_data.contraseña)
     
     if not user:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
@@ -338,7 +467,7 @@ def login(user_data: LoginData):
         raise HTTPException(status_code=401, detail="Cuenta desactivada")
     
     # IMPORTANTE: Crear sesión en la tabla control
-    control_id = conn.create_session(user[0])  # user[0] es user_id
+    control_id = await async_conn.create_session(user[0])  # user[0] es user_id
     
     # Crear token JWT (incluir control_id para identificar sesión)
     token_data = {
@@ -392,35 +521,35 @@ def get_current_user():
         raise HTTPException(status_code=500, detail=f"Error al obtener usuario actual: {str(e)}")
 
 @app.put("/api/usuario/{user_id}", status_code=HTTP_204_NO_CONTENT)
-def update_user(user_id: int, user_data: UserUpdateSchema, current_user: TokenData = Depends(verify_token)):
+async def update_user(user_id: int, user_data: UserUpdateSchema, current_user: TokenData = Depends(verify_token)):
     """Actualizar usuario (PROTEGIDO)"""
     # Verificar que el usuario solo puede editar sus propios datos
     verify_user_access(user_id, current_user)
     
     # Verificar que el usuario existe
-    existing_user = conn.read_one(user_id)
+    existing_user = await async_conn.read_one(user_id)
     if not existing_user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     # Si se está actualizando el correo, verificar que no exista
     if user_data.correo:
-        existing_email = conn.read_by_email(user_data.correo)
+        existing_email = await async_conn.read_by_email(user_data.correo)
         if existing_email and existing_email[0] != user_id:
             raise HTTPException(status_code=400, detail="El correo electrónico ya está en uso")
     
     data = user_data.dict(exclude_unset=True)  # Solo campos que se envían
-    conn.update(user_id, data)
+    await async_conn.update(user_id, data)
     return Response(status_code=HTTP_204_NO_CONTENT)
 
 @app.delete("/api/usuario/{user_id}", status_code=HTTP_204_NO_CONTENT)
-def delete_user(user_id: int):
+async def delete_user(user_id: int):
     """Eliminar usuario"""
     # Verificar que el usuario existe
-    existing_user = conn.read_one(user_id)
+    existing_user = await async_conn.read_one(user_id)
     if not existing_user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    conn.delete(user_id)
+    await async_conn.delete(user_id)
     return Response(status_code=HTTP_204_NO_CONTENT)
 
 # ========================================
@@ -428,11 +557,11 @@ def delete_user(user_id: int):
 # ========================================
 
 @app.get("/api/categorias-habitos", status_code=HTTP_200_OK)
-def get_categorias_habitos():
+async def get_categorias_habitos():
     """Obtener todas las categorías de hábitos"""
     try:
         categorias = []
-        for data in habit_conn.get_categorias_habitos():
+        for data in await async_habit_conn.get_categorias_habitos():
             categoria_dict = tuple_to_categoria_dict(data)
             if categoria_dict:
                 categorias.append(categoria_dict)
@@ -441,11 +570,11 @@ def get_categorias_habitos():
         raise HTTPException(status_code=500, detail=f"Error al obtener categorías: {str(e)}")
 
 @app.get("/api/habitos/categoria/{categoria_id}", status_code=HTTP_200_OK)
-def get_habitos_by_categoria(categoria_id: int):
+async def get_habitos_by_categoria(categoria_id: int):
     """Obtener hábitos predeterminados por categoría"""
     try:
         habitos = []
-        for data in habit_conn.get_habitos_by_categoria(categoria_id):
+        for data in await async_habit_conn.get_habitos_by_categoria(categoria_id):
             habito_dict = tuple_to_habito_dict(data)
             if habito_dict:
                 habitos.append(habito_dict)
@@ -460,11 +589,11 @@ def get_habitos_by_categoria(categoria_id: int):
         raise HTTPException(status_code=500, detail=f"Error al obtener hábitos: {str(e)}")
 
 @app.get("/api/habitos", status_code=HTTP_200_OK)
-def get_all_habitos():
+async def get_all_habitos():
     """Obtener todos los hábitos predeterminados"""
     try:
         habitos = []
-        for data in habit_conn.get_all_habitos_predeterminados():
+        for data in await async_habit_conn.get_all_habitos_predeterminados():
             habito_dict = tuple_to_habito_dict(data)
             if habito_dict:
                 habitos.append(habito_dict)
@@ -473,10 +602,10 @@ def get_all_habitos():
         raise HTTPException(status_code=500, detail=f"Error al obtener hábitos: {str(e)}")
 
 @app.get("/api/habito/{habito_id}", status_code=HTTP_200_OK)
-def get_habito_by_id(habito_id: int):
+async def get_habito_by_id(habito_id: int):
     """Obtener un hábito específico por ID"""
     try:
-        data = habit_conn.get_habito_by_id(habito_id)
+        data = await async_habit_conn.get_habito_by_id(habito_id)
         if not data:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
         
@@ -488,24 +617,24 @@ def get_habito_by_id(habito_id: int):
         raise HTTPException(status_code=500, detail=f"Error al obtener hábito: {str(e)}")
 
 @app.post("/api/usuario/{user_id}/habitos", status_code=HTTP_201_CREATED)
-def add_habito_to_user(user_id: int, habito_data: AddHabitoToUserSchema, current_user: TokenData = Depends(verify_token)):
+async def add_habito_to_user(user_id: int, habito_data: AddHabitoToUserSchema, current_user: TokenData = Depends(verify_token)):
     """Agregar un hábito al usuario (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         # Verificar que el hábito existe
-        habito = habit_conn.get_habito_by_id(habito_data.habito_id)
+        habito = await async_habit_conn.get_habito_by_id(habito_data.habito_id)
         if not habito:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
         
         # Agregar hábito al usuario
-        result = habit_conn.add_habito_to_user(
+        result = await async_habit_conn.add_habito_to_user(
             user_id, 
             habito_data.habito_id, 
             habito_data.frecuencia_personal
@@ -514,6 +643,8 @@ def add_habito_to_user(user_id: int, habito_data: AddHabitoToUserSchema, current
         if result is None:
             raise HTTPException(status_code=400, detail="El hábito ya está agregado para este usuario")
         
+        await asyncio.to_thread(publicar_delta_habito, user_id, habito_data.habito_id, True)
+        
         return {
             "success": True, 
             "message": "Hábito agregado correctamente",
@@ -526,14 +657,14 @@ def add_habito_to_user(user_id: int, habito_data: AddHabitoToUserSchema, current
         raise HTTPException(status_code=500, detail=f"Error al agregar hábito: {str(e)}")
 
 @app.post("/api/usuario/{user_id}/habitos/multiple", status_code=HTTP_201_CREATED)
-def add_multiple_habitos_to_user(user_id: int, habitos_data: AddMultipleHabitosSchema, current_user: TokenData = Depends(verify_token)):
+async def add_multiple_habitos_to_user(user_id: int, habitos_data: AddMultipleHabitosSchema, current_user: TokenData = Depends(verify_token)):
     """Agregar múltiples hábitos al usuario (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
@@ -544,13 +675,13 @@ def add_multiple_habitos_to_user(user_id: int, habitos_data: AddMultipleHabitosS
         for habito_id in habitos_data.habito_ids:
             try:
                 # Verificar que el hábito existe
-                habito = habit_conn.get_habito_by_id(habito_id)
+                habito = await async_habit_conn.get_habito_by_id(habito_id)
                 if not habito:
                     errors.append(f"Hábito {habito_id} no encontrado")
                     continue
                 
                 # Intentar agregar el hábito
-                result = habit_conn.add_habito_to_user(
+                result = await async_habit_conn.add_habito_to_user(
                     user_id, 
                     habito_id, 
                     habitos_data.frecuencia_personal
@@ -560,6 +691,7 @@ def add_multiple_habitos_to_user(user_id: int, habitos_data: AddMultipleHabitosS
                     already_added.append(habito_id)
                 else:
                     added_habitos.append({"habito_id": habito_id, "habito_usuario_id": result})
+                    await asyncio.to_thread(publicar_delta_habito, user_id, habito_id, True)
                     
             except Exception as e:
                 errors.append(f"Error con hábito {habito_id}: {str(e)}")
@@ -580,19 +712,19 @@ def add_multiple_habitos_to_user(user_id: int, habitos_data: AddMultipleHabitosS
         raise HTTPException(status_code=500, detail=f"Error al agregar hábitos: {str(e)}")
 
 @app.get("/api/usuario/{user_id}/habitos", status_code=HTTP_200_OK)
-def get_user_habitos(user_id: int, current_user: TokenData = Depends(verify_token)):
+async def get_user_habitos(user_id: int, current_user: TokenData = Depends(verify_token)):
     """Obtener todos los hábitos activos de un usuario (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         habitos = []
-        for data in habit_conn.get_user_habitos(user_id):
+        for data in await async_habit_conn.get_user_habitos(user_id):
             habito_dict = tuple_to_habito_usuario_dict(data)
             if habito_dict:
                 habitos.append(habito_dict)
@@ -604,18 +736,18 @@ def get_user_habitos(user_id: int, current_user: TokenData = Depends(verify_toke
         raise HTTPException(status_code=500, detail=f"Error al obtener hábitos del usuario: {str(e)}")
 
 @app.get("/api/usuario/{user_id}/habitos/ids", status_code=HTTP_200_OK)
-def get_user_habito_ids(user_id: int, current_user: TokenData = Depends(verify_token)):
+async def get_user_habito_ids(user_id: int, current_user: TokenData = Depends(verify_token)):
     """Obtener solo los IDs de hábitos del usuario - para filtrar duplicados (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        ids = habit_conn.get_user_habito_ids(user_id)
+        ids = await async_habit_conn.get_user_habito_ids(user_id)
         
         return {"success": True, "data": ids}
     except HTTPException:
@@ -624,47 +756,18 @@ def get_user_habito_ids(user_id: int, current_user: TokenData = Depends(verify_t
         raise HTTPException(status_code=500, detail=f"Error al obtener IDs de hábitos: {str(e)}")
 
 @app.get("/api/usuario/{user_id}/habitos/hoy", status_code=HTTP_200_OK)
-def get_user_habits_today(user_id: int, current_user: TokenData = Depends(verify_token)):
+async def get_user_habits_today(user_id: int, current_user: TokenData = Depends(verify_token)):
     """Obtener hábitos del usuario con su estado de hoy (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        from .database import get_pool
-        pool = get_pool()
-        with pool.connection() as db_conn:
-            with db_conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        hu.habito_usuario_id,
-                        hu.user_id,
-                        hu.habito_id,
-                        h.nombre,
-                        h.descripcion,
-                        h.puntos_base,
-                        c.nombre as categoria_nombre,
-                        hu.frecuencia_personal,
-                        hu.fecha_agregado,
-                        COALESCE(sh.completado, false) as completado_hoy,
-                        sh.hora_completado,
-                        sh.notas
-                    FROM habitos_usuario hu
-                    INNER JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
-                    INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
-                    LEFT JOIN seguimiento_habitos sh ON (
-                        sh.habito_usuario_id = hu.habito_usuario_id 
-                        AND sh.fecha = CURRENT_DATE
-                    )
-                    WHERE hu.user_id = %s AND hu.activo = true
-                    ORDER BY h.categoria_id, h.nombre;
-                """, (user_id,))
-                
-                habits_data = cur.fetchall()
+        habits_data = await async_habit_conn.get_user_habits_today(user_id)
         
         habits = []
         for data in habits_data:
@@ -711,173 +814,93 @@ def get_user_habits_today(user_id: int, current_user: TokenData = Depends(verify
 async def toggle_habit_completion(
     user_id: int, 
     habito_usuario_id: int, 
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: TokenData = Depends(verify_token)
 ):
-    """Alternar el completado de un hábito para hoy (PROTEGIDO)"""
+    """
+    Alternar el completado de un hábito para hoy (PROTEGIDO)
+    
+    Todo el toggle (propiedad del hábito, seguimiento, habito_features,
+    racha, puntos y nivel) corre en la función toggle_habito() de la base
+    (migración 011): una sola sentencia y un solo viaje de ida y vuelta,
+    con los locks de fila tomados solo mientras dura la función. La
+    envoltura toggle_habito_serializado() (migración 012) toma antes un
+    advisory lock por usuario: los toggles de un mismo usuario se aplican
+    en serie y los de usuarios distintos no se esperan.
+    
+    Con el header Idempotency-Key, un reintento con la misma key (p. ej.
+    red móvil inestable) devuelve la respuesta guardada en Redis en lugar
+    de volver a alternar y sumar puntos otra vez. Es de mejor esfuerzo:
+    sin Redis (o si no se pudo guardar la respuesta) no hay garantía.
+    """
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        # Verificar que el usuario y hábito existen
-        existing_user = conn.read_one(user_id)
-        if not existing_user:
-            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        # Idempotencia: reservar la key (o repetir la respuesta guardada)
+        huella = f"habito:{habito_usuario_id}"
+        reservada, guardada = await reservar_idempotency_key(
+            "toggle", user_id, idempotency_key, huella, response
+        )
+        if guardada is not None:
+            return guardada
         
-        from .database import get_pool
-        pool = get_pool()
-        with pool.connection() as db_conn:
-            with db_conn.cursor() as cur:
-                # Verificar que el hábito pertenece al usuario y obtener puntos_base y nombre
-                cur.execute("""
-                    SELECT hu.habito_usuario_id, 
-                           COALESCE(hp.puntos_base, 10) as puntos_base,
-                           COALESCE(hp.nombre, 'Hábito personalizado') as nombre
-                    FROM habitos_usuario hu
-                    LEFT JOIN habitos_predeterminados hp ON hu.habito_id = hp.habito_id
-                    WHERE hu.habito_usuario_id = %s AND hu.user_id = %s AND hu.activo = true;
-                """, (habito_usuario_id, user_id))
-                
-                habito_data = cur.fetchone()
-                if not habito_data:
-                    raise HTTPException(status_code=404, detail="Hábito no encontrado para este usuario")
-                
-                puntos_habito = habito_data[1]  # puntos_base del hábito
-                nombre_habito = habito_data[2]  # nombre del hábito
-                
-                # Verificar si ya existe un registro para hoy
-                cur.execute("""
-                    SELECT seguimiento_id, completado FROM seguimiento_habitos
-                    WHERE habito_usuario_id = %s AND fecha = CURRENT_DATE;
-                """, (habito_usuario_id,))
-                
-                existing_record = cur.fetchone()
-                
-                if existing_record:
-                    # Ya existe, alternar el estado
-                    new_status = not existing_record[1]
-                    hora_completado = "CURRENT_TIME" if new_status else "NULL"
-                    
-                    cur.execute(f"""
-                        UPDATE seguimiento_habitos 
-                        SET completado = %s, 
-                            hora_completado = {hora_completado}
-                        WHERE seguimiento_id = %s;
-                    """, (new_status, existing_record[0]))
-                    
-                else:
-                    # No existe, crear nuevo registro como completado
-                    cur.execute("""
-                        INSERT INTO seguimiento_habitos (habito_usuario_id, fecha, completado, hora_completado)
-                        VALUES (%s, CURRENT_DATE, true, CURRENT_TIME);
-                    """, (habito_usuario_id,))
-                    new_status = True
-                
-                # ========================================
-                # LÓGICA DE RACHA - Solo si se COMPLETA
-                # ========================================
-                racha_info = None
-                if new_status:
-                    # Obtener estadísticas actuales del usuario
-                    cur.execute("""
-                        SELECT racha_actual, racha_maxima, ultima_actividad 
-                        FROM estadisticas_usuario 
-                        WHERE user_id = %s;
-                    """, (user_id,))
-                    stats = cur.fetchone()
-                    
-                    if stats:
-                        racha_actual, racha_maxima, ultima_actividad = stats
-                        hoy = date.today()
-                        ayer = hoy - timedelta(days=1)
-                        
-                        # Calcular nueva racha
-                        if ultima_actividad == hoy:
-                            # Ya completó algo hoy, no cambiar racha
-                            nueva_racha = racha_actual
-                        elif ultima_actividad == ayer:
-                            # Día consecutivo, incrementar
-                            nueva_racha = racha_actual + 1
-                        else:
-                            # Racha rota o primera vez, empezar en 1
-                            nueva_racha = 1
-                        
-                        # Actualizar racha máxima si es necesario
-                        nueva_racha_maxima = max(racha_maxima, nueva_racha)
-                        
-                        # Guardar cambios en estadísticas
-                        cur.execute("""
-                            UPDATE estadisticas_usuario 
-                            SET racha_actual = %s,
-                                racha_maxima = %s,
-                                ultima_actividad = CURRENT_DATE
-                            WHERE user_id = %s;
-                        """, (nueva_racha, nueva_racha_maxima, user_id))
-                        
-                        racha_info = {
-                            "racha_actual": nueva_racha,
-                            "racha_maxima": nueva_racha_maxima,
-                            "racha_incrementada": nueva_racha > racha_actual
-                        }
-                
-                # ========================================
-                # LÓGICA DE PUNTOS - Sumar o restar
-                # ========================================
-                puntos_info = None
-                nivel_info = None
-                
-                # Calcular cambio de puntos
-                if new_status:
-                    puntos_cambio = puntos_habito  # Sumar al completar
-                else:
-                    puntos_cambio = -puntos_habito  # Restar al desmarcar
-                
-                # Obtener nivel actual antes del cambio
-                cur.execute("""
-                    SELECT nivel FROM estadisticas_usuario WHERE user_id = %s;
-                """, (user_id,))
-                nivel_anterior = cur.fetchone()
-                nivel_anterior = nivel_anterior[0] if nivel_anterior else 1
-                
-                # Actualizar puntos en estadisticas_usuario
-                cur.execute("""
-                    UPDATE estadisticas_usuario 
-                    SET puntos_totales = GREATEST(0, puntos_totales + %s)
-                    WHERE user_id = %s
-                    RETURNING puntos_totales;
-                """, (puntos_cambio, user_id))
-                
-                resultado_puntos = cur.fetchone()
-                if resultado_puntos:
-                    puntos_totales_nuevos = resultado_puntos[0]
-                    puntos_info = {
-                        "puntos_cambio": puntos_cambio,
-                        "puntos_totales": puntos_totales_nuevos
-                    }
-                    
-                    # ========================================
-                    # LÓGICA DE NIVEL - Calcular y actualizar
-                    # ========================================
-                    nivel_calculado = calcular_nivel(puntos_totales_nuevos)
-                    nuevo_nivel = nivel_calculado["nivel"]
-                    
-                    # Actualizar nivel en BD si cambió
-                    if nuevo_nivel != nivel_anterior:
-                        cur.execute("""
-                            UPDATE estadisticas_usuario 
-                            SET nivel = %s
-                            WHERE user_id = %s;
-                        """, (nuevo_nivel, user_id))
-                    
-                    nivel_info = {
-                        "nivel": nuevo_nivel,
-                        "puntos_en_nivel": nivel_calculado["puntos_en_nivel"],
-                        "puntos_para_siguiente": nivel_calculado["puntos_para_siguiente"],
-                        "progreso_porcentaje": nivel_calculado["progreso_porcentaje"],
-                        "subio_nivel": nuevo_nivel > nivel_anterior,
-                        "bajo_nivel": nuevo_nivel < nivel_anterior
-                    }
-                
-                db_conn.commit()
+        try:
+            pool = get_async_pool()
+            async with pool.connection() as db_conn:
+                # Una sentencia en autocommit ya es atómica: sin BEGIN/COMMIT aparte
+                await db_conn.set_autocommit(True)
+                try:
+                    cur = await db_conn.execute(
+                        "SELECT * FROM toggle_habito_serializado(%s, %s);",
+                        (user_id, habito_usuario_id)
+                    )
+                    toggle = await cur.fetchone()
+                finally:
+                    await db_conn.set_autocommit(False)
+            
+            if not toggle:
+                raise HTTPException(status_code=404, detail="Hábito no encontrado para este usuario")
+        except Exception:
+            # Sin cambios aplicados: el reintento con la misma key debe ejecutarse
+            if reservada:
+                await asyncio.to_thread(
+                    redis_client.release_idempotency_key, "toggle", user_id, idempotency_key
+                )
+            raise
+        
+        (new_status, puntos_habito, nombre_habito,
+         racha_actual, racha_maxima, racha_incrementada,
+         puntos_cambio, puntos_totales_nuevos, nivel_anterior, nuevo_nivel) = toggle
+        
+        # Racha del usuario: solo cambia al completar
+        racha_info = None
+        if racha_actual is not None:
+            racha_info = {
+                "racha_actual": racha_actual,
+                "racha_maxima": racha_maxima,
+                "racha_incrementada": racha_incrementada
+            }
+        
+        # Puntos y nivel (None si el usuario no tiene estadísticas)
+        puntos_info = None
+        nivel_info = None
+        if puntos_totales_nuevos is not None:
+            puntos_info = {
+                "puntos_cambio": puntos_cambio,
+                "puntos_totales": puntos_totales_nuevos
+            }
+            
+            nivel_calculado = calcular_nivel(puntos_totales_nuevos)
+            nivel_info = {
+                "nivel": nuevo_nivel,
+                "puntos_en_nivel": nivel_calculado["puntos_en_nivel"],
+                "puntos_para_siguiente": nivel_calculado["puntos_para_siguiente"],
+                "progreso_porcentaje": nivel_calculado["progreso_porcentaje"],
+                "subio_nivel": nuevo_nivel > nivel_anterior,
+                "bajo_nivel": nuevo_nivel < nivel_anterior
+            }
         
         # Construir respuesta
         response_data = {
@@ -898,12 +921,27 @@ async def toggle_habit_completion(
         if nivel_info:
             response_data["nivel"] = nivel_info
         
+        resultado = {
+            "success": True,
+            "message": "Hábito actualizado correctamente",
+            "data": response_data
+        }
+        
+        # Guardar la respuesta para los reintentos con la misma key (si
+        # falla, store_idempotent_response reintenta y lo deja en el log)
+        if reservada:
+            await asyncio.to_thread(
+                redis_client.store_idempotent_response,
+                "toggle", user_id, idempotency_key, huella, resultado
+            )
+        
         # ========================================
         # SISTEMA DISTRIBUIDO: Cache + WebSocket
         # ========================================
         
-        # Invalidar cache de predicciones (porque el estado cambió)
-        redis_client.invalidate_user_cache(user_id)
+        # Refrescar solo la predicción de este hábito (las recomendaciones
+        # no dependen del completado, su cache se conserva)
+        await asyncio.to_thread(refrescar_predicciones_habito, user_id, habito_usuario_id)
         
         # Enviar evento WebSocket si hay conexiones activas
         if ws_manager.is_user_connected(user_id):
@@ -928,44 +966,149 @@ async def toggle_habit_completion(
             except Exception as ws_error:
                 print(f"[WS] Error sending event: {ws_error}")
         
-        return {
+        return resultado
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al actualizar hábito: {str(e)}")
+
+@app.post("/api/usuario/{user_id}/habitos/completados/lote", status_code=HTTP_200_OK)
+async def apply_habit_completion_batch(
+    user_id: int,
+    lote: HabitoCompletadoLoteSchema,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: TokenData = Depends(verify_token)
+):
+    """
+    Aplicar varios completados de una vez (PROTEGIDO)
+    
+    Pensado para la cola offline del cliente: cada operación fija el
+    estado (completado o no) de un hábito en una fecha, hoy o pasada.
+    Todo el lote va en una transacción con un upsert por conjunto; racha,
+    puntos y nivel se calculan una sola vez y se envía un solo evento
+    WebSocket. Las operaciones sobre hábitos ajenos o inactivos se
+    devuelven en "rechazadas" sin frenar el resto.
+    
+    Acepta Idempotency-Key igual que el toggle.
+    """
+    try:
+        # Verificar acceso
+        verify_user_access(user_id, current_user)
+        
+        operaciones = [op.dict() for op in lote.operaciones]
+        huella = hashlib.sha256(
+            json.dumps(operaciones, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        reservada, guardada = await reservar_idempotency_key(
+            "toggle-lote", user_id, idempotency_key, huella, response
+        )
+        if guardada is not None:
+            return guardada
+        
+        try:
+            resultado_lote = await async_habit_conn.apply_completion_batch(user_id, operaciones)
+        except Exception:
+            if reservada:
+                await asyncio.to_thread(
+                    redis_client.release_idempotency_key, "toggle-lote", user_id, idempotency_key
+                )
+            raise
+        
+        cambios = resultado_lote["cambios"]
+        stats = resultado_lote["estadisticas"]
+        
+        response_data = {
+            "procesadas": len(operaciones),
+            "cambios": [{
+                "habito_usuario_id": c["habito_usuario_id"],
+                "fecha": c["fecha"].isoformat(),
+                "completado": c["completado"]
+            } for c in cambios],
+            "rechazadas": [{
+                "habito_usuario_id": r["habito_usuario_id"],
+                "fecha": r["fecha"].isoformat()
+            } for r in resultado_lote["rechazadas"]]
+        }
+        
+        if stats:
+            # Racha del usuario: solo cambia si el lote completó algo
+            if stats["completo_algo"]:
+                response_data["racha"] = {
+                    "racha_actual": stats["racha_actual"],
+                    "racha_maxima": stats["racha_maxima"],
+                    "racha_incrementada": stats["racha_incrementada"]
+                }
+            
+            response_data["puntos"] = {
+                "puntos_cambio": stats["puntos_cambio"],
+                "puntos_totales": stats["puntos_totales"]
+            }
+            
+            nivel_calculado = calcular_nivel(stats["puntos_totales"])
+            response_data["nivel"] = {
+                "nivel": stats["nivel"],
+                "puntos_en_nivel": nivel_calculado["puntos_en_nivel"],
+                "puntos_para_siguiente": nivel_calculado["puntos_para_siguiente"],
+                "progreso_porcentaje": nivel_calculado["progreso_porcentaje"],
+                "subio_nivel": stats["nivel"] > stats["nivel_anterior"],
+                "bajo_nivel": stats["nivel"] < stats["nivel_anterior"]
+            }
+        
+        resultado = {
             "success": True,
-            "message": "Hábito actualizado correctamente",
+            "message": f"{len(cambios)} hábito(s) actualizado(s)",
             "data": response_data
         }
+        
+        # Guardar la respuesta para los reintentos con la misma key (si
+        # falla, store_idempotent_response reintenta y lo deja en el log)
+        if reservada:
+            await asyncio.to_thread(
+                redis_client.store_idempotent_response,
+                "toggle-lote", user_id, idempotency_key, huella, resultado
+            )
+        
+        if cambios:
+            # Predicciones: todos los hábitos del lote en la misma ventana
+            # de refresco, con un solo viaje a Redis
+            await asyncio.to_thread(
+                refrescar_predicciones_habitos,
+                user_id, sorted({c["habito_usuario_id"] for c in cambios})
+            )
             
+            # Un solo evento WebSocket para todo el lote
+            if ws_manager.is_user_connected(user_id):
+                try:
+                    event = event_habits_batch_updated(
+                        completados=[c for c in response_data["cambios"] if c["completado"]],
+                        desmarcados=[c for c in response_data["cambios"] if not c["completado"]],
+                        puntos_cambio=stats["puntos_cambio"] if stats else 0,
+                        racha_actual=stats["racha_actual"] if stats else 0
+                    )
+                    await ws_manager.send_to_user(user_id, event)
+                    print(f"[WS] Event sent to user {user_id}: {event[:50]}...")
+                except Exception as ws_error:
+                    print(f"[WS] Error sending event: {ws_error}")
+        
+        return resultado
+    
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error al actualizar hábito: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error al aplicar lote de hábitos: {str(e)}")
 
 @app.get("/api/usuario/{user_id}/estadisticas-habitos", status_code=HTTP_200_OK)
-def get_user_habits_stats(user_id: int):
+async def get_user_habits_stats(user_id: int):
     """Obtener estadísticas de hábitos del usuario"""
     try:
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        from .database import get_pool
-        pool = get_pool()
-        with pool.connection() as db_conn:
-            with db_conn.cursor() as cur:
-                # Estadísticas de hoy
-                cur.execute("""
-                    SELECT 
-                        COUNT(*) as total_habitos,
-                        COUNT(CASE WHEN sh.completado = true THEN 1 END) as completados_hoy,
-                        COUNT(CASE WHEN sh.completado = false OR sh.completado IS NULL THEN 1 END) as pendientes_hoy
-                    FROM habitos_usuario hu
-                    LEFT JOIN seguimiento_habitos sh ON (
-                        sh.habito_usuario_id = hu.habito_usuario_id 
-                        AND sh.fecha = CURRENT_DATE
-                    )
-                    WHERE hu.user_id = %s AND hu.activo = true;
-                """, (user_id,))
-                
-                stats_today = cur.fetchone()
+        # Estadísticas de hoy
+        stats_today = await async_habit_conn.get_user_habits_stats_today(user_id)
         
         return {
             "success": True,
@@ -983,18 +1126,20 @@ def get_user_habits_stats(user_id: int):
         raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
 
 @app.delete("/api/usuario/{user_id}/habito/{habito_id}", status_code=HTTP_200_OK)
-def remove_habito_from_user(user_id: int, habito_id: int):
+async def remove_habito_from_user(user_id: int, habito_id: int):
     """Remover un hábito del usuario"""
     try:
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        success = habit_conn.remove_habito_from_user(user_id, habito_id)
+        success = await async_habit_conn.remove_habito_from_user(user_id, habito_id)
         if not success:
             raise HTTPException(status_code=404, detail="Hábito no encontrado para este usuario")
         
+        await asyncio.to_thread(publicar_delta_habito, user_id, habito_id, False)
+        
         return {"success": True, "message": "Hábito removido correctamente"}
     except HTTPException:
         raise
@@ -1002,7 +1147,7 @@ def remove_habito_from_user(user_id: int, habito_id: int):
         raise HTTPException(status_code=500, detail=f"Error al remover hábito: {str(e)}")
 
 @app.put("/api/usuario/{user_id}/habito/{habito_usuario_id}/frecuencia", status_code=HTTP_200_OK)
-def update_habito_frecuencia(
+async def update_habito_frecuencia(
     user_id: int, 
     habito_usuario_id: int, 
     data: HabitoFrecuenciaUpdateSchema,
@@ -1014,11 +1159,11 @@ def update_habito_frecuencia(
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        result = habit_conn.update_habito_frecuencia(habito_usuario_id, data.frecuencia_personal)
+        result = await async_habit_conn.update_habito_frecuencia(habito_usuario_id, data.frecuencia_personal)
         if not result:
             raise HTTPException(status_code=404, detail="Hábito no encontrado o inactivo")
         
@@ -1036,7 +1181,7 @@ def update_habito_frecuencia(
         raise HTTPException(status_code=500, detail=f"Error al actualizar frecuencia: {str(e)}")
 
 @app.get("/api/usuario/{user_id}/habito/{habito_usuario_id}/detalle", status_code=HTTP_200_OK)
-def get_habito_usuario_detalle(
+async def get_habito_usuario_detalle(
     user_id: int, 
     habito_usuario_id: int,
     current_user: TokenData = Depends(verify_token)
@@ -1047,11 +1192,11 @@ def get_habito_usuario_detalle(
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        detalle = habit_conn.get_habito_usuario_detalle(habito_usuario_id, user_id)
+        detalle = await async_habit_conn.get_habito_usuario_detalle(habito_usuario_id, user_id)
         if not detalle:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
         
@@ -1067,7 +1212,7 @@ def get_habito_usuario_detalle(
 
 
 @app.post("/api/usuario/{user_id}/habitos/custom", status_code=HTTP_201_CREATED)
-def create_habito_personalizado(
+async def create_habito_personalizado(
     user_id: int,
     data: HabitoPersonalizadoCreateSchema,
     current_user: TokenData = Depends(verify_token)
@@ -1078,17 +1223,19 @@ def create_habito_personalizado(
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        result = habit_conn.create_habito_personalizado(
+        result = await async_habit_conn.create_habito_personalizado(
             user_id=user_id,
             nombre=data.nombre,
             descripcion=data.descripcion,
             frecuencia_personal=data.frecuencia_personal
         )
         
+        await asyncio.to_thread(publicar_delta_habito, user_id, result['habito_id'], True)
+        
         return {
             "success": True,
             "message": "Hábito personalizado creado exitosamente",
@@ -1101,7 +1248,7 @@ def create_habito_personalizado(
 
 
 @app.put("/api/usuario/{user_id}/habitos/custom/{habito_id}", status_code=HTTP_200_OK)
-def update_habito_personalizado(
+async def update_habito_personalizado(
     user_id: int,
     habito_id: int,
     data: HabitoPersonalizadoUpdateSchema,
@@ -1113,11 +1260,11 @@ def update_habito_personalizado(
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        result = habit_conn.update_habito_personalizado(
+        result = await async_habit_conn.update_habito_personalizado(
             user_id=user_id,
             habito_id=habito_id,
             nombre=data.nombre,
@@ -1142,7 +1289,7 @@ def update_habito_personalizado(
 
 
 @app.delete("/api/usuario/{user_id}/habitos/custom/{habito_id}", status_code=HTTP_200_OK)
-def delete_habito_personalizado(
+async def delete_habito_personalizado(
     user_id: int,
     habito_id: int,
     current_user: TokenData = Depends(verify_token)
@@ -1152,7 +1299,7 @@ def delete_habito_personalizado(
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        success = habit_conn.delete_habito_personalizado(user_id, habito_id)
+        success = await async_habit_conn.delete_habito_personalizado(user_id, habito_id)
         
         if not success:
             raise HTTPException(
@@ -1160,6 +1307,8 @@ def delete_habito_personalizado(
                 detail="Hábito no encontrado o no tienes permiso para eliminarlo"
             )
         
+        await asyncio.to_thread(publicar_delta_habito, user_id, habito_id, False)
+        
         return {
             "success": True,
             "message": "Hábito eliminado exitosamente"
@@ -1171,7 +1320,7 @@ def delete_habito_personalizado(
 
 
 @app.get("/api/usuario/{user_id}/habitos/custom", status_code=HTTP_200_OK)
-def get_user_custom_habitos(
+async def get_user_custom_habitos(
     user_id: int,
     current_user: TokenData = Depends(verify_token)
 ):
@@ -1180,7 +1329,7 @@ def get_user_custom_habitos(
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        habitos = habit_conn.get_user_custom_habitos(user_id)
+        habitos = await async_habit_conn.get_user_custom_habitos(user_id)
         
         # Convertir fechas a string para JSON
         for habito in habitos:
@@ -1198,7 +1347,7 @@ def get_user_custom_habitos(
 
 
 @app.get("/api/usuario/{user_id}/habito/{habito_usuario_id}/historial", status_code=HTTP_200_OK)
-def get_habito_historial(
+async def get_habito_historial(
     user_id: int,
     habito_usuario_id: int,
     dias: int = 30,
@@ -1212,7 +1361,7 @@ def get_habito_historial(
         # Limitar días entre 1 y 90
         dias = max(1, min(dias, 90))
         
-        historial = habit_conn.get_habito_historial(habito_usuario_id, user_id, dias)
+        historial = await async_habit_conn.get_habito_historial(habito_usuario_id, user_id, dias)
         
         if not historial:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
@@ -1225,7 +1374,7 @@ def get_habito_historial(
 
 
 @app.get("/api/usuario/{user_id}/habito/{habito_usuario_id}/rachas", status_code=HTTP_200_OK)
-def get_habito_rachas(
+async def get_habito_rachas(
     user_id: int,
     habito_usuario_id: int,
     current_user: TokenData = Depends(verify_token)
@@ -1235,7 +1384,7 @@ def get_habito_rachas(
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        rachas = habit_conn.get_habito_rachas(habito_usuario_id, user_id)
+        rachas = await async_habit_conn.get_habito_rachas(habito_usuario_id, user_id)
         
         if not rachas:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
@@ -1285,7 +1434,7 @@ def calcular_progreso_nivel(puntos_totales: int, nivel_actual: int) -> int:
 
 
 @app.get("/api/usuario/{user_id}/estadisticas", status_code=HTTP_200_OK)
-def get_estadisticas_usuario(user_id: int):
+async def get_estadisticas_usuario(user_id: int):
     """
     Obtener estadísticas de gamificación del usuario.
     
@@ -1294,12 +1443,12 @@ def get_estadisticas_usuario(user_id: int):
     """
     try:
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
         # Obtener estadísticas
-        data = stats_conn.get_estadisticas_usuario(user_id)
+        data = await async_stats_conn.get_estadisticas_usuario(user_id)
         
         if not data:
             raise HTTPException(status_code=404, detail="Estadísticas no encontradas para este usuario")
@@ -1336,21 +1485,19 @@ def get_estadisticas_usuario(user_id: int):
 # ENDPOINTS DE REFLEXIONES DIARIAS
 # ============================================
 
-reflexiones_conn = ReflexionesConnection()
-
 @app.post("/api/usuario/{user_id}/reflexion", response_model=CrearReflexionResponseSchema)
-def crear_reflexion(user_id: int, data: CrearReflexionSchema, current_user: TokenData = Depends(verify_token)):
+async def crear_reflexion(user_id: int, data: CrearReflexionSchema, current_user: TokenData = Depends(verify_token)):
     """POST /api/usuario/{user_id}/reflexion - Crear o actualizar reflexión del día (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
         # Verificar que el usuario existe
-        existing_user = conn.read_one(user_id)
+        existing_user = await async_conn.read_one(user_id)
         if not existing_user:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
-        resultado = reflexiones_conn.crear_o_actualizar_reflexion(
+        resultado = await async_reflexiones_conn.crear_o_actualizar_reflexion(
             user_id=user_id,
             estado_animo=data.estado_animo,
             que_salio_bien=data.que_salio_bien,
@@ -1373,13 +1520,13 @@ def crear_reflexion(user_id: int, data: CrearReflexionSchema, current_user: Toke
         raise HTTPException(status_code=500, detail=f'Error al crear reflexión: {str(e)}')
 
 @app.get("/api/usuario/{user_id}/reflexion/hoy", response_model=ReflexionHoyResponseSchema)
-def get_reflexion_hoy(user_id: int, current_user: TokenData = Depends(verify_token)):
+async def get_reflexion_hoy(user_id: int, current_user: TokenData = Depends(verify_token)):
     """GET /api/usuario/{user_id}/reflexion/hoy - Obtener reflexión del día (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        resultado = reflexiones_conn.get_reflexion_hoy(user_id)
+        resultado = await async_reflexiones_conn.get_reflexion_hoy(user_id)
         
         return ReflexionHoyResponseSchema(**resultado)
         
@@ -1389,13 +1536,13 @@ def get_reflexion_hoy(user_id: int, current_user: TokenData = Depends(verify_tok
         raise HTTPException(status_code=500, detail=f'Error al obtener reflexión: {str(e)}')
 
 @app.get("/api/usuario/{user_id}/reflexiones", response_model=HistorialReflexionesResponseSchema)
-def get_historial_reflexiones(user_id: int, limite: int = 30, current_user: TokenData = Depends(verify_token)):
+async def get_historial_reflexiones(user_id: int, limite: int = 30, current_user: TokenData = Depends(verify_token)):
     """GET /api/usuario/{user_id}/reflexiones - Obtener historial de reflexiones (PROTEGIDO)"""
     try:
         # Verificar acceso
         verify_user_access(user_id, current_user)
         
-        resultado = reflexiones_conn.get_historial_reflexiones(user_id, limite)
+        resultado = await async_reflexiones_conn.get_historial_reflexiones(user_id, limite)
         
         return HistorialReflexionesResponseSchema(**resultado)
         
@@ -1934,7 +2081,6 @@ def get_habitos_del_plan(plan_usuario_id: int, fecha: Optional[str] = None, curr
 # ENDPOINTS DE INTELIGENCIA ARTIFICIAL
 # ========================================
 
-from .ai import HabitRecommender, HabitPredictor
 from .schema.aiSchema import (
     RecomendacionesResponseSchema,
     RecomendacionHabitoSchema,
@@ -1947,9 +2093,40 @@ from .schema.aiSchema import (
     EntrenarModeloResponseSchema
 )
 
-# Inicializar componentes de IA
-recommender = HabitRecommender()
-predictor = HabitPredictor()
+# Componentes de IA: se crean en el primer uso (numpy/scipy/modelo no se
+# cargan en workers que nunca atienden rutas de IA)
+_recommender = None
+_predictor = None
+_ai_lock = threading.Lock()
+
+
+def get_recommender():
+    """Recomendador del proceso (se crea en la primera llamada)."""
+    global _recommender
+    if _recommender is None:
+        with _ai_lock:
+            if _recommender is None:
+                from .ai.recommender import HabitRecommender
+                _recommender = HabitRecommender(
+                    search_mode=RECOMMENDER_SEARCH_MODE,
+                    lsh_bands=RECOMMENDER_LSH_BANDS,
+                    lsh_rows=RECOMMENDER_LSH_ROWS
+                )
+    return _recommender
+
+
+def get_predictor():
+    """Predictor del proceso (se crea y carga el modelo en la primera llamada)."""
+    global _predictor
+    if _predictor is None:
+        with _ai_lock:
+            if _predictor is None:
+                from .ai.predictor import HabitPredictor
+                predictor = HabitPredictor()
+                # Cambia al modelo recién publicado sin reiniciar el worker
+                predictor.start_model_watcher()
+                _predictor = predictor
+    return _predictor
 
 
 @app.get("/api/ai/usuario/{user_id}/recomendaciones", response_model=RecomendacionesResponseSchema)
@@ -1977,7 +2154,7 @@ def get_ai_recomendaciones(
         verify_user_access(user_id, current_user)
         
         # Obtener recomendaciones
-        recomendaciones = recommender.get_recommendations(user_id, limit=limit)
+        recomendaciones = get_recommender().get_recommendations(user_id, limit=limit)
         
         return RecomendacionesResponseSchema(
             success=True,
@@ -2015,7 +2192,7 @@ def get_usuarios_similares(
     try:
         verify_user_access(user_id, current_user)
         
-        similares = recommender.find_similar_users(user_id, top_n=limit)
+        similares = get_recommender().find_similar_users(user_id, top_n=limit)
         
         return UsuariosSimilaresResponseSchema(
             success=True,
@@ -2058,13 +2235,13 @@ def get_predicciones_hoy(
         verify_user_access(user_id, current_user)
         
         # Verificar que el modelo está entrenado
-        if not predictor.is_trained:
+        if not get_predictor().is_trained:
             raise HTTPException(
                 status_code=503, 
                 detail="Modelo de predicción no disponible. Ejecute /api/ai/entrenar primero."
             )
         
-        predicciones = predictor.predict_all_habits(user_id)
+        predicciones = get_predictor().predict_all_habits(user_id)
         
         return PrediccionesHoyResponseSchema(
             success=True,
@@ -2101,13 +2278,13 @@ def get_prediccion_habito(
     try:
         verify_user_access(user_id, current_user)
         
-        if not predictor.is_trained:
+        if not get_predictor().is_trained:
             raise HTTPException(
                 status_code=503,
                 detail="Modelo de predicción no disponible"
             )
         
-        pred = predictor.predict(user_id, habito_usuario_id)
+        pred = get_predictor().predict(user_id, habito_usuario_id)
         
         if not pred:
             raise HTTPException(status_code=404, detail="Hábito no encontrado")
@@ -2134,11 +2311,12 @@ def get_modelo_info():
     
     No requiere autenticación - info pública sobre el sistema.
     """
-    info = predictor.get_model_info()
+    info = get_predictor().get_model_info()
     return ModeloInfoSchema(
         is_trained=info['is_trained'],
         model_exists=info['model_exists'],
         training_accuracy=info['training_accuracy'],
+        model_version=info['model_version'],
         feature_names=info['feature_names']
     )
 
@@ -2154,7 +2332,7 @@ def entrenar_modelo_ia(current_user: TokenData = Depends(verify_token)):
     El modelo se entrena con todos los datos históricos disponibles.
     """
     try:
-        result = predictor.train(save=True)
+        result = get_predictor().train(save=True)
         
         if not result['success']:
             raise HTTPException(status_code=400, detail=result.get('error', 'Error de entrenamiento'))
@@ -2192,6 +2370,49 @@ def get_redis_status():
     }
 
 
+@app.get("/api/system/ready")
+async def get_system_ready():
+    """
+    Readiness del worker (para el balanceador / orquestador).
+    
+    Listo = la base de datos responde y, si se precarga, el modelo está
+    cargado. Redis es opcional (sin él se sirve sin cache), así que solo
+    se reporta. Responde 503 mientras no esté listo.
+    """
+    sync_ok, async_ok = await asyncio.gather(asyncio.to_thread(check_pool), check_async_pool())
+    checks = {
+        "postgresql": sync_ok and async_ok,
+        "redis": redis_client.is_connected,
+    }
+    if PRELOAD_AI_MODELS:
+        checks["model"] = _predictor is not None and _predictor.is_trained
+    
+    ready = checks["postgresql"] and checks.get("model", True)
+    return JSONResponse(
+        status_code=HTTP_200_OK if ready else 503,
+        content={"ready": ready, "checks": checks}
+    )
+
+
+@app.get("/api/system/db/pool")
+async def get_db_pool_status():
+    """
+    Estado de los pools de conexiones de este worker.
+    
+    Por pool: tamaño, conexiones libres, requests esperando, saturación,
+    los contadores de psycopg_pool (errores de conexión, timeouts,
+    conexiones perdidas) y el histograma de espera por una conexión
+    (checkout). Sirve para dimensionar DB_POOL_* contra max_connections
+    de Postgres: cada worker abre hasta max_connections_process.
+    
+    Es `async def` para responder aunque el threadpool esté saturado.
+    """
+    return {
+        "success": True,
+        "database": get_pool_stats()
+    }
+
+
 @app.get("/api/system/health")
 def get_system_health():
     """
@@ -2314,12 +2535,15 @@ def get_celery_status():
 
 
 @app.post("/api/ai/entrenar/async")
-def entrenar_modelo_async(current_user: TokenData = Depends(verify_token)):
+def entrenar_modelo_async(force_retrain: bool = True, current_user: TokenData = Depends(verify_token)):
     """
     Entrenar modelo de forma asíncrona usando Celery.
     
     Retorna inmediatamente con un task_id que puede usarse
     para consultar el progreso.
+    
+    Con force_retrain=false solo entrena con los datos nuevos desde el
+    último entrenamiento (incremental).
     """
     if not CELERY_AVAILABLE:
         raise HTTPException(
@@ -2329,7 +2553,7 @@ def entrenar_modelo_async(current_user: TokenData = Depends(verify_token)):
     
     try:
         # Lanzar tarea en background
-        task = train_model_task.delay()
+        task = train_model_task.delay(force_retrain=force_retrain)
         
         return {
             "success": True,
@@ -0,0 +1,597 @@
+import psycopg  # Importa el módulo psycopg para manejar excepciones
+from ..database import get_async_pool  # Pool asíncrono de la API
+from .habitFeaturesConnection import AsyncHabitFeaturesConnection
+from .habitConnection import armar_historial, armar_rachas
+from datetime import date, timedelta
+
+class AsyncHabitConnection():
+    """
+    Versión asíncrona de habitConnection para endpoints `async def`.
+    Usa el pool asíncrono compartido; mismas consultas y resultados.
+    """
+
+    def __init__(self):
+        # Usamos el pool asíncrono, no creamos conexión aquí
+        self.features = AsyncHabitFeaturesConnection()
+
+    async def _fetchall(self, query, params=None):
+        """Ejecuta una consulta de solo lectura y devuelve todas las filas"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def _fetchone(self, query, params=None):
+        """Ejecuta una consulta de solo lectura y devuelve una fila"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone()
+
+    async def get_categorias_habitos(self):
+        """Obtiene todas las categorías de hábitos"""
+        return await self._fetchall("""
+            SELECT categoria_id, nombre, descripcion, icono, orden
+            FROM categorias_habitos
+            ORDER BY orden;
+        """)
+
+    async def get_habitos_by_categoria(self, categoria_id):
+        """Obtiene todos los hábitos predeterminados de una categoría específica"""
+        return await self._fetchall("""
+            SELECT h.habito_id, h.categoria_id, h.nombre, h.descripcion,
+                   h.frecuencia_recomendada, h.puntos_base, c.nombre as categoria_nombre
+            FROM habitos_predeterminados h
+            INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+            WHERE h.categoria_id = %s
+            ORDER BY h.habito_id;
+        """, (categoria_id,))
+
+    async def get_all_habitos_predeterminados(self):
+        """Obtiene todos los hábitos predeterminados con su categoría"""
+        return await self._fetchall("""
+            SELECT h.habito_id, h.categoria_id, h.nombre, h.descripcion,
+                   h.frecuencia_recomendada, h.puntos_base, c.nombre as categoria_nombre
+            FROM habitos_predeterminados h
+            INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+            ORDER BY c.orden, h.habito_id;
+        """)
+
+    async def get_habito_by_id(self, habito_id):
+        """Obtiene un hábito específico por su ID"""
+        return await self._fetchone("""
+            SELECT h.habito_id, h.categoria_id, h.nombre, h.descripcion,
+                   h.frecuencia_recomendada, h.puntos_base, c.nombre as categoria_nombre
+            FROM habitos_predeterminados h
+            INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+            WHERE h.habito_id = %s;
+        """, (habito_id,))
+
+    async def add_habito_to_user(self, user_id, habito_id, frecuencia_personal='diario'):
+        """Agrega un hábito predeterminado al perfil del usuario"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute("""
+                        INSERT INTO habitos_usuario (user_id, habito_id, frecuencia_personal, activo)
+                        VALUES (%s, %s, %s, %s)
+                        RETURNING habito_usuario_id;
+                    """, (user_id, habito_id, frecuencia_personal, True))
+
+                    habito_usuario_id = (await cur.fetchone())[0]
+                    await conn.commit()
+                    return habito_usuario_id
+
+                except psycopg.IntegrityError:
+                    # El hábito ya está agregado para este usuario
+                    await conn.rollback()
+                    return None
+
+    async def get_user_habitos(self, user_id):
+        """Obtiene todos los hábitos activos de un usuario"""
+        return await self._fetchall("""
+            SELECT hu.habito_usuario_id, hu.user_id, hu.habito_id, hu.fecha_agregado,
+                   hu.activo, hu.frecuencia_personal,
+                   h.nombre, h.descripcion, h.puntos_base, c.nombre as categoria_nombre
+            FROM habitos_usuario hu
+            INNER JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
+            INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+            WHERE hu.user_id = %s AND hu.activo = true
+            ORDER BY hu.fecha_agregado DESC;
+        """, (user_id,))
+
+    async def get_user_habito_ids(self, user_id):
+        """Obtiene solo los IDs de hábitos predeterminados que el usuario ya tiene (para filtrado)"""
+        rows = await self._fetchall("""
+            SELECT habito_id
+            FROM habitos_usuario
+            WHERE user_id = %s AND activo = true;
+        """, (user_id,))
+        return [row[0] for row in rows]
+
+    async def get_user_habits_today(self, user_id):
+        """Hábitos activos del usuario con su seguimiento de hoy"""
+        return await self._fetchall("""
+            SELECT
+                hu.habito_usuario_id,
+                hu.user_id,
+                hu.habito_id,
+                h.nombre,
+                h.descripcion,
+                h.puntos_base,
+                c.nombre as categoria_nombre,
+                hu.frecuencia_personal,
+                hu.fecha_agregado,
+                COALESCE(sh.completado, false) as completado_hoy,
+                sh.hora_completado,
+                sh.notas
+            FROM habitos_usuario hu
+            INNER JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
+            INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+            LEFT JOIN seguimiento_habitos sh ON (
+                sh.habito_usuario_id = hu.habito_usuario_id
+                AND sh.fecha = CURRENT_DATE
+            )
+            WHERE hu.user_id = %s AND hu.activo = true
+            ORDER BY h.categoria_id, h.nombre;
+        """, (user_id,))
+
+    async def get_user_habits_stats_today(self, user_id):
+        """(total, completados, pendientes) de hoy para los hábitos activos"""
+        return await self._fetchone("""
+            SELECT
+                COUNT(*) as total_habitos,
+                COUNT(CASE WHEN sh.completado = true THEN 1 END) as completados_hoy,
+                COUNT(CASE WHEN sh.completado = false OR sh.completado IS NULL THEN 1 END) as pendientes_hoy
+            FROM habitos_usuario hu
+            LEFT JOIN seguimiento_habitos sh ON (
+                sh.habito_usuario_id = hu.habito_usuario_id
+                AND sh.fecha = CURRENT_DATE
+            )
+            WHERE hu.user_id = %s AND hu.activo = true;
+        """, (user_id,))
+
+    async def remove_habito_from_user(self, user_id, habito_id):
+        """Desactiva un hábito del usuario (soft delete)"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE habitos_usuario
+                    SET activo = false
+                    WHERE user_id = %s AND habito_id = %s;
+                """, (user_id, habito_id))
+                await conn.commit()
+                return cur.rowcount > 0
+
+    async def update_habito_frecuencia(self, habito_usuario_id, frecuencia_personal):
+        """Actualiza la frecuencia personal de un hábito del usuario"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE habitos_usuario
+                    SET frecuencia_personal = %s
+                    WHERE habito_usuario_id = %s AND activo = true
+                    RETURNING habito_usuario_id, frecuencia_personal;
+                """, (frecuencia_personal, habito_usuario_id))
+                result = await cur.fetchone()
+                await conn.commit()
+                return result
+
+    async def get_habito_usuario_detalle(self, habito_usuario_id, user_id):
+        """Obtiene el detalle completo de un hábito del usuario incluyendo estadísticas"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Info básica del hábito
+                await cur.execute("""
+                    SELECT
+                        hu.habito_usuario_id,
+                        hu.user_id,
+                        hu.habito_id,
+                        hu.fecha_agregado,
+                        hu.activo,
+                        hu.frecuencia_personal,
+                        h.nombre,
+                        h.descripcion,
+                        h.puntos_base,
+                        h.frecuencia_recomendada,
+                        c.nombre as categoria_nombre,
+                        c.icono as categoria_icono,
+                        c.categoria_id
+                    FROM habitos_usuario hu
+                    INNER JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
+                    INNER JOIN categorias_habitos c ON h.categoria_id = c.categoria_id
+                    WHERE hu.habito_usuario_id = %s
+                      AND hu.user_id = %s
+                      AND hu.activo = true;
+                """, (habito_usuario_id, user_id))
+                habito_info = await cur.fetchone()
+
+                if not habito_info:
+                    return None
+
+                # Estadísticas precalculadas (habito_features)
+                features = await self.features.get_state(cur, habito_usuario_id)
+
+                return {
+                    'habito_usuario_id': habito_info[0],
+                    'user_id': habito_info[1],
+                    'habito_id': habito_info[2],
+                    'fecha_agregado': habito_info[3],
+                    'activo': habito_info[4],
+                    'frecuencia_personal': habito_info[5],
+                    'nombre': habito_info[6],
+                    'descripcion': habito_info[7],
+                    'puntos_base': habito_info[8],
+                    'frecuencia_recomendada': habito_info[9],
+                    'categoria_nombre': habito_info[10],
+                    'categoria_icono': habito_info[11],
+                    'categoria_id': habito_info[12],
+                    'estadisticas': {
+                        'dias_completados': features['dias_completados'],
+                        'racha_actual': features['racha_actual'],
+                    }
+                }
+
+    async def create_habito_personalizado(self, user_id, nombre, descripcion=None, frecuencia_personal='diario'):
+        """Crea un hábito personalizado y lo agrega automáticamente al usuario"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    # 1. Crear el hábito en habitos_predeterminados
+                    await cur.execute("""
+                        INSERT INTO habitos_predeterminados
+                        (categoria_id, nombre, descripcion, frecuencia_recomendada,
+                         puntos_base, es_personalizado, creado_por_user_id)
+                        VALUES (6, %s, %s, 'diario', 10, true, %s)
+                        RETURNING habito_id;
+                    """, (nombre, descripcion, user_id))
+                    habito_id = (await cur.fetchone())[0]
+
+                    # 2. Agregarlo automáticamente al usuario
+                    await cur.execute("""
+                        INSERT INTO habitos_usuario (user_id, habito_id, frecuencia_personal, activo)
+                        VALUES (%s, %s, %s, true)
+                        RETURNING habito_usuario_id;
+                    """, (user_id, habito_id, frecuencia_personal))
+                    habito_usuario_id = (await cur.fetchone())[0]
+
+                    await conn.commit()
+                    return {
+                        'habito_id': habito_id,
+                        'habito_usuario_id': habito_usuario_id,
+                        'nombre': nombre,
+                        'descripcion': descripcion,
+                        'puntos_base': 10,
+                        'frecuencia_personal': frecuencia_personal,
+                        'categoria_nombre': 'My Custom Habits'
+                    }
+                except Exception as e:
+                    await conn.rollback()
+                    raise e
+
+    async def update_habito_personalizado(self, user_id, habito_id, nombre=None, descripcion=None):
+        """Edita un hábito personalizado (solo si el usuario es el creador)"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Verificar que el hábito es personalizado Y del usuario
+                await cur.execute("""
+                    SELECT habito_id FROM habitos_predeterminados
+                    WHERE habito_id = %s
+                      AND es_personalizado = true
+                      AND creado_por_user_id = %s;
+                """, (habito_id, user_id))
+
+                if not await cur.fetchone():
+                    return None  # No existe o no es del usuario
+
+                # Construir UPDATE dinámico según los campos proporcionados
+                updates = []
+                values = []
+                if nombre is not None:
+                    updates.append("nombre = %s")
+                    values.append(nombre)
+                if descripcion is not None:
+                    updates.append("descripcion = %s")
+                    values.append(descripcion)
+
+                if not updates:
+                    # Si no hay nada que actualizar, devolver datos actuales
+                    await cur.execute("""
+                        SELECT habito_id, nombre, descripcion
+                        FROM habitos_predeterminados WHERE habito_id = %s;
+                    """, (habito_id,))
+                else:
+                    values.extend([habito_id, user_id])
+                    await cur.execute(f"""
+                        UPDATE habitos_predeterminados
+                        SET {', '.join(updates)}
+                        WHERE habito_id = %s AND creado_por_user_id = %s
+                        RETURNING habito_id, nombre, descripcion;
+                    """, values)
+
+                result = await cur.fetchone()
+                await conn.commit()
+                return {
+                    'habito_id': result[0],
+                    'nombre': result[1],
+                    'descripcion': result[2]
+                }
+
+    async def delete_habito_personalizado(self, user_id, habito_id):
+        """Elimina completamente un hábito personalizado (solo si el usuario es el creador)"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Verificar que el hábito es personalizado Y del usuario
+                await cur.execute("""
+                    SELECT habito_id FROM habitos_predeterminados
+                    WHERE habito_id = %s
+                      AND es_personalizado = true
+                      AND creado_por_user_id = %s;
+                """, (habito_id, user_id))
+
+                if not await cur.fetchone():
+                    return False  # No existe o no es del usuario
+
+                # Eliminar de habitos_usuario primero (por integridad referencial)
+                await cur.execute("""
+                    DELETE FROM habitos_usuario
+                    WHERE habito_id = %s;
+                """, (habito_id,))
+
+                # Eliminar de habitos_predeterminados
+                await cur.execute("""
+                    DELETE FROM habitos_predeterminados
+                    WHERE habito_id = %s AND creado_por_user_id = %s;
+                """, (habito_id, user_id))
+
+                await conn.commit()
+                return True
+
+    async def get_user_custom_habitos(self, user_id):
+        """Obtiene todos los hábitos personalizados creados por el usuario"""
+        results = await self._fetchall("""
+            SELECT
+                h.habito_id, h.nombre, h.descripcion, h.puntos_base,
+                hu.habito_usuario_id, hu.frecuencia_personal, hu.fecha_agregado
+            FROM habitos_predeterminados h
+            LEFT JOIN habitos_usuario hu ON h.habito_id = hu.habito_id
+                AND hu.user_id = %s AND hu.activo = true
+            WHERE h.es_personalizado = true
+              AND h.creado_por_user_id = %s
+            ORDER BY h.habito_id DESC;
+        """, (user_id, user_id))
+        return [{
+            'habito_id': row[0],
+            'nombre': row[1],
+            'descripcion': row[2],
+            'puntos_base': row[3],
+            'habito_usuario_id': row[4],
+            'frecuencia_personal': row[5],
+            'fecha_agregado': row[6],
+            'categoria_nombre': 'My Custom Habits'
+        } for row in results]
+
+    async def get_habito_historial(self, habito_usuario_id, user_id, dias=30):
+        """Obtiene el historial de completado de un hábito (últimos N días)"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Verificar que el hábito pertenece al usuario
+                await cur.execute("""
+                    SELECT hu.habito_usuario_id, h.nombre
+                    FROM habitos_usuario hu
+                    JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
+                    WHERE hu.habito_usuario_id = %s AND hu.user_id = %s AND hu.activo = true;
+                """, (habito_usuario_id, user_id))
+
+                habito_info = await cur.fetchone()
+                if not habito_info:
+                    return None
+
+                # Obtener registros de seguimiento existentes
+                await cur.execute("""
+                    SELECT fecha, completado, hora_completado
+                    FROM seguimiento_habitos
+                    WHERE habito_usuario_id = %s
+                      AND fecha >= %s
+                    ORDER BY fecha DESC;
+                """, (habito_usuario_id, date.today() - timedelta(days=dias)))
+
+                return armar_historial(habito_usuario_id, habito_info[1], dias, await cur.fetchall())
+
+    async def get_habito_rachas(self, habito_usuario_id, user_id):
+        """Obtiene estadísticas de rachas de un hábito"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                # Verificar que el hábito pertenece al usuario
+                await cur.execute("""
+                    SELECT hu.habito_usuario_id, h.nombre, hu.fecha_agregado
+                    FROM habitos_usuario hu
+                    JOIN habitos_predeterminados h ON hu.habito_id = h.habito_id
+                    WHERE hu.habito_usuario_id = %s AND hu.user_id = %s AND hu.activo = true;
+                """, (habito_usuario_id, user_id))
+
+                habito_info = await cur.fetchone()
+                if not habito_info:
+                    return None
+
+                # Obtener todas las fechas completadas ordenadas
+                await cur.execute("""
+                    SELECT fecha FROM seguimiento_habitos
+                    WHERE habito_usuario_id = %s AND completado = true
+                    ORDER BY fecha ASC;
+                """, (habito_usuario_id,))
+                fechas = [row[0] for row in await cur.fetchall()]
+
+                return armar_rachas(habito_usuario_id, habito_info[1], fechas)
+
+    async def apply_completion_batch(self, user_id, operaciones):
+        """
+        Aplica un lote de completados (habito_usuario_id, fecha, completado),
+        p. ej. la cola offline del cliente, en una sola transacción:
+        un upsert por conjunto (unnest) en seguimiento_habitos, un
+        recálculo de habito_features de los hábitos tocados y una sola
+        actualización de racha, puntos y nivel del usuario.
+
+        Toma el mismo advisory lock por usuario que toggle_habito_serializado()
+        (migración 012), así que no se mezcla con toggles concurrentes.
+
+        Args:
+            operaciones: Lista de dicts con habito_usuario_id, fecha y
+                completado. Si un (hábito, fecha) se repite, gana la última.
+
+        Returns:
+            dict con cambios (filas que cambiaron de estado), rechazadas
+            (hábitos que no son del usuario o no están activos) y
+            estadisticas (None si nada cambió o el usuario no tiene fila)
+        """
+        # Deduplicar: por (hábito, fecha) gana la última operación de la cola
+        ultimas = {}
+        for op in operaciones:
+            ultimas[(op['habito_usuario_id'], op['fecha'])] = op['completado']
+
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        "SELECT pg_advisory_xact_lock(hashtext('taskpin:escritura_usuario'), %s);",
+                        (user_id,)
+                    )
+
+                    # Solo se escriben las filas que cambian de estado; "antes"
+                    # es el estado previo (sin fila = no completado)
+                    await cur.execute("""
+                        WITH ops AS (
+                            SELECT o.habito_usuario_id, o.fecha, o.completado
+                            FROM unnest(%s::int[], %s::date[], %s::bool[])
+                                 AS o(habito_usuario_id, fecha, completado)
+                        ),
+                        validas AS (
+                            SELECT ops.habito_usuario_id, ops.fecha, ops.completado,
+                                   COALESCE(sh.completado, false) AS antes,
+                                   COALESCE(hp.puntos_base, 10) AS puntos_base,
+                                   COALESCE(hp.nombre, 'Hábito personalizado') AS nombre
+                            FROM ops
+                            JOIN habitos_usuario hu ON hu.habito_usuario_id = ops.habito_usuario_id
+                                 AND hu.user_id = %s AND hu.activo = true
+                            LEFT JOIN habitos_predeterminados hp ON hu.habito_id = hp.habito_id
+                            LEFT JOIN seguimiento_habitos sh ON sh.habito_usuario_id = ops.habito_usuario_id
+                                 AND sh.fecha = ops.fecha
+                        ),
+                        upsert AS (
+                            INSERT INTO seguimiento_habitos (habito_usuario_id, fecha, completado, hora_completado)
+                            SELECT habito_usuario_id, fecha, completado,
+                                   CASE WHEN completado THEN CURRENT_TIME END
+                            FROM validas
+                            WHERE completado <> antes
+                            ON CONFLICT (habito_usuario_id, fecha) DO UPDATE
+                            SET completado = EXCLUDED.completado,
+                                hora_completado = EXCLUDED.hora_completado
+                        )
+                        SELECT habito_usuario_id, fecha, completado, antes, puntos_base, nombre
+                        FROM validas;
+                    """, (
+                        [k[0] for k in ultimas], [k[1] for k in ultimas],
+                        list(ultimas.values()), user_id
+                    ))
+                    filas = await cur.fetchall()
+
+                    validas = {(f[0], f[1]) for f in filas}
+                    rechazadas = [
+                        {'habito_usuario_id': k[0], 'fecha': k[1]}
+                        for k in ultimas if k not in validas
+                    ]
+                    cambios = [{
+                        'habito_usuario_id': f[0],
+                        'fecha': f[1],
+                        'completado': f[2],
+                        'puntos_base': f[4],
+                        'nombre': f[5]
+                    } for f in filas if f[2] != f[3]]
+
+                    if cambios:
+                        await self.features.recompute(
+                            cur, sorted({c['habito_usuario_id'] for c in cambios})
+                        )
+
+                    estadisticas = None
+                    if cambios:
+                        estadisticas = await self._apply_batch_stats(cur, user_id, cambios)
+
+                    await conn.commit()
+                except Exception:
+                    await conn.rollback()
+                    raise
+
+        return {'cambios': cambios, 'rechazadas': rechazadas, 'estadisticas': estadisticas}
+
+    async def _apply_batch_stats(self, cur, user_id, cambios):
+        """
+        Racha, puntos y nivel del usuario para un lote, en un solo UPDATE.
+
+        Los días completados se aplican en orden con la regla del toggle
+        (mismo día: igual; día siguiente: +1; hueco: vuelve a 1). Un día
+        anterior a ultima_actividad no mueve la racha.
+        """
+        await cur.execute("""
+            SELECT racha_actual, racha_maxima, ultima_actividad, nivel
+            FROM estadisticas_usuario
+            WHERE user_id = %s
+            FOR UPDATE;
+        """, (user_id,))
+        row = await cur.fetchone()
+        if not row:
+            return None
+
+        racha_anterior, racha_maxima, ultima_actividad, nivel_anterior = row
+        racha = racha_anterior
+        completo_algo = False
+        for fecha in sorted({c['fecha'] for c in cambios if c['completado']}):
+            completo_algo = True
+            if ultima_actividad is None or fecha > ultima_actividad + timedelta(days=1):
+                racha = 1
+            elif fecha == ultima_actividad + timedelta(days=1):
+                racha += 1
+            else:
+                continue
+            ultima_actividad = fecha
+        racha_maxima = max(racha_maxima, racha)
+
+        puntos_cambio = sum(
+            c['puntos_base'] if c['completado'] else -c['puntos_base'] for c in cambios
+        )
+
+        # nivel_por_puntos(): misma escala que calcular_nivel (migración 011)
+        await cur.execute("""
+            UPDATE estadisticas_usuario
+            SET racha_actual = %s,
+                racha_maxima = %s,
+                ultima_actividad = %s,
+                puntos_totales = GREATEST(0, puntos_totales + %s),
+                nivel = nivel_por_puntos(GREATEST(0, puntos_totales + %s))
+            WHERE user_id = %s
+            RETURNING puntos_totales, nivel;
+        """, (racha, racha_maxima, ultima_actividad, puntos_cambio, puntos_cambio, user_id))
+        puntos_totales, nivel = await cur.fetchone()
+
+        return {
+            'racha_actual': racha,
+            'racha_maxima': racha_maxima,
+            'racha_incrementada': racha > racha_anterior,
+            'completo_algo': completo_algo,
+            'puntos_cambio': puntos_cambio,
+            'puntos_totales': puntos_totales,
+            'nivel_anterior': nivel_anterior or 1,
+            'nivel': nivel
+        }
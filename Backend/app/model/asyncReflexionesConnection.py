@@ -0,0 +1,207 @@
+"""
+Versión asíncrona (pool asíncrono) de ReflexionesConnection para los
+endpoints `async def`
+"""
+from ..database import get_async_pool
+from datetime import date
+
+
+RESUMEN_VACIO = {'great': 0, 'good': 0, 'neutral': 0, 'low': 0, 'bad': 0}
+
+
+def _reflexion_dict(row):
+    return {
+        'reflexion_id': row[0],
+        'fecha': row[1].isoformat(),
+        'estado_animo': row[2],
+        'que_salio_bien': row[3],
+        'que_mejorar': row[4],
+        'created_at': row[5].isoformat() if row[5] else None
+    }
+
+
+class AsyncReflexionesConnection:
+    """Clase para manejar operaciones de reflexiones diarias (async)"""
+
+    def __init__(self):
+        pass
+
+    async def crear_o_actualizar_reflexion(self, user_id: int, estado_animo: str,
+                                           que_salio_bien: str = None, que_mejorar: str = None):
+        """
+        Crear o actualizar la reflexión del día.
+        Si ya existe una reflexión para hoy, la actualiza.
+        """
+        pool = get_async_pool()
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    fecha_hoy = date.today()
+
+                    # Verificar si ya existe una reflexión para hoy
+                    await cur.execute("""
+                        SELECT reflexion_id FROM reflexiones_diarias
+                        WHERE user_id = %s AND fecha = %s
+                    """, (user_id, fecha_hoy))
+
+                    existente = await cur.fetchone()
+
+                    if existente:
+                        # Actualizar reflexión existente
+                        await cur.execute("""
+                            UPDATE reflexiones_diarias
+                            SET estado_animo = %s,
+                                que_salio_bien = %s,
+                                que_mejorar = %s,
+                                updated_at = NOW()
+                            WHERE reflexion_id = %s
+                            RETURNING reflexion_id
+                        """, (estado_animo, que_salio_bien, que_mejorar, existente[0]))
+
+                        await conn.commit()
+                        return {
+                            'success': True,
+                            'reflexion_id': existente[0],
+                            'es_nueva': False,
+                            'message': 'Reflexión actualizada'
+                        }
+
+                    # Crear nueva reflexión
+                    await cur.execute("""
+                        INSERT INTO reflexiones_diarias
+                        (user_id, fecha, estado_animo, que_salio_bien, que_mejorar)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING reflexion_id
+                    """, (user_id, fecha_hoy, estado_animo, que_salio_bien, que_mejorar))
+
+                    result = await cur.fetchone()
+                    await conn.commit()
+
+                    return {
+                        'success': True,
+                        'reflexion_id': result[0],
+                        'es_nueva': True,
+                        'message': 'Reflexión guardada'
+                    }
+
+        except Exception as e:
+            print(f"Error crear_o_actualizar_reflexion: {e}")
+            return {'success': False, 'message': f'Error: {str(e)}'}
+
+    async def get_reflexion_hoy(self, user_id: int):
+        """
+        Obtener la reflexión del día actual.
+        Retorna None si no hay reflexión para hoy.
+        """
+        pool = get_async_pool()
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
+                        SELECT reflexion_id, fecha, estado_animo,
+                               que_salio_bien, que_mejorar, created_at
+                        FROM reflexiones_diarias
+                        WHERE user_id = %s AND fecha = %s
+                    """, (user_id, date.today()))
+
+                    row = await cur.fetchone()
+
+                    if row:
+                        return {'tiene_reflexion': True, 'reflexion': _reflexion_dict(row)}
+                    return {'tiene_reflexion': False, 'reflexion': None}
+
+        except Exception as e:
+            print(f"Error get_reflexion_hoy: {e}")
+            return {'tiene_reflexion': False, 'reflexion': None}
+
+    async def get_historial_reflexiones(self, user_id: int, limite: int = 30):
+        """
+        Obtener historial de reflexiones del usuario.
+        Incluye resumen de estados de ánimo.
+        """
+        pool = get_async_pool()
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    # Obtener reflexiones ordenadas por fecha
+                    await cur.execute("""
+                        SELECT reflexion_id, fecha, estado_animo,
+                               que_salio_bien, que_mejorar, created_at
+                        FROM reflexiones_diarias
+                        WHERE user_id = %s
+                        ORDER BY fecha DESC
+                        LIMIT %s
+                    """, (user_id, limite))
+
+                    reflexiones = [_reflexion_dict(row) for row in await cur.fetchall()]
+
+                    # Resumen de estados de ánimo (el total es la suma)
+                    await cur.execute("""
+                        SELECT estado_animo, COUNT(*) as count
+                        FROM reflexiones_diarias
+                        WHERE user_id = %s
+                        GROUP BY estado_animo
+                    """, (user_id,))
+
+                    resumen = dict(RESUMEN_VACIO)
+                    total = 0
+                    for estado, count in await cur.fetchall():
+                        total += count
+                        if estado in resumen:
+                            resumen[estado] = count
+
+                    return {
+                        'success': True,
+                        'reflexiones': reflexiones,
+                        'total': total,
+                        'resumen': resumen
+                    }
+
+        except Exception as e:
+            print(f"Error get_historial_reflexiones: {e}")
+            return {
+                'success': False,
+                'reflexiones': [],
+                'total': 0,
+                'resumen': dict(RESUMEN_VACIO)
+            }
+
+    async def get_resumen_animo(self, user_id: int, dias: int = 30):
+        """
+        Obtener resumen de estados de ánimo de los últimos N días.
+        Útil para estadísticas y gráficos.
+        """
+        pool = get_async_pool()
+        try:
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("""
+                        SELECT estado_animo, COUNT(*) as count
+                        FROM reflexiones_diarias
+                        WHERE user_id = %s
+                          AND fecha >= CURRENT_DATE - INTERVAL '%s days'
+                        GROUP BY estado_animo
+                    """, (user_id, dias))
+
+                    resumen = dict(RESUMEN_VACIO)
+                    total = 0
+                    for estado, count in await cur.fetchall():
+                        if estado in resumen:
+                            resumen[estado] = count
+                            total += count
+
+                    return {
+                        'success': True,
+                        'resumen': resumen,
+                        'total_dias': total,
+                        'periodo_dias': dias
+                    }
+
+        except Exception as e:
+            print(f"Error get_resumen_animo: {e}")
+            return {
+                'success': False,
+                'resumen': dict(RESUMEN_VACIO),
+                'total_dias': 0,
+                'periodo_dias': dias
+            }
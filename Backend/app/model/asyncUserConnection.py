@@ -0,0 +1,183 @@
+import asyncio
+from ..database import get_async_pool  # Pool asíncrono de la API
+from .userConnection import pwd_context
+
+class AsyncUserConnection():
+    """
+    Versión asíncrona de userConnection para endpoints `async def`.
+    Usa el pool asíncrono compartido.
+
+    bcrypt tarda decenas de milisegundos por hash: se calcula en un hilo
+    (asyncio.to_thread) para no bloquear el event loop.
+    """
+
+    def __init__(self):
+        # Usamos el pool asíncrono, no creamos conexión aquí
+        pass
+
+    async def hash_password(self, password):
+        """Hashea una contraseña"""
+        return await asyncio.to_thread(pwd_context.hash, password)
+
+    async def verify_password(self, plain_password, hashed_password):
+        """Verifica una contraseña contra su hash"""
+        return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
+
+    async def read_all(self):
+        """Lee todos los usuarios"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT user_id, nombre, correo, contraseña, fecha_registro, activo
+                    FROM usuarios
+                    ORDER BY fecha_registro DESC;
+                """)
+                return await cur.fetchall()
+
+    async def read_one(self, user_id):
+        """Lee un usuario por su ID"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT user_id, nombre, correo, contraseña, fecha_registro, activo
+                    FROM usuarios
+                    WHERE user_id = %s;
+                """, (user_id,))
+                return await cur.fetchone()
+
+    async def read_by_email(self, correo):
+        """Lee un usuario por correo electrónico"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT user_id, nombre, correo, contraseña, fecha_registro, activo
+                    FROM usuarios
+                    WHERE correo = %s;
+                """, (correo,))
+                return await cur.fetchone()
+
+    async def write(self, data):
+        """Inserta un nuevo usuario"""
+        # Hashear la contraseña antes de tomar una conexión del pool
+        hashed_password = await self.hash_password(data['contraseña'])
+
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    INSERT INTO usuarios (nombre, correo, contraseña, activo)
+                    VALUES (%(nombre)s, %(correo)s, %(contraseña)s, %(activo)s)
+                    RETURNING user_id;
+                """, {
+                    'nombre': data['nombre'],
+                    'correo': data['correo'],
+                    'contraseña': hashed_password,
+                    'activo': data.get('activo', True)
+                })
+
+                # Obtener el ID del usuario recién creado
+                user_id = (await cur.fetchone())[0]
+                await conn.commit()
+                return user_id
+
+    async def update(self, user_id, data):
+        """Actualiza un usuario existente"""
+        # Construir la consulta dinámicamente basada en los campos proporcionados
+        set_clauses = []
+        params = {'user_id': user_id}
+
+        if 'nombre' in data and data['nombre']:
+            set_clauses.append("nombre = %(nombre)s")
+            params['nombre'] = data['nombre']
+
+        if 'correo' in data and data['correo']:
+            set_clauses.append("correo = %(correo)s")
+            params['correo'] = data['correo']
+
+        if 'contraseña' in data and data['contraseña']:
+            set_clauses.append("contraseña = %(contraseña)s")
+            params['contraseña'] = await self.hash_password(data['contraseña'])
+
+        if 'activo' in data:
+            set_clauses.append("activo = %(activo)s")
+            params['activo'] = data['activo']
+
+        if not set_clauses:
+            return  # No hay nada que actualizar
+
+        query = f"""
+            UPDATE usuarios
+            SET {', '.join(set_clauses)}
+            WHERE user_id = %(user_id)s;
+        """
+
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                await conn.commit()
+
+    async def delete(self, user_id):
+        """Elimina un usuario por ID"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    DELETE FROM usuarios WHERE user_id = %s;
+                """, (user_id,))
+                await conn.commit()
+
+    async def authenticate_user(self, correo, contraseña):
+        """Autentica un usuario verificando correo y contraseña"""
+        user = await self.read_by_email(correo)
+        if not user:
+            return None
+
+        # Verificar la contraseña
+        if await self.verify_password(contraseña, user[3]):  # user[3] es la contraseña hasheada
+            return user
+        return None
+
+    async def create_session(self, user_id):
+        """Crea una nueva sesión en la tabla control"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    INSERT INTO control (user_id)
+                    VALUES (%s)
+                    RETURNING id_control;
+                """, (user_id,))
+
+                control_id = (await cur.fetchone())[0]
+                await conn.commit()
+                return control_id
+
+    async def get_active_session(self, user_id):
+        """Obtiene la sesión activa más reciente del usuario"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    SELECT id_control, user_id, creacion, last_access
+                    FROM control
+                    WHERE user_id = %s
+                    ORDER BY last_access DESC
+                    LIMIT 1;
+                """, (user_id,))
+                return await cur.fetchone()
+
+    async def update_last_access(self, user_id):
+        """Actualiza el último acceso del usuario"""
+        pool = get_async_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("""
+                    UPDATE control
+                    SET last_access = CURRENT_TIMESTAMP
+                    WHERE user_id = %s;
+                """, (user_id,))
+                await conn.commit()
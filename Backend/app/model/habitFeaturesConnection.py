@@ -0,0 +1,278 @@
+# Backend/app/model/habitFeaturesConnection.py
+"""
+Clase para manejar el almacén de features por hábito (tabla habito_features).
+
+Cada hábito guarda sus últimos WINDOW_DAYS días como bits de un BIGINT,
+la racha que termina en su última fecha completada y el total de días
+completados. El toggle lo actualiza en O(1) (una fila) y el cambio de
+día solo recorre los bits, así que leer racha o tasas de un hábito ya no
+requiere recorrer seguimiento_habitos.
+
+Quién escribe las filas:
+- el toggle de hoy: la función SQL toggle_habito() (migración 011), único
+  lugar con la aritmética de bits del toggle
+- el lote de completados (fechas pasadas): recompute()
+- el cambio de día y las recargas: rollover() y rebuild()
+
+Las lecturas no escriben: si a un hábito le falta la fila, su estado se
+calcula al vuelo desde seguimiento_habitos.
+"""
+
+from datetime import date
+from typing import Dict, List, Optional
+
+from ..database import get_pool
+
+
+# Features calculadas desde seguimiento_habitos, con la forma de las
+# filas de habito_features. El cálculo vive en la función SQL
+# habito_features_desde_historial() (migración 010), la misma que usa
+# la migración para llenar la tabla.
+_FROM_HISTORY_QUERY = """
+    SELECT hu.habito_usuario_id,
+           CURRENT_DATE,
+           f.bits,
+           f.racha_actual,
+           f.dias_completados,
+           f.ultima_completada
+    FROM habitos_usuario hu
+    CROSS JOIN LATERAL habito_features_desde_historial(hu.habito_usuario_id) f
+    WHERE {where}
+"""
+
+# Reconstrucción: guarda esas features en habito_features
+_REBUILD_QUERY = """
+    INSERT INTO habito_features (habito_usuario_id, fecha_base, bits, racha_actual,
+                                 dias_completados, ultima_completada)
+""" + _FROM_HISTORY_QUERY + """
+    ON CONFLICT (habito_usuario_id) DO {on_conflict}
+"""
+
+_REBUILD_UPDATE = """UPDATE SET
+        fecha_base = EXCLUDED.fecha_base,
+        bits = EXCLUDED.bits,
+        racha_actual = EXCLUDED.racha_actual,
+        dias_completados = EXCLUDED.dias_completados,
+        ultima_completada = EXCLUDED.ultima_completada,
+        actualizado_en = CURRENT_TIMESTAMP"""
+
+_STATES_QUERY = """
+    SELECT habito_usuario_id, fecha_base, bits, racha_actual,
+           dias_completados, ultima_completada
+    FROM habito_features
+    WHERE habito_usuario_id = ANY(%s);
+"""
+
+
+class HabitFeaturesConnection:
+    """
+    Clase para manejar el almacén de features por hábito.
+    Usa el pool de conexiones compartido.
+    """
+
+    # Días guardados en bits (BIGINT sin el bit de signo)
+    WINDOW_DAYS = 63
+    _MASK = (1 << WINDOW_DAYS) - 1
+
+    def __init__(self):
+        # Usamos el pool compartido, no creamos conexión aquí
+        pass
+
+    # ========================================
+    # ESCRITURA
+    # ========================================
+
+    def recompute(self, cur, habito_usuario_ids: List[int]) -> None:
+        """
+        Recalcula desde el historial las filas de esos hábitos, dentro de
+        la transacción de quien llama (p. ej. tras cambiar días pasados).
+        """
+        cur.execute(
+            _REBUILD_QUERY.format(
+                where="hu.habito_usuario_id = ANY(%s)", on_conflict=_REBUILD_UPDATE
+            ),
+            (list(habito_usuario_ids),)
+        )
+
+    def recompute_for_users(self, cur, user_ids: List[int]) -> int:
+        """
+        Recalcula desde el historial las filas de todos los hábitos de esos
+        usuarios, dentro de la transacción de quien llama (p. ej. los
+        scripts de seed, que escriben seguimiento_habitos directo).
+
+        Returns:
+            Número de filas recalculadas
+        """
+        cur.execute(
+            _REBUILD_QUERY.format(
+                where="hu.user_id = ANY(%s)", on_conflict=_REBUILD_UPDATE
+            ),
+            (list(user_ids),)
+        )
+        return cur.rowcount
+
+    def rollover(self) -> Dict[str, int]:
+        """
+        Cambio de día: recorre los bits de todas las filas atrasadas (un
+        solo UPDATE, sin leer el historial) y crea las filas de hábitos
+        activos que aún no tienen.
+
+        Returns:
+            Dict con filas recorridas y creadas
+        """
+        pool = get_pool()
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE habito_features
+                    SET bits = CASE
+                            WHEN CURRENT_DATE - fecha_base >= %s THEN 0
+                            ELSE (bits << (CURRENT_DATE - fecha_base)) & %s
+                        END,
+                        fecha_base = CURRENT_DATE,
+                        actualizado_en = CURRENT_TIMESTAMP
+                    WHERE fecha_base < CURRENT_DATE;
+                """, (self.WINDOW_DAYS, self._MASK))
+                shifted = cur.rowcount
+
+                cur.execute(_REBUILD_QUERY.format(
+                    where="""hu.activo = true AND NOT EXISTS (
+                        SELECT 1 FROM habito_features hf
+                        WHERE hf.habito_usuario_id = hu.habito_usuario_id
+                    )""",
+                    on_conflict="NOTHING"
+                ))
+                created = cur.rowcount
+
+                conn.commit()
+
+        return {'shifted': shifted, 'created': created}
+
+    def rebuild(self, habito_usuario_ids: Optional[List[int]] = None) -> int:
+        """
+        Recalcula las filas desde seguimiento_habitos (todas o las dadas),
+        p. ej. después de cargar historial por fuera del toggle.
+
+        Returns:
+            Número de filas recalculadas
+        """
+        pool = get_pool()
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    _REBUILD_QUERY.format(
+                        where="(%s::int[] IS NULL OR hu.habito_usuario_id = ANY(%s::int[]))",
+                        on_conflict=_REBUILD_UPDATE
+                    ),
+                    (habito_usuario_ids, habito_usuario_ids)
+                )
+                rebuilt = cur.rowcount
+                conn.commit()
+        return rebuilt
+
+    # ========================================
+    # LECTURA
+    # ========================================
+
+    def get_state(self, cur, habito_usuario_id: int) -> Dict:
+        """Estado de un hábito al día de hoy (ver get_states)."""
+        return self.get_states(cur, [habito_usuario_id]).get(habito_usuario_id)
+
+    def get_states(self, cur, habito_usuario_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Estado de varios hábitos al día de hoy. Solo lee: los hábitos sin
+        fila en habito_features se calculan desde seguimiento_habitos
+        (la fila la crean el toggle, rollover() o rebuild()).
+
+        Returns:
+            Dict habito_usuario_id -> estado (ver _state)
+        """
+        if not habito_usuario_ids:
+            return {}
+        cur.execute(_STATES_QUERY, (list(habito_usuario_ids),))
+        rows = cur.fetchall()
+        faltan = self._missing(habito_usuario_ids, rows)
+        if faltan:
+            cur.execute(
+                _FROM_HISTORY_QUERY.format(where="hu.habito_usuario_id = ANY(%s)"),
+                (faltan,)
+            )
+            rows += cur.fetchall()
+        return self._states(rows)
+
+    # ========================================
+    # BITS
+    # ========================================
+
+    @classmethod
+    def _states(cls, rows) -> Dict[int, Dict]:
+        """Filas de habito_features (o calculadas) -> estados al día de hoy."""
+        hoy = date.today()
+        return {row[0]: cls._state(hoy, *cls._shift(row[1:], hoy)) for row in rows}
+
+    @staticmethod
+    def _missing(habito_usuario_ids: List[int], rows) -> List[int]:
+        """Hábitos pedidos que no tienen fila en habito_features."""
+        found = {row[0] for row in rows}
+        return [h for h in habito_usuario_ids if h not in found]
+
+    @classmethod
+    def _shift(cls, row, hoy: date):
+        """Lleva los bits de una fila a fecha_base = hoy (si está atrasada)."""
+        fecha_base, bits, racha, dias, ultima = row
+        elapsed = (hoy - fecha_base).days
+        if elapsed > 0:
+            bits = (bits << elapsed) & cls._MASK if elapsed < cls.WINDOW_DAYS else 0
+        return bits, racha, dias, ultima
+
+    @staticmethod
+    def _state(hoy: date, bits: int, racha: int, dias: int, ultima: Optional[date]) -> Dict:
+        """
+        Estado listo para leer:
+        - bits: bit i = completado hace i días (bit 0 = hoy)
+        - racha_actual: racha que sigue viva (termina hoy o ayer)
+        - racha_hasta_ayer: racha que termina ayer (la que usa el predictor)
+        """
+        viva = ultima is not None and (hoy - ultima).days <= 1
+        racha_actual = racha if viva else 0
+        return {
+            'bits': bits,
+            'racha_actual': racha_actual,
+            'racha_hasta_ayer': racha_actual - (bits & 1) if bits & 2 else 0,
+            'dias_completados': dias,
+            'ultima_completada': ultima,
+            'completado_hoy': bool(bits & 1)
+        }
+
+
+class AsyncHabitFeaturesConnection(HabitFeaturesConnection):
+    """
+    Versión asíncrona (cursor de psycopg AsyncConnection) de las
+    operaciones que corren dentro de un request. rollover() y rebuild()
+    siguen siendo síncronos (Celery).
+    """
+
+    async def recompute(self, cur, habito_usuario_ids: List[int]) -> None:
+        await cur.execute(
+            _REBUILD_QUERY.format(
+                where="hu.habito_usuario_id = ANY(%s)", on_conflict=_REBUILD_UPDATE
+            ),
+            (list(habito_usuario_ids),)
+        )
+
+    async def get_state(self, cur, habito_usuario_id: int) -> Dict:
+        return (await self.get_states(cur, [habito_usuario_id])).get(habito_usuario_id)
+
+    async def get_states(self, cur, habito_usuario_ids: List[int]) -> Dict[int, Dict]:
+        if not habito_usuario_ids:
+            return {}
+        await cur.execute(_STATES_QUERY, (list(habito_usuario_ids),))
+        rows = await cur.fetchall()
+        faltan = self._missing(habito_usuario_ids, rows)
+        if faltan:
+            await cur.execute(
+                _FROM_HISTORY_QUERY.format(where="hu.habito_usuario_id = ANY(%s)"),
+                (faltan,)
+            )
+            rows += await cur.fetchall()
+        return self._states(rows)
@@ -90,6 +90,7 @@ class ModeloInfoSchema(BaseModel):
     is_trained: bool
     model_exists: bool
     training_accuracy: Optional[float] = None
+    model_version: Optional[str] = None
     feature_names: List[str]
 
 
@@ -120,4 +120,29 @@ class HabitoPersonalizadoUpdateSchema(BaseModel):
             v = v.strip()
             if len(v) > 500:
                 raise ValueError('La descripción no puede exceder 500 caracteres')
-        return v
\ No newline at end of file
+        return v
+
+class HabitoCompletadoOperacionSchema(BaseModel):
+    """Una operación del lote: marcar/desmarcar un hábito en una fecha"""
+    habito_usuario_id: int
+    fecha: date
+    completado: bool
+
+    @validator('fecha')
+    def validate_fecha(cls, v):
+        if v > date.today():
+            raise ValueError('La fecha no puede ser futura')
+        return v
+
+
+class HabitoCompletadoLoteSchema(BaseModel):
+    """Schema para aplicar varios completados de una vez (cola offline)"""
+    operaciones: List[HabitoCompletadoOperacionSchema]
+
+    @validator('operaciones')
+    def validate_operaciones(cls, v):
+        if not v:
+            raise ValueError('Debe enviar al menos una operación')
+        if len(v) > 500:
+            raise ValueError('No se pueden enviar más de 500 operaciones por lote')
+        return v
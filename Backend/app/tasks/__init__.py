@@ -1,10 +1,20 @@
 # Celery Tasks module for Taskpin
 from .celery_app import celery_app
-from .ai_tasks import train_model_task, generate_recommendations_task, generate_predictions_task
+from .ai_tasks import (
+    train_model_task, generate_recommendations_task, generate_predictions_task,
+    build_neighbor_index_task, generate_all_recommendations_task,
+    generate_all_predictions_task, refresh_user_predictions_task,
+    rollover_habit_features_task
+)
 
 __all__ = [
     "celery_app",
     "train_model_task",
     "generate_recommendations_task",
-    "generate_predictions_task"
+    "generate_predictions_task",
+    "build_neighbor_index_task",
+    "generate_all_recommendations_task",
+    "generate_all_predictions_task",
+    "refresh_user_predictions_task",
+    "rollover_habit_features_task"
 ]
@@ -5,8 +5,11 @@ Tareas de inteligencia artificial que se ejecutan en background.
 """
 
 from .celery_app import celery_app
+from ..config import RECOMMENDER_SEARCH_MODE, RECOMMENDER_LSH_BANDS, RECOMMENDER_LSH_ROWS
 from celery import states
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
+from zoneinfo import ZoneInfo
 import time
 
 
@@ -18,8 +21,11 @@ def train_model_task(self, force_retrain: bool = False) -> Dict[str, Any]:
     Esta tarea puede tomar varios segundos dependiendo de la cantidad de datos.
     Se ejecuta en background para no bloquear la API.
     
+    Si ya existe un modelo, por defecto solo entrena con los registros
+    posteriores a su última marca (HabitPredictor.train_incremental).
+    
     Args:
-        force_retrain: Si es True, reentrenar aunque ya exista modelo
+        force_retrain: Si es True, reentrenar desde cero con todo el historial
         
     Returns:
         Dict con resultados del entrenamiento
@@ -39,7 +45,14 @@ def train_model_task(self, force_retrain: bool = False) -> Dict[str, Any]:
         self.update_state(state="TRAINING", meta={"progress": 50, "step": "Training model..."})
         
         # Entrenar
-        results = predictor.train(test_size=0.2, save=True)
+        if force_retrain:
+            # Historial leído por bloques: la memoria no crece con la tabla
+            results = predictor.train(test_size=0.2, save=True, streaming=True)
+        else:
+            results = predictor.train_incremental(test_size=0.2, save=True)
+        
+        if not results.get("success"):
+            return {"success": False, "message": results.get("error")}
         
         self.update_state(state="TRAINING", meta={"progress": 90, "step": "Saving model..."})
         
@@ -51,6 +64,8 @@ def train_model_task(self, force_retrain: bool = False) -> Dict[str, Any]:
             "precision": results.get("precision", 0),
             "recall": results.get("recall", 0),
             "f1_score": results.get("f1_score", 0),
+            "incremental": results.get("incremental", False),
+            "watermark": results.get("watermark", predictor.training_watermark),
             "message": "Model trained successfully"
         }
         
@@ -85,7 +100,11 @@ def generate_recommendations_task(self, user_id: int, limit: int = 5) -> Dict[st
         
         self.update_state(state="PROCESSING", meta={"progress": 30, "step": "Computing recommendations..."})
         
-        recommender = HabitRecommender()
+        recommender = HabitRecommender(
+            search_mode=RECOMMENDER_SEARCH_MODE,
+            lsh_bands=RECOMMENDER_LSH_BANDS,
+            lsh_rows=RECOMMENDER_LSH_ROWS
+        )
         recommendations = recommender.get_recommendations(user_id, limit=limit, use_cache=False)
         
         self.update_state(state="PROCESSING", meta={"progress": 80, "step": "Caching results..."})
@@ -148,6 +167,276 @@ def generate_predictions_task(self, user_id: int) -> Dict[str, Any]:
         raise
 
 
+# Predictor reutilizado entre tareas de refresco (se actualiza solo con
+# el registro de modelos; evita cargarlo en cada toggle)
+_refresh_predictor = None
+
+
+@celery_app.task(name="taskpin.refresh_user_predictions")
+def refresh_user_predictions_task(user_id: int) -> Dict[str, Any]:
+    """
+    Tarea: Recalcular las predicciones de los hábitos que el usuario
+    marcó/desmarcó en la última ventana.
+    
+    Los toggles se juntan en Redis (mark_prediction_refresh) y esta
+    tarea se encola una vez por ventana, así varios toggles seguidos
+    cuestan un solo recálculo, y solo de los hábitos afectados.
+    
+    Args:
+        user_id: ID del usuario
+        
+    Returns:
+        Dict con los hábitos recalculados
+    """
+    global _refresh_predictor
+    
+    from ..ai import HabitPredictor
+    from ..core.redis_client import redis_client
+    
+    habito_usuario_ids = redis_client.pop_prediction_refresh(user_id)
+    if not habito_usuario_ids:
+        return {"success": True, "user_id": user_id, "refreshed": []}
+    
+    if _refresh_predictor is None:
+        _refresh_predictor = HabitPredictor()
+    
+    predictions = _refresh_predictor.refresh_habit_predictions(user_id, habito_usuario_ids)
+    
+    return {
+        "success": True,
+        "user_id": user_id,
+        "refreshed": habito_usuario_ids,
+        "count": len(predictions)
+    }
+
+
+@celery_app.task(bind=True, name="taskpin.generate_all_recommendations", time_limit=3600)
+def generate_all_recommendations_task(
+    self,
+    limit: int = 5,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    ttl: int = 90000
+) -> Dict[str, Any]:
+    """
+    Tarea: Generar y cachear las recomendaciones de todos los usuarios.
+    
+    Una sola carga de la matriz y productos por bloques de usuarios; cada
+    bloque se guarda en Redis con un pipeline de SETEX. Se programa cada
+    noche para que el tráfico de la mañana se sirva desde cache.
+    
+    Args:
+        limit: Número de recomendaciones por usuario
+        shard_index: Shard a procesar (user_id % shard_count)
+        shard_count: Número total de shards
+        ttl: Tiempo de vida del cache (default 25 horas, hasta la siguiente corrida)
+        
+    Returns:
+        Dict con estadísticas de la generación
+    """
+    try:
+        self.update_state(state="PROCESSING", meta={"progress": 0, "step": "Loading matrix..."})
+        
+        from ..ai import HabitRecommender
+        from ..core.redis_client import redis_client
+        
+        start_time = time.time()
+        recommender = HabitRecommender(
+            search_mode=RECOMMENDER_SEARCH_MODE,
+            lsh_bands=RECOMMENDER_LSH_BANDS,
+            lsh_rows=RECOMMENDER_LSH_ROWS
+        )
+        
+        users = 0
+        cached = 0
+        for block in recommender.iter_all_recommendations(
+            limit=limit, shard_index=shard_index, shard_count=shard_count
+        ):
+            cached += redis_client.set_many_json(
+                {
+                    f"recommendations:user:{user_id}:limit:{limit}": recommendations
+                    for user_id, recommendations in block.items()
+                },
+                ttl=ttl
+            )
+            users += len(block)
+            self.update_state(
+                state="PROCESSING",
+                meta={"users": users, "step": f"Cached {cached} users..."}
+            )
+        
+        return {
+            "success": True,
+            "users": users,
+            "cached": cached,
+            "shard": f"{shard_index}/{shard_count}",
+            "elapsed_seconds": round(time.time() - start_time, 3)
+        }
+        
+    except Exception as e:
+        self.update_state(state=states.FAILURE, meta={"error": str(e)})
+        raise
+
+
+def _seconds_until_midnight() -> int:
+    """
+    Segundos que faltan para la medianoche en la zona horaria de Celery
+    (la del beat), no la del reloj del worker (p. ej. contenedor en UTC).
+    """
+    tz = ZoneInfo(celery_app.conf.timezone or "UTC")
+    now = datetime.now(tz)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    # timestamp(): resta en UTC real (cuenta los cambios de horario)
+    return max(60, int(midnight.timestamp() - now.timestamp()))
+
+
+@celery_app.task(bind=True, name="taskpin.generate_all_predictions", time_limit=3600)
+def generate_all_predictions_task(
+    self,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    batch_size: Optional[int] = None,
+    ttl: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Tarea: Calcular y cachear las predicciones de hoy de todos los usuarios.
+    
+    Las predicciones dependen del día de la semana, así que el cache de
+    todos los usuarios vence cada medianoche. Se programa cada noche para
+    que la primera consulta de la mañana no pague la extracción de
+    features ni el modelo: una consulta de features y una llamada al
+    modelo por lote, y un pipeline de SETEX por lote.
+    
+    Args:
+        shard_index: Shard a procesar (user_id % shard_count)
+        shard_count: Número total de shards
+        batch_size: Usuarios por lote (default HabitPredictor.PRECOMPUTE_BATCH_USERS)
+        ttl: Tiempo de vida del cache (default hasta la medianoche)
+        
+    Returns:
+        Dict con estadísticas de la generación
+    """
+    try:
+        self.update_state(state="PROCESSING", meta={"progress": 0, "step": "Loading predictor..."})
+        
+        from ..ai import HabitPredictor
+        from ..core.redis_client import redis_client
+        
+        start_time = time.time()
+        ttl = ttl or _seconds_until_midnight()
+        predictor = HabitPredictor()
+        
+        users = 0
+        cached = 0
+        for batch in predictor.iter_all_predictions(
+            shard_index=shard_index, shard_count=shard_count, batch_size=batch_size
+        ):
+            cached += redis_client.set_many_json(
+                {
+                    f"predictions:user:{user_id}": predictions
+                    for user_id, predictions in batch.items()
+                },
+                ttl=ttl
+            )
+            users += len(batch)
+            self.update_state(
+                state="PROCESSING",
+                meta={"users": users, "step": f"Cached {cached} users..."}
+            )
+        
+        return {
+            "success": True,
+            "users": users,
+            "cached": cached,
+            "ttl": ttl,
+            "model_version": predictor.model_version,
+            "shard": f"{shard_index}/{shard_count}",
+            "elapsed_seconds": round(time.time() - start_time, 3)
+        }
+        
+    except Exception as e:
+        self.update_state(state=states.FAILURE, meta={"error": str(e)})
+        raise
+
+
+@celery_app.task(bind=True, name="taskpin.build_neighbor_index")
+def build_neighbor_index_task(self, k: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Tarea: Reconstruir el índice de vecinos precalculado.
+    
+    Calcula los K usuarios más similares de cada usuario y guarda el
+    índice en disco; los recomendadores de la API lo recargan solos.
+    Se programa periódicamente con Celery Beat.
+    
+    Args:
+        k: Vecinos por usuario (default NeighborIndex.DEFAULT_K)
+        
+    Returns:
+        Dict con estadísticas de la construcción
+    """
+    try:
+        self.update_state(state="PROCESSING", meta={"progress": 0, "step": "Loading matrix..."})
+        
+        from ..ai import HabitRecommender
+        from ..ai.neighbor_index import NeighborIndex
+        
+        self.update_state(state="PROCESSING", meta={"progress": 30, "step": "Computing neighbors..."})
+        
+        recommender = HabitRecommender(
+            search_mode=RECOMMENDER_SEARCH_MODE,
+            lsh_bands=RECOMMENDER_LSH_BANDS,
+            lsh_rows=RECOMMENDER_LSH_ROWS
+        )
+        stats = recommender.build_neighbor_index(k=k or NeighborIndex.DEFAULT_K)
+        
+        return {
+            "success": True,
+            **stats
+        }
+        
+    except Exception as e:
+        self.update_state(state=states.FAILURE, meta={"error": str(e)})
+        raise
+
+
+@celery_app.task(bind=True, name="taskpin.rollover_habit_features")
+def rollover_habit_features_task(self, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    Tarea: Cambio de día del almacén de features por hábito.
+    
+    Recorre los bits de historial de todos los hábitos (un UPDATE, sin
+    leer seguimiento_habitos) y crea las filas que falten. Se programa
+    cada medianoche con Celery Beat.
+    
+    Args:
+        rebuild: Si es True, recalcular todo desde seguimiento_habitos
+            (p. ej. después de cargar historial por fuera del toggle)
+        
+    Returns:
+        Dict con filas recorridas/creadas (o recalculadas)
+    """
+    try:
+        from ..model.habitFeaturesConnection import HabitFeaturesConnection
+        
+        start_time = time.time()
+        features = HabitFeaturesConnection()
+        
+        if rebuild:
+            stats = {"rebuilt": features.rebuild()}
+        else:
+            stats = features.rollover()
+        
+        return {
+            "success": True,
+            **stats,
+            "elapsed_seconds": round(time.time() - start_time, 3)
+        }
+        
+    except Exception as e:
+        self.update_state(state=states.FAILURE, meta={"error": str(e)})
+        raise
+
+
 @celery_app.task(name="taskpin.health_check")
 def health_check_task() -> Dict[str, Any]:
     """
@@ -5,6 +5,7 @@ Configura Celery con Redis como broker y backend.
 """
 
 from celery import Celery
+from celery.schedules import crontab
 import os
 
 # Redis URL para Celery (usar db=2 para separar de cache)
@@ -48,6 +49,39 @@ celery_app.conf.update(
 celery_app.conf.task_routes = {
     "app.tasks.ai_tasks.train_model_task": {"queue": "ai"},
     "app.tasks.ai_tasks.generate_*": {"queue": "ai"},
+    "taskpin.build_neighbor_index": {"queue": "ai"},
+    "taskpin.generate_all_recommendations": {"queue": "ai"},
+    "taskpin.generate_all_predictions": {"queue": "ai"},
+    "taskpin.refresh_user_predictions": {"queue": "ai"},
+}
+
+# Tareas periódicas (requiere `celery -A app.tasks.celery_app beat`)
+celery_app.conf.beat_schedule = {
+    "rollover-habit-features": {
+        "task": "taskpin.rollover_habit_features",
+        "schedule": crontab(hour=0, minute=1),  # cada medianoche
+    },
+    "rebuild-neighbor-index": {
+        "task": "taskpin.build_neighbor_index",
+        "schedule": crontab(minute=0),  # cada hora
+    },
+    "full-retrain-predictor": {
+        "task": "taskpin.train_model",
+        "schedule": crontab(hour=3, minute=0, day_of_week=0),  # domingos, todo el historial
+        "kwargs": {"force_retrain": True},
+    },
+    "retrain-predictor": {
+        "task": "taskpin.train_model",
+        "schedule": crontab(hour=3, minute=30),  # cada noche, solo datos nuevos
+    },
+    "precompute-predictions": {
+        "task": "taskpin.generate_all_predictions",
+        "schedule": crontab(hour=4, minute=0),  # cada noche, con el modelo recién reentrenado
+    },
+    "precompute-recommendations": {
+        "task": "taskpin.generate_all_recommendations",
+        "schedule": crontab(hour=4, minute=30),  # cada noche, antes del pico de la mañana
+    },
 }
 
 # Para debugging
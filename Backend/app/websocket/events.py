@@ -20,6 +20,7 @@ class WSEvent(str, Enum):
     # Hábitos
     HABIT_COMPLETED = "habit_completed"
     HABIT_UNCOMPLETED = "habit_uncompleted"
+    HABITS_BATCH_UPDATED = "habits_batch_updated"
     
     # Cache
     CACHE_INVALIDATED = "cache_invalidated"
@@ -102,6 +103,25 @@ def event_habit_uncompleted(
     )
 
 
+def event_habits_batch_updated(
+    completados: list,
+    desmarcados: list,
+    puntos_cambio: int,
+    racha_actual: int
+) -> str:
+    """Evento: Se aplicó un lote de completados (un solo evento por lote)."""
+    return create_event(
+        WSEvent.HABITS_BATCH_UPDATED,
+        data={
+            "completados": completados,
+            "desmarcados": desmarcados,
+            "puntos_cambio": puntos_cambio,
+            "racha_actual": racha_actual
+        },
+        message=f"Synced: {len(completados)} completed, {len(desmarcados)} unmarked ({puntos_cambio:+d} pts)"
+    )
+
+
 def event_cache_invalidated(cache_type: str, user_id: int) -> str:
     """Evento: Cache invalidado."""
     return create_event(
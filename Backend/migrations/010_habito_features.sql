@@ -0,0 +1,95 @@
+-- ============================================
+-- MIGRACIÓN 010: Tabla habito_features
+-- Fecha: 2026-10-17
+-- Descripción: Features precalculadas por hábito (historial en bits,
+--              racha actual, total completado), mantenidas al escribir
+-- ============================================
+
+-- bits: bit i = 1 si el hábito se completó el día (fecha_base - i).
+-- Se guardan 63 días (BIGINT sin el bit de signo). Al cambiar de día se
+-- recorren los bits (bits << días transcurridos) sin leer el historial.
+CREATE TABLE IF NOT EXISTS habito_features (
+    habito_usuario_id INTEGER PRIMARY KEY,
+    fecha_base DATE NOT NULL DEFAULT CURRENT_DATE,
+    bits BIGINT NOT NULL DEFAULT 0,
+    racha_actual INTEGER NOT NULL DEFAULT 0,   -- racha que termina en ultima_completada
+    dias_completados INTEGER NOT NULL DEFAULT 0,
+    ultima_completada DATE,
+    actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- Foreign Key
+    FOREIGN KEY (habito_usuario_id) REFERENCES habitos_usuario(habito_usuario_id) ON DELETE CASCADE,
+
+    -- Constraints de validación
+    CONSTRAINT chk_features_bits_no_negativos CHECK (bits >= 0),
+    CONSTRAINT chk_features_racha_no_negativa CHECK (racha_actual >= 0),
+    CONSTRAINT chk_features_dias_no_negativos CHECK (dias_completados >= 0)
+);
+
+-- Índice para el cambio de día (solo filas atrasadas)
+CREATE INDEX IF NOT EXISTS idx_habito_features_fecha_base
+ON habito_features(fecha_base);
+
+-- Features de un hábito calculadas desde seguimiento_habitos, con la
+-- forma de las columnas de habito_features (fecha_base = hoy). Única
+-- definición del cálculo desde el historial: la usan la migración de
+-- abajo y HabitFeaturesConnection (recompute/rebuild).
+-- (racha = "isla" de días consecutivos que termina en la última fecha:
+--  fecha - row_number() es constante dentro de una racha)
+CREATE OR REPLACE FUNCTION habito_features_desde_historial(p_habito_usuario_id INTEGER)
+RETURNS TABLE (
+    bits BIGINT,
+    racha_actual INTEGER,
+    dias_completados INTEGER,
+    ultima_completada DATE
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT COALESCE(v.bits, 0),
+           COALESCE(r.racha, 0)::int,
+           t.total::int,
+           t.ultima
+    FROM (
+        SELECT COUNT(DISTINCT sh.fecha) AS total, MAX(sh.fecha) AS ultima
+        FROM seguimiento_habitos sh
+        WHERE sh.habito_usuario_id = p_habito_usuario_id
+          AND sh.completado = true AND sh.fecha <= CURRENT_DATE
+    ) t
+    CROSS JOIN (
+        SELECT BIT_OR(1::bigint << (CURRENT_DATE - sh.fecha)) AS bits
+        FROM seguimiento_habitos sh
+        WHERE sh.habito_usuario_id = p_habito_usuario_id
+          AND sh.completado = true
+          AND sh.fecha > CURRENT_DATE - 63 AND sh.fecha <= CURRENT_DATE
+    ) v
+    LEFT JOIN (
+        SELECT COUNT(*) AS racha
+        FROM (
+            SELECT d.fecha, d.fecha - (ROW_NUMBER() OVER (ORDER BY d.fecha))::int AS isla
+            FROM (
+                SELECT DISTINCT sh.fecha
+                FROM seguimiento_habitos sh
+                WHERE sh.habito_usuario_id = p_habito_usuario_id
+                  AND sh.completado = true AND sh.fecha <= CURRENT_DATE
+            ) d
+        ) s
+        GROUP BY s.isla
+        ORDER BY MAX(s.fecha) DESC
+        LIMIT 1
+    ) r ON true;
+$$;
+
+-- Migrar hábitos existentes desde seguimiento_habitos
+INSERT INTO habito_features (habito_usuario_id, fecha_base, bits, racha_actual,
+                             dias_completados, ultima_completada)
+SELECT hu.habito_usuario_id, CURRENT_DATE, f.bits, f.racha_actual,
+       f.dias_completados, f.ultima_completada
+FROM habitos_usuario hu
+CROSS JOIN LATERAL habito_features_desde_historial(hu.habito_usuario_id) f
+ON CONFLICT (habito_usuario_id) DO NOTHING;
+
+-- Comentario de verificación
+COMMENT ON TABLE habito_features IS 'Features por hábito (historial de 63 días en bits, racha, total) mantenidas al escribir';
+COMMENT ON COLUMN habito_features.bits IS 'Bit i = completado el día fecha_base - i';
+COMMENT ON FUNCTION habito_features_desde_historial(INTEGER) IS 'Features de un hábito calculadas desde seguimiento_habitos (backfill y recálculos)';
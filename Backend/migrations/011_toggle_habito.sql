@@ -0,0 +1,223 @@
+-- ============================================
+-- MIGRACIÓN 011: Función toggle_habito
+-- Fecha: 2026-10-17
+-- Descripción: Toggle de hábito completo (seguimiento, habito_features,
+--              racha, puntos y nivel) en una sola llamada atómica
+-- ============================================
+
+-- Nivel correspondiente a unos puntos. Misma escala que calcular_nivel()
+-- en main.py: pasar del nivel n al n+1 cuesta 50 + 50·n puntos
+-- (100, 150, 200...).
+CREATE OR REPLACE FUNCTION nivel_por_puntos(p_puntos INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+    v_nivel INTEGER := 1;
+    v_acumulado INTEGER := 0;
+BEGIN
+    WHILE p_puntos >= v_acumulado + 50 + v_nivel * 50 LOOP
+        v_acumulado := v_acumulado + 50 + v_nivel * 50;
+        v_nivel := v_nivel + 1;
+    END LOOP;
+    RETURN v_nivel;
+END;
+$$;
+
+-- Alterna el completado de HOY de un hábito del usuario.
+--
+-- Sin filas: el hábito no existe, no es del usuario o está inactivo.
+-- Las columnas de racha/puntos/nivel vienen en NULL si el usuario no
+-- tiene fila en estadisticas_usuario; las de racha también al desmarcar
+-- (la racha del usuario solo se actualiza al completar).
+--
+-- habito_features se actualiza aquí en O(1) con aritmética de bits
+-- (bit i = completado hace i días); es el único lugar con esa lógica.
+CREATE OR REPLACE FUNCTION toggle_habito(p_user_id INTEGER, p_habito_usuario_id INTEGER)
+RETURNS TABLE (
+    completado BOOLEAN,
+    puntos_base INTEGER,
+    nombre TEXT,
+    racha_actual INTEGER,
+    racha_maxima INTEGER,
+    racha_incrementada BOOLEAN,
+    puntos_cambio INTEGER,
+    puntos_totales INTEGER,
+    nivel_anterior INTEGER,
+    nivel INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    c_window CONSTANT INTEGER := 63;
+    c_mask CONSTANT BIGINT := 9223372036854775807;  -- 2^63 - 1
+    v_hoy DATE := CURRENT_DATE;
+    v_completado BOOLEAN;
+    v_puntos_base INTEGER;
+    v_nombre TEXT;
+    -- habito_features
+    v_fecha_base DATE;
+    v_bits BIGINT;
+    v_racha INTEGER;
+    v_dias INTEGER;
+    v_ultima DATE;
+    v_offset INTEGER;
+    -- estadisticas_usuario
+    v_racha_usuario INTEGER;
+    v_racha_maxima INTEGER;
+    v_ultima_actividad DATE;
+    v_puntos INTEGER;
+    v_nivel INTEGER;
+    v_nueva_racha INTEGER;
+    v_puntos_cambio INTEGER;
+    v_puntos_nuevos INTEGER;
+BEGIN
+    -- 1. El hábito es del usuario y está activo (puntos y nombre para la respuesta)
+    SELECT COALESCE(hp.puntos_base, 10), COALESCE(hp.nombre, 'Hábito personalizado')
+    INTO v_puntos_base, v_nombre
+    FROM habitos_usuario hu
+    LEFT JOIN habitos_predeterminados hp ON hu.habito_id = hp.habito_id
+    WHERE hu.habito_usuario_id = p_habito_usuario_id
+      AND hu.user_id = p_user_id
+      AND hu.activo = true;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    -- 2. Seguimiento de hoy: se crea completado o se alterna
+    INSERT INTO seguimiento_habitos AS sh (habito_usuario_id, fecha, completado, hora_completado)
+    VALUES (p_habito_usuario_id, v_hoy, true, CURRENT_TIME)
+    ON CONFLICT (habito_usuario_id, fecha) DO UPDATE
+    SET completado = NOT COALESCE(sh.completado, false),
+        hora_completado = CASE WHEN COALESCE(sh.completado, false) THEN NULL ELSE CURRENT_TIME END
+    RETURNING sh.completado INTO v_completado;
+
+    -- 3. habito_features (fila bloqueada; si falta se crea desde el
+    --    historial, que ya incluye el cambio de hoy)
+    SELECT hf.fecha_base, hf.bits, hf.racha_actual, hf.dias_completados, hf.ultima_completada
+    INTO v_fecha_base, v_bits, v_racha, v_dias, v_ultima
+    FROM habito_features hf
+    WHERE hf.habito_usuario_id = p_habito_usuario_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        -- Desde el historial: habito_features_desde_historial() (migración 010)
+        INSERT INTO habito_features (habito_usuario_id, fecha_base, bits, racha_actual,
+                                     dias_completados, ultima_completada)
+        SELECT p_habito_usuario_id, v_hoy, f.bits, f.racha_actual,
+               f.dias_completados, f.ultima_completada
+        FROM habito_features_desde_historial(p_habito_usuario_id) f
+        ON CONFLICT (habito_usuario_id) DO NOTHING;
+
+        SELECT hf.fecha_base, hf.bits, hf.racha_actual, hf.dias_completados, hf.ultima_completada
+        INTO v_fecha_base, v_bits, v_racha, v_dias, v_ultima
+        FROM habito_features hf
+        WHERE hf.habito_usuario_id = p_habito_usuario_id
+        FOR UPDATE;
+    END IF;
+
+    -- Llevar los bits a fecha_base = hoy
+    IF v_hoy - v_fecha_base >= c_window THEN
+        v_bits := 0;
+    ELSIF v_hoy > v_fecha_base THEN
+        v_bits := (v_bits << (v_hoy - v_fecha_base)) & c_mask;
+    END IF;
+
+    IF v_completado AND (v_bits & 1) = 0 THEN
+        -- La racha de hoy continúa la que terminó ayer (si la hubo)
+        v_racha := CASE WHEN v_ultima = v_hoy - 1 THEN v_racha ELSE 0 END + 1;
+        v_ultima := v_hoy;
+        v_bits := v_bits | 1;
+        v_dias := v_dias + 1;
+    ELSIF NOT v_completado AND (v_bits & 1) = 1 THEN
+        v_bits := v_bits & ~(1::bigint);
+        v_dias := GREATEST(0, v_dias - 1);
+        IF v_bits <> 0 THEN
+            -- Última fecha completada (bit en 1 más bajo) y su racha
+            v_offset := 1;
+            WHILE ((v_bits >> v_offset) & 1) = 0 LOOP
+                v_offset := v_offset + 1;
+            END LOOP;
+            v_ultima := v_hoy - v_offset;
+            IF v_offset = 1 THEN
+                v_racha := v_racha - 1;
+            ELSE
+                v_racha := 0;
+                WHILE v_offset + v_racha < c_window AND ((v_bits >> (v_offset + v_racha)) & 1) = 1 LOOP
+                    v_racha := v_racha + 1;
+                END LOOP;
+            END IF;
+        ELSE
+            v_ultima := NULL;
+            v_racha := 0;
+        END IF;
+    END IF;
+
+    UPDATE habito_features
+    SET fecha_base = v_hoy, bits = v_bits, racha_actual = v_racha,
+        dias_completados = v_dias, ultima_completada = v_ultima,
+        actualizado_en = CURRENT_TIMESTAMP
+    WHERE habito_usuario_id = p_habito_usuario_id;
+
+    -- 4. Racha, puntos y nivel del usuario (una fila bloqueada, un UPDATE)
+    completado := v_completado;
+    puntos_base := v_puntos_base;
+    nombre := v_nombre;
+
+    SELECT e.racha_actual, e.racha_maxima, e.ultima_actividad, e.puntos_totales, e.nivel
+    INTO v_racha_usuario, v_racha_maxima, v_ultima_actividad, v_puntos, v_nivel
+    FROM estadisticas_usuario e
+    WHERE e.user_id = p_user_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN NEXT;
+        RETURN;
+    END IF;
+
+    v_nueva_racha := v_racha_usuario;
+    IF v_completado THEN
+        IF v_ultima_actividad = v_hoy THEN
+            -- Ya completó algo hoy, no cambiar racha
+            v_nueva_racha := v_racha_usuario;
+        ELSIF v_ultima_actividad = v_hoy - 1 THEN
+            -- Día consecutivo, incrementar
+            v_nueva_racha := v_racha_usuario + 1;
+        ELSE
+            -- Racha rota o primera vez, empezar en 1
+            v_nueva_racha := 1;
+        END IF;
+        v_racha_maxima := GREATEST(v_racha_maxima, v_nueva_racha);
+        v_ultima_actividad := v_hoy;
+
+        racha_actual := v_nueva_racha;
+        racha_maxima := v_racha_maxima;
+        racha_incrementada := v_nueva_racha > v_racha_usuario;
+    END IF;
+
+    v_puntos_cambio := CASE WHEN v_completado THEN v_puntos_base ELSE -v_puntos_base END;
+    v_puntos_nuevos := GREATEST(0, v_puntos + v_puntos_cambio);
+
+    UPDATE estadisticas_usuario
+    SET racha_actual = v_nueva_racha,
+        racha_maxima = v_racha_maxima,
+        ultima_actividad = v_ultima_actividad,
+        puntos_totales = v_puntos_nuevos,
+        nivel = nivel_por_puntos(v_puntos_nuevos)
+    WHERE user_id = p_user_id
+    RETURNING estadisticas_usuario.nivel INTO nivel;
+
+    puntos_cambio := v_puntos_cambio;
+    puntos_totales := v_puntos_nuevos;
+    nivel_anterior := COALESCE(v_nivel, 1);
+
+    RETURN NEXT;
+END;
+$$;
+
+-- Comentario de verificación
+COMMENT ON FUNCTION toggle_habito(INTEGER, INTEGER) IS 'Toggle de hábito de hoy: seguimiento, habito_features, racha, puntos y nivel en una llamada';
+COMMENT ON FUNCTION nivel_por_puntos(INTEGER) IS 'Nivel por puntos (misma escala que calcular_nivel en main.py)';
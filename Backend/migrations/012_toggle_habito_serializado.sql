@@ -0,0 +1,42 @@
+-- ============================================
+-- MIGRACIÓN 012: Toggle de hábito serializado por usuario
+-- Fecha: 2026-10-17
+-- Descripción: Envoltura de toggle_habito() que toma un advisory lock
+--              por usuario, para que las escrituras concurrentes de un
+--              mismo usuario (varios dispositivos, reintentos) se
+--              apliquen una detrás de otra
+-- ============================================
+
+-- Espacio de claves del lock (primer argumento de pg_advisory_xact_lock),
+-- para no chocar con otros advisory locks que use la base.
+-- El lock es de transacción: se libera solo al terminar la llamada, y
+-- usuarios distintos nunca se esperan entre sí.
+--
+-- Se toma antes que cualquier lock de fila de toggle_habito(), así que
+-- los toggles de un usuario siempre bloquean en el mismo orden (sin
+-- deadlocks entre hábitos distintos ni entre seguimiento_habitos y
+-- estadisticas_usuario).
+CREATE OR REPLACE FUNCTION toggle_habito_serializado(p_user_id INTEGER, p_habito_usuario_id INTEGER)
+RETURNS TABLE (
+    completado BOOLEAN,
+    puntos_base INTEGER,
+    nombre TEXT,
+    racha_actual INTEGER,
+    racha_maxima INTEGER,
+    racha_incrementada BOOLEAN,
+    puntos_cambio INTEGER,
+    puntos_totales INTEGER,
+    nivel_anterior INTEGER,
+    nivel INTEGER
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('taskpin:escritura_usuario'), p_user_id);
+
+    RETURN QUERY SELECT * FROM toggle_habito(p_user_id, p_habito_usuario_id);
+END;
+$$;
+
+-- Comentario de verificación
+COMMENT ON FUNCTION toggle_habito_serializado(INTEGER, INTEGER) IS 'toggle_habito() con advisory lock por usuario (escrituras de un usuario en serie)';
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark LSH - Recall@k del modo aproximado vs búsqueda exacta
+
+Compara HabitRecommender(search_mode='lsh') contra la búsqueda exacta de
+find_similar_users para varias configuraciones (bandas × filas) y reporta:
+    - recall@k: fracción de los k vecinos exactos que LSH encuentra
+      (los empates con el k-ésimo vecino cuentan como acierto)
+    - candidatos promedio por consulta (% de usuarios comparados)
+    - latencia promedio por consulta (ms)
+    - tiempo de construcción del índice LSH
+
+USO:
+    cd Backend
+    source .venv/bin/activate
+    python -m scripts.benchmark_lsh                       # matriz real (BD)
+    python -m scripts.benchmark_lsh --synthetic 200000    # usuarios sintéticos
+    python -m scripts.benchmark_lsh --configs 16x2,32x3 --k 15 --queries 500
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+from scipy import sparse
+
+from app.ai.recommender import HabitRecommender
+from app.ai.artifact_store import ArtifactStore
+
+DEFAULT_CONFIGS = "8x2,16x2,32x2,16x3,32x3,64x4"
+
+
+class MatrixSource:
+    """Sustituye al FeatureExtractor para servir una matriz fija."""
+
+    def __init__(self, matrix, user_ids, habit_ids):
+        self.data = (matrix, user_ids, habit_ids)
+
+    def get_user_habit_matrix(self):
+        matrix, user_ids, habit_ids = self.data
+        return matrix.copy(), list(user_ids), list(habit_ids)
+
+
+def synthetic_matrix(n_users: int, n_habits: int = 300, n_groups: int = 40,
+                     habits_per_user: int = 8, seed: int = 7):
+    """
+    Usuarios sintéticos con estructura: cada usuario pertenece a un grupo
+    de intereses y toma ~80% de sus hábitos del catálogo de ese grupo.
+    """
+    rng = np.random.default_rng(seed)
+    group_catalogs = [rng.choice(n_habits, size=20, replace=False) for _ in range(n_groups)]
+    groups = rng.integers(0, n_groups, size=n_users)
+
+    rows, cols = [], []
+    for user, group in enumerate(groups):
+        n_own = rng.integers(max(1, habits_per_user // 2), habits_per_user * 2)
+        from_group = rng.random(n_own) < 0.8
+        picks = np.where(
+            from_group,
+            rng.choice(group_catalogs[group], size=n_own),
+            rng.integers(0, n_habits, size=n_own)
+        )
+        picks = np.unique(picks)
+        rows.extend([user] * len(picks))
+        cols.extend(picks.tolist())
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(n_users, n_habits)
+    )
+    return matrix, list(range(1, n_users + 1)), list(range(1, n_habits + 1))
+
+
+def make_recommender(source: MatrixSource, index_dir: str, **kwargs) -> HabitRecommender:
+    recommender = HabitRecommender(
+        artifact_store=ArtifactStore(index_dir),  # vacío: sin índice precalculado
+        **kwargs
+    )
+    recommender.feature_extractor = source
+    return recommender
+
+
+def recall_at_k(exact, approx) -> float:
+    """Aciertos / vecinos exactos, contando empates con el k-ésimo."""
+    if not exact:
+        return 1.0
+    threshold = exact[-1]['similarity']
+    hits = sum(1 for s in approx if s['similarity'] >= threshold)
+    return min(hits, len(exact)) / len(exact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LSH vs búsqueda exacta")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Número de usuarios sintéticos (0 = usar la BD)")
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS,
+                        help="Configuraciones BANDASxFILAS separadas por coma")
+    parser.add_argument("--k", type=int, default=15, help="Vecinos por consulta")
+    parser.add_argument("--queries", type=int, default=300, help="Usuarios de muestra")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  BENCHMARK LSH - recall@k vs find_similar_users exacto")
+    print("=" * 70)
+
+    if args.synthetic:
+        matrix, user_ids, habit_ids = synthetic_matrix(args.synthetic)
+        print(f"📊 Matriz sintética: {matrix.shape[0]} usuarios × {matrix.shape[1]} hábitos")
+    else:
+        from app.ai.feature_extractor import FeatureExtractor
+        matrix, user_ids, habit_ids = FeatureExtractor().get_user_habit_matrix()
+        print(f"📊 Matriz de la BD: {matrix.shape[0]} usuarios × {matrix.shape[1]} hábitos")
+
+    if matrix.shape[0] < 2:
+        print("⚠️  No hay suficientes usuarios para el benchmark")
+        return
+
+    source = MatrixSource(matrix, user_ids, habit_ids)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(user_ids, size=min(args.queries, len(user_ids)), replace=False).tolist()
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        # Referencia exacta
+        exact = make_recommender(source, index_dir)
+        exact._load_matrix()
+        start = time.perf_counter()
+        reference = {u: exact.find_similar_users(u, args.k, use_index=False) for u in sample}
+        exact_ms = (time.perf_counter() - start) / len(sample) * 1000
+
+        print(f"\n{'config':>8} {'umbral':>7} {'recall@k':>9} {'candidatos':>12} "
+              f"{'ms/consulta':>12} {'build (s)':>10}")
+        print(f"{'exacto':>8} {'-':>7} {1.0:>9.3f} {matrix.shape[0]:>12} "
+              f"{exact_ms:>12.3f} {'-':>10}")
+
+        for config in args.configs.split(","):
+            bands, rows = (int(x) for x in config.lower().split("x"))
+            approx = make_recommender(source, index_dir, search_mode="lsh",
+                                      lsh_bands=bands, lsh_rows=rows)
+
+            start = time.perf_counter()
+            approx._load_matrix()
+            build_s = time.perf_counter() - start
+
+            lsh = approx._lsh
+            n_candidates = np.mean([
+                len(lsh.candidates(approx._user_index[u])) for u in sample
+            ])
+
+            start = time.perf_counter()
+            results = {u: approx.find_similar_users(u, args.k, use_index=False) for u in sample}
+            lsh_ms = (time.perf_counter() - start) / len(sample) * 1000
+
+            recall = np.mean([recall_at_k(reference[u], results[u]) for u in sample])
+            print(f"{config:>8} {lsh.threshold:>7.2f} {recall:>9.3f} {n_candidates:>12.0f} "
+                  f"{lsh_ms:>12.3f} {build_s:>10.2f}")
+
+    print("\n💡 Más bandas o menos filas por banda → más recall y más candidatos.")
+
+
+if __name__ == "__main__":
+    main()
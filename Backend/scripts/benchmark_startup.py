@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque - costo de importar la API con y sin el stack de IA
+
+Cada medición corre en un proceso nuevo (arranque en frío) y reporta:
+    - tiempo de `import app.main` (lo que paga cada worker al arrancar)
+    - tiempo hasta tener recomendador y predictor listos (primer uso de IA)
+    - memoria máxima del proceso (RSS)
+    - módulos pesados cargados (numpy, scipy, sklearn, joblib)
+
+Con --importtime muestra además los módulos que más tardan en importarse
+(python -X importtime).
+
+USO:
+    cd Backend
+    source .venv/bin/activate
+    python -m scripts.benchmark_startup
+    python -m scripts.benchmark_startup --runs 10 --importtime
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+HEAVY_MODULES = ("numpy", "scipy", "sklearn", "joblib")
+
+# Código que corre en el proceso medido; imprime un JSON con los tiempos
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter() - start
+ai = None
+if {warm_ai}:
+    start = time.perf_counter()
+    main.get_recommender()
+    main.get_predictor()
+    ai = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": imported,
+    "ai_s": ai,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy": [m for m in {heavy!r} if m in sys.modules]
+}}))
+"""
+
+
+def run_probe(warm_ai: bool) -> dict:
+    code = PROBE.format(warm_ai=warm_ai, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_importtime(top: int = 15):
+    """Módulos con mayor tiempo acumulado según -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <módulo>"
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), name))
+
+    print(f"\n{'cumulativo (ms)':>16}  módulo")
+    for cumulative_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>16.1f}  {name.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de la API")
+    parser.add_argument("--runs", type=int, default=5, help="Procesos por escenario")
+    parser.add_argument("--importtime", action="store_true",
+                        help="Mostrar los módulos más lentos de importar")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("  BENCHMARK DE ARRANQUE - import app.main (proceso nuevo por corrida)")
+    print("=" * 70)
+
+    for label, warm_ai in (("solo API", False), ("API + IA", True)):
+        runs = [run_probe(warm_ai) for _ in range(args.runs)]
+        import_s = statistics.median(r["import_s"] for r in runs)
+        rss = statistics.median(r["rss_mb"] for r in runs)
+
+        print(f"\n📊 {label}")
+        print(f"   import app.main:  {import_s * 1000:8.1f} ms (mediana de {args.runs})")
+        if warm_ai:
+            ai_s = statistics.median(r["ai_s"] for r in runs)
+            print(f"   primer uso de IA: {ai_s * 1000:8.1f} ms")
+        print(f"   RSS máximo:       {rss:8.1f} MB")
+        print(f"   módulos pesados:  {', '.join(runs[-1]['heavy']) or 'ninguno'}")
+
+    if args.importtime:
+        print_importtime()
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from passlib.context import CryptContext
 import psycopg
 from app.config import DATABASE_URL
+from app.model.habitFeaturesConnection import HabitFeaturesConnection
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -290,6 +291,7 @@ def main():
             print(f"\n📚 Hábitos disponibles: {len(habitos)}")
             
             # Estadísticas globales
+            user_ids = []
             total_users = 0
             total_habitos_asignados = 0
             total_completados = 0
@@ -324,6 +326,7 @@ def main():
                     update_estadisticas(cur, user_id, puntos)
                     
                     # Acumular
+                    user_ids.append(user_id)
                     total_users += 1
                     total_habitos_asignados += len(habitos_asignados)
                     total_completados += completados
@@ -332,6 +335,10 @@ def main():
                     tasa = completados / (completados + no_completados) * 100 if (completados + no_completados) > 0 else 0
                     print(f"   ✓ User {user_id}: {nombre[:20]:<20} | {len(habitos_asignados)} hábitos | {tasa:.0f}% completado")
             
+            # El historial se insertó directo: recalcular habito_features
+            features = HabitFeaturesConnection().recompute_for_users(cur, user_ids)
+            print(f"\n🧮 habito_features recalculadas: {features}")
+            
             conn.commit()
             
             # Resumen final
@@ -29,6 +29,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from passlib.context import CryptContext
 import psycopg
 from app.config import DATABASE_URL
+from app.model.habitFeaturesConnection import HabitFeaturesConnection
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -328,6 +329,7 @@ def main():
                 print(f"   Categoría {cat_id}: {len(habitos)} hábitos")
             
             # Crear cada usuario
+            user_ids = []
             for user_data in AI_TEST_USERS:
                 nombre = user_data["nombre"]
                 correo = user_data["correo"]
@@ -363,6 +365,11 @@ def main():
                 
                 # 5. Actualizar estadísticas
                 update_estadisticas(cur, user_id, total_puntos)
+                user_ids.append(user_id)
+            
+            # El historial se insertó directo: recalcular habito_features
+            features = HabitFeaturesConnection().recompute_for_users(cur, user_ids)
+            print(f"\n🧮 habito_features recalculadas: {features}")
             
             conn.commit()
             
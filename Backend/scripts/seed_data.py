@@ -27,6 +27,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from passlib.context import CryptContext
 import psycopg
 from app.config import DATABASE_URL
+from app.model.habitFeaturesConnection import HabitFeaturesConnection
 
 # Para hashear contraseñas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -403,6 +404,12 @@ def run_seed():
                 print(f"   📈 {user['nombre']}: {len(user_habitos)} hábitos, "
                       f"{puntos} pts, racha: {racha}, max: {max_racha}")
             
+            # El historial se insertó directo: recalcular habito_features
+            features = HabitFeaturesConnection().recompute_for_users(
+                cur, [user["user_id"] for user in users_created]
+            )
+            print(f"   🧮 habito_features recalculadas: {features}")
+            
             # Commit todos los cambios
             conn.commit()
             
@@ -0,0 +1,58 @@
+"""
+Paridad de FlatForest con RandomForestClassifier.predict_proba
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from app.ai.flat_forest import FlatForest
+from app.ai.predictor import HabitPredictor
+
+
+def _data(n=2000, n_features=12, seed=0):
+    rng = np.random.RandomState(seed)
+    X = rng.rand(n, n_features)
+    y = ((X[:, 0] + X[:, 1] * X[:, 2] + rng.rand(n) * 0.3) > 0.9).astype(int)
+    return X, y
+
+
+def test_predict_proba_matches_sklearn():
+    X, y = _data()
+    model = RandomForestClassifier(n_estimators=50, max_depth=10, random_state=42)
+    model.fit(X, y)
+
+    X_new, _ = _data(n=500, seed=1)
+    forest = FlatForest.from_sklearn(model)
+
+    assert np.allclose(forest.predict_proba(X_new), model.predict_proba(X_new))
+
+
+def test_predict_proba_matches_sklearn_after_incremental_runs():
+    X, y = _data()
+    model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42)
+    model.fit(X, y)
+    base_trees = len(model.estimators_)
+
+    # Mismo recorte y warm_start que HabitPredictor.train_incremental,
+    # suficientes corridas para pasar de MAX_TREES
+    watermark = date(2026, 1, 1)
+    runs = (HabitPredictor.MAX_TREES - base_trees) // HabitPredictor.INCREMENTAL_TREES + 3
+    for run in range(runs):
+        watermark += timedelta(days=1)
+        X_run, y_run = _data(n=400, seed=run + 10)
+        estimators = HabitPredictor._rotate_estimators(model.estimators_, base_trees)
+        model.estimators_ = estimators
+        model.n_estimators = len(estimators) + HabitPredictor.INCREMENTAL_TREES
+        model.random_state = HabitPredictor._incremental_seed(watermark)
+        model.warm_start = True
+        model.fit(X_run, y_run)
+        model.warm_start = False
+
+    assert len(model.estimators_) == HabitPredictor.MAX_TREES
+
+    X_new, _ = _data(n=500, seed=99)
+    forest = FlatForest.from_sklearn(model)
+
+    assert np.allclose(forest.predict_proba(X_new), model.predict_proba(X_new))